@@ -1,75 +1,238 @@
 """
 Authentication: JWT tokens + WeChat login stub
 """
+import hashlib
 import os
 import secrets
-import hashlib
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from types import MappingProxyType
+from typing import Mapping, Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
-from database import get_db
-from models import User, FamilyMember
+from cache import TTLCache
+from database import get_db, get_session, run_db
+from models import User, FamilyMember, RoleEnum, TokenRevocation
 
 SECRET_KEY = os.getenv("JWT_SECRET", "careline-dev-secret-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30
+# 在 token 中携带 family_id / role / ver，鉴权时无需查库
+JWT_EMBED_CLAIMS = os.getenv("JWT_EMBED_CLAIMS", "true").lower() in ("1", "true", "yes")
 
 security = HTTPBearer(auto_error=False)
 
+# 请求上下文缓存（每个 worker 一份），按 user_id 索引
+CONTEXT_CACHE_TTL = float(os.getenv("AUTH_CONTEXT_TTL", "300"))
+context_cache = TTLCache(maxsize=4096, ttl=CONTEXT_CACHE_TTL)
+
+# 已验证 token 缓存：sha256(token) -> 声明（只读），到 exp 即过期；同一 token 不再重复解码与验签
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_DAYS * 86400)
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+# 吊销表缓存：user_id -> min_version（每个 worker 一份）
+# 吊销只清除处理该请求的 worker 的缓存：其他 worker 最多 AUTH_REVOCATION_TTL 秒内仍接受旧 token
+REVOCATION_CACHE_TTL = float(os.getenv("AUTH_REVOCATION_TTL", "60"))
+revocation_cache = TTLCache(maxsize=4096, ttl=REVOCATION_CACHE_TTL)
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return hash_password(password) == hashed
+@dataclass(frozen=True)
+class RequestContext:
+    """当前请求的身份：用户 + 所属家庭 + 角色
+    nickname 取自 token 时是签发时的值，可能已过期：返回给客户端或写入数据时从 users 表读取"""
+    user_id: int
+    nickname: Optional[str] = None
+    phone: Optional[str] = None
+    family_id: Optional[int] = None
+    role: Optional[RoleEnum] = None
 
 
-def create_access_token(user_id: int) -> str:
+def create_access_token(
+    user_id: int,
+    family_id: Optional[int] = None,
+    role: Optional[RoleEnum] = None,
+    nickname: Optional[str] = None,
+    version: int = 0,
+) -> str:
     expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-    payload = {"sub": str(user_id), "exp": expire}
+    payload = {"sub": str(user_id), "exp": expire, "ver": version}
+    if JWT_EMBED_CLAIMS and family_id is not None:
+        payload["fam"] = family_id
+        payload["role"] = RoleEnum(role).value
+        payload["nick"] = nickname
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def decode_token(token: str) -> Optional[int]:
+def issue_token(db: Session, user_id: int, ctx: Optional["RequestContext"] = None) -> str:
+    """签发 token：带上当前 token 版本，以及（若已入家庭）家庭与角色"""
+    if ctx is None and JWT_EMBED_CLAIMS:
+        ctx = _load_request_context(db, user_id)
+    if ctx is None:
+        ctx = RequestContext(user_id=user_id)
+    return create_access_token(
+        user_id,
+        family_id=ctx.family_id,
+        role=ctx.role,
+        nickname=ctx.nickname,
+        version=get_token_version(db, user_id, fresh=True),
+    )
+
+
+def decode_claims(token: str) -> Optional[Mapping]:
+    """验证并解析 token；验证通过的结果按 token 摘要缓存到过期为止
+    吊销仍按 ver 逐次比对吊销表，时效见 revocation_cache"""
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is not None:
+        return claims
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload.get("sub"))
-        return user_id
+        payload["sub"] = int(payload.get("sub"))
     except (JWTError, ValueError, TypeError):
         return None
+    claims = MappingProxyType(payload)
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0:
+        token_cache.set(key, claims, ttl=remaining)
+    return claims
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db),
-) -> User:
-    if not credentials:
+def decode_token(token: str) -> Optional[int]:
+    claims = decode_claims(token)
+    return claims["sub"] if claims else None
+
+
+def get_token_version(db: Session, user_id: int, fresh: bool = False) -> int:
+    """当前有效的最小 token 版本（吊销表，带缓存）
+    签发 token 时 fresh=True 直接查库：其他 worker 刚吊销过时，缓存里的旧版本会让新 token 随即失效"""
+    version = None if fresh else revocation_cache.get(user_id)
+    if version is None:
+        version = (
+            db.query(TokenRevocation.min_version)
+            .filter(TokenRevocation.user_id == user_id)
+            .scalar()
+        ) or 0
+        revocation_cache.set(user_id, version)
+    return version
+
+
+def revoke_user_tokens(db: Session, user_id: int) -> int:
+    """吊销该用户已签发的全部 token（退出登录：POST /auth/logout），返回新版本号
+    以后增加移出家庭成员、修改角色时同样要调用：旧 token 里带着家庭与角色"""
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    now = datetime.utcnow()
+    stmt = insert(TokenRevocation).values(user_id=user_id, min_version=1, revoked_at=now)
+    version = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[TokenRevocation.user_id],
+            set_={"min_version": TokenRevocation.min_version + 1, "revoked_at": now},
+        )
+        .returning(TokenRevocation.min_version)
+    ).scalar_one()
+    db.commit()
+    revocation_cache.pop(user_id)
+    invalidate_request_context(user_id)
+    return version
+
+
+def _load_request_context(db: Session, user_id: int) -> Optional[RequestContext]:
+    """一次 JOIN 查询取出用户与其（第一个）家庭成员关系"""
+    row = (
+        db.query(
+            User.id, User.nickname, User.phone,
+            FamilyMember.family_id, FamilyMember.role,
+        )
+        .outerjoin(FamilyMember, FamilyMember.user_id == User.id)
+        .filter(User.id == user_id)
+        .order_by(FamilyMember.id)
+        .first()
+    )
+    if row is None:
+        return None
+    return RequestContext(
+        user_id=row.id,
+        nickname=row.nickname,
+        phone=row.phone,
+        family_id=row.family_id,
+        role=row.role,
+    )
+
+
+def resolve_request_context(db: Session, token: Optional[str]) -> RequestContext:
+    """解析 token 并返回用户 + 家庭 + 角色（带进程内缓存）"""
+    if not token:
         raise HTTPException(status_code=401, detail="未登录")
 
-    user_id = decode_token(credentials.credentials)
-    if user_id is None:
+    claims = decode_claims(token)
+    if claims is None:
         raise HTTPException(status_code=401, detail="登录已过期，请重新登录")
+    user_id = claims["sub"]
+
+    if claims.get("ver", 0) < get_token_version(db, user_id):
+        raise HTTPException(status_code=401, detail="登录已失效，请重新登录")
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # token 自带家庭与角色：无需查库
+    if "fam" in claims:
+        return RequestContext(
+            user_id=user_id,
+            nickname=claims.get("nick"),
+            family_id=claims["fam"],
+            role=RoleEnum(claims["role"]),
+        )
+
+    ctx = context_cache.get(user_id)
+    if ctx is not None:
+        return ctx
+
+    ctx = _load_request_context(db, user_id)
+    if ctx is None:
         raise HTTPException(status_code=401, detail="用户不存在")
 
-    return user
+    # 只缓存已加入家庭的结果：未入家庭的状态随时会变（其他 worker 上的创建/加入）
+    if ctx.family_id is not None:
+        context_cache.set(user_id, ctx)
+    return ctx
 
 
-def get_user_family_role(db: Session, user_id: int) -> Optional[FamilyMember]:
-    """Get user's first family membership (V1: single family)"""
-    return (
-        db.query(FamilyMember)
-        .filter(FamilyMember.user_id == user_id)
-        .first()
-    )
+def get_request_context(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+) -> RequestContext:
+    """Dependency: 解析 Authorization 头中的 token"""
+    return resolve_request_context(db, credentials.credentials if credentials else None)
+
+
+async def get_family_context(
+    ctx: RequestContext = Depends(get_request_context),
+) -> RequestContext:
+    """Dependency: 同上，但要求已加入家庭"""
+    if ctx.family_id is None:
+        raise HTTPException(status_code=400, detail="请先加入家庭")
+    return ctx
+
+
+async def get_family_context_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_session),
+) -> RequestContext:
+    """Dependency: async 路由用的 get_family_context，不占用线程池
+    吊销表与上下文通常命中缓存，不查库；未命中时经 run_db 查询"""
+    ctx = await run_db(db, resolve_request_context, credentials.credentials if credentials else None)
+    if ctx.family_id is None:
+        raise HTTPException(status_code=400, detail="请先加入家庭")
+    return ctx
+
+
+def invalidate_request_context(user_id: int) -> None:
+    """家庭关系变化后清除该用户的上下文缓存"""
+    context_cache.pop(user_id)
 
 
 def require_family_access(db: Session, user_id: int, family_id: int) -> FamilyMember:
@@ -0,0 +1 @@
+# Benchmarks and verification scripts (run from backend/: python -m bench.<name>)
@@ -0,0 +1,81 @@
+"""
+同步 vs 异步数据库栈吞吐对比（/summary 与 /stool）
+
+用法（先用 seed_data.py 准备数据，再分别以两种模式启动后端）:
+  DB_ASYNC=0 uvicorn main:app --port 8000 --workers 2
+  python -m bench.async_throughput --base http://localhost:8000 --label sync
+
+  DB_ASYNC=1 uvicorn main:app --port 8000 --workers 2
+  python -m bench.async_throughput --base http://localhost:8000 --label async
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def _login(client: httpx.AsyncClient, phone: str, password: str) -> dict:
+    r = await client.post("/auth/login", json={"phone": phone, "password": password})
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+async def _worker(client, headers, method, path, body, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, path, json=body, headers=headers)
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+        latencies.append(time.perf_counter() - t0)
+
+
+async def run_endpoint(base, headers, method, path, body, concurrency, seconds):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*[
+            _worker(client, headers, method, path, body, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ])
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "requests": n,
+        "rps": round(n / seconds, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if n else None,
+        "p95_ms": round(latencies[int(n * 0.95) - 1] * 1000, 1) if n else None,
+        "errors": len(errors),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://localhost:8000")
+    parser.add_argument("--phone", default="13800001111")
+    parser.add_argument("--password", default="123456")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--label", default="")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base) as client:
+        headers = await _login(client, args.phone, args.password)
+
+    cases = [
+        ("GET", "/summary", None),
+        ("POST", "/stool", {"bristol": 4}),
+    ]
+    print(f"== {args.label or args.base}  concurrency={args.concurrency}  {args.seconds}s/endpoint")
+    for method, path, body in cases:
+        result = await run_endpoint(args.base, headers, method, path, body, args.concurrency, args.seconds)
+        print(f"{method:4} {path:10} {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
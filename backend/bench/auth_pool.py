@@ -0,0 +1,103 @@
+"""
+登录 / 注册计算密码哈希期间不占用数据库连接的检查
+- 替换 auth_router 中的 hash_password_async / verify_password_async，在每次等待哈希时
+  记录从连接池借出未归还的连接数，全部为 0 才通过
+- 覆盖注册、首次登录自动注册、正确 / 错误密码登录、旧版哈希登录后改存 scrypt
+- 默认使用临时 SQLite 文件；也可用 DATABASE_URL 指向专用的空库，DB_ASYNC=1 检查异步栈
+
+用法:
+  python -m bench.auth_pool
+  DB_ASYNC=1 python -m bench.auth_pool
+"""
+import os
+import shutil
+import tempfile
+
+_TMP_DIR = None
+if "DATABASE_URL" not in os.environ:
+    _TMP_DIR = tempfile.mkdtemp(prefix="careline-auth-pool-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/auth.db"
+os.environ.setdefault("PASSWORD_WORKERS", "0")
+os.environ.setdefault("MIGRATE_ON_STARTUP", "false")
+
+import hashlib  # noqa: E402
+import sys  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import database  # noqa: E402
+from main import app  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import User  # noqa: E402
+from routers import auth_router  # noqa: E402
+
+PASSWORD = "123456"
+
+
+_checked_out = [0]
+
+
+def _count_checkouts(engine) -> None:
+    """按连接池事件计数（异步 SQLite 使用 NullPool，没有 checkedout()）"""
+    def checkout(*_):
+        _checked_out[0] += 1
+
+    def checkin(*_):
+        _checked_out[0] -= 1
+
+    event.listen(engine, "checkout", checkout)
+    event.listen(engine, "checkin", checkin)
+
+
+def _watch(name: str, fn, seen: list):
+    async def wrapper(*args):
+        seen.append((name, _checked_out[0]))
+        return await fn(*args)
+    return wrapper
+
+
+def main() -> int:
+    upgrade(database.engine)
+    with database.SessionLocal() as db:
+        db.add(User(phone="13900000009", nickname="旧账号",
+                    password_hash=hashlib.sha256(PASSWORD.encode()).hexdigest()))
+        db.commit()
+
+    _count_checkouts(database.async_engine.sync_engine if database.async_engine else database.engine)
+    seen = []
+    auth_router.hash_password_async = _watch("hash", auth_router.hash_password_async, seen)
+    auth_router.verify_password_async = _watch("verify", auth_router.verify_password_async, seen)
+
+    steps = [
+        ("注册", "/auth/register", {"phone": "13900000001", "password": PASSWORD}, 200),
+        ("首次登录自动注册", "/auth/login", {"phone": "13900000002", "password": PASSWORD}, 200),
+        ("登录", "/auth/login", {"phone": "13900000001", "password": PASSWORD}, 200),
+        ("密码错误", "/auth/login", {"phone": "13900000001", "password": "wrong"}, 401),
+        ("旧版哈希登录", "/auth/login", {"phone": "13900000009", "password": PASSWORD}, 200),
+    ]
+    failures = []
+    with TestClient(app) as client:
+        for label, path, body, expected in steps:
+            start = len(seen)
+            r = client.post(path, json=body)
+            if r.status_code != expected:
+                failures.append(f"{label}：状态码 {r.status_code}，预期 {expected}")
+            held = [f"{name} 时借出 {n} 个连接" for name, n in seen[start:] if n]
+            if len(seen) == start:
+                failures.append(f"{label}：没有计算密码哈希")
+            if held:
+                failures.append(f"{label}：{'，'.join(held)}")
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    print(f"{len(steps)} 个场景，等待哈希 {len(seen)} 次，{len(failures)} 项不通过")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        if _TMP_DIR:
+            shutil.rmtree(_TMP_DIR, ignore_errors=True)
@@ -0,0 +1,87 @@
+"""
+冷启动耗时：容器重启时 worker 从进程启动到返回第一个请求
+- import：python -c "import main" 的耗时（子进程）
+- 启动时的数据库步骤：原先的 create_all（逐表反射）vs 现在的 check_schema（一次查询），每次新建引擎含建连
+- 端到端：启动 uvicorn（单 worker）到 GET /health 返回 200
+
+用法（DATABASE_URL 指向已执行过 python migrations.py 的数据库）:
+  python -m bench.cold_start --runs 5
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from sqlalchemy import create_engine
+
+from database import DATABASE_URL, POOL_KWARGS
+from migrations import check_schema
+from models import Base
+
+_IMPORT_MAIN = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def _import_seconds() -> float:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_MAIN], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _startup_step_seconds(step) -> float:
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True, **POOL_KWARGS)
+    try:
+        t0 = time.perf_counter()
+        step(engine)
+        return time.perf_counter() - t0
+    finally:
+        engine.dispose()
+
+
+def _first_response_seconds(port: int, timeout: float = 30) -> float:
+    env = dict(os.environ, MIGRATE_ON_STARTUP="false")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", "1"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn 启动失败（数据库是否已执行 python migrations.py？）")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/health")
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - t0
+            except OSError:
+                pass
+            time.sleep(0.005)
+        raise RuntimeError("等待 /health 超时")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _report(label: str, samples) -> None:
+    samples = [s * 1000 for s in samples]
+    print(f"  中位数 {statistics.median(samples):8.1f} ms  最小 {min(samples):8.1f} ms  {label}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"冷启动（{args.runs} 次）：{DATABASE_URL.split('@')[-1]}")
+    _report("import main", [_import_seconds() for _ in range(args.runs)])
+    _report("启动时 create_all（原先）", [_startup_step_seconds(Base.metadata.create_all) for _ in range(args.runs)])
+    _report("启动时 check_schema（现在）", [_startup_step_seconds(check_schema) for _ in range(args.runs)])
+    _report("uvicorn 启动 → 首个请求返回", [_first_response_seconds(args.port) for _ in range(args.runs)])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+列式格式的体积与解析耗时：对象数组 vs format=columnar（/daily/cycle、/summary 趋势）
+按种子数据规律生成 N 天记录写入内存 SQLite，比较原始 / gzip 后字节数与 JSON 解析耗时
+
+用法:
+  python -m bench.columnar_payload --days 365
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import timeit
+from typing import List
+
+import orjson
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from bench.json_paths import _logs
+from columnar import to_columnar
+from models import Base, DailyLog
+from routers.summary_router import _SUMMARY_COLUMNS
+from schemas import DailyLogOut, TrendPoint
+from serialization import dump_json, row_dicts, rows_json, schema_columns
+
+
+def _parse_ms(body: bytes, number: int = 50) -> float:
+    return min(timeit.repeat(lambda: json.loads(body), number=number, repeat=5)) / number * 1000
+
+
+def _compare(label: str, rows_body: bytes, columnar_body: bytes) -> None:
+    print(label)
+    print(f"  {'':<10}{'字节':>10}{'gzip':>10}{'解析 ms':>10}")
+    for name, body in (("rows", rows_body), ("columnar", columnar_body)):
+        print(f"  {name:<10}{len(body):>10}{len(gzip.compress(body)):>10}{_parse_ms(body):>10.3f}")
+    print(
+        f"  体积 {len(rows_body) / len(columnar_body):.1f}x，"
+        f"gzip 后 {len(gzip.compress(rows_body)) / len(gzip.compress(columnar_body)):.1f}x，"
+        f"解析 {_parse_ms(rows_body) / _parse_ms(columnar_body):.1f}x"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    random.seed(0)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all(_logs(args.days))
+        db.commit()
+
+        query = select(*schema_columns(DailyLogOut, DailyLog)).order_by(DailyLog.date)
+        result = db.execute(query)
+        _compare(
+            f"/daily/cycle：{args.days} 天 DailyLogOut",
+            rows_json(db.execute(query)),
+            orjson.dumps(to_columnar(result.all(), list(result.keys()))),
+        )
+
+        trend_rows = db.query(*_SUMMARY_COLUMNS).order_by(DailyLog.date).all()
+        _compare(
+            f"/summary 趋势：{args.days} 个 TrendPoint",
+            dump_json(List[TrendPoint], row_dicts(trend_rows)),
+            orjson.dumps(to_columnar(trend_rows, list(TrendPoint.model_fields))),
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
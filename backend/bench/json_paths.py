@@ -0,0 +1,138 @@
+"""
+响应序列化微基准：365 天的每日记录 / 趋势点（内存 SQLite，含查询时间）
+- fastapi：查 ORM 实体，由 response_model 校验 → 转为 Python 对象 → json.dumps（JSONResponse）
+- adapter：查 ORM 实体，serialization.dump_json（TypeAdapter 校验一次 + pydantic-core 直接输出 bytes）
+- rows：按 DailyLogOut 字段只查所需列，serialization.rows_json（orjson，不构建对象）
+同时检查各路径输出的 JSON 内容一致
+
+用法:
+  python -m bench.json_paths --days 365
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from models import Base, DailyLog
+from routers.summary_router import _SUMMARY_COLUMNS
+from schemas import DailyLogOut, TrendPoint
+from seed_data import generate_cycle_data
+from serialization import dump_json, row_dicts, rows_json, schema_columns
+
+
+def _logs(days: int) -> List[DailyLog]:
+    """按种子数据规律生成的内存 DailyLog 对象（不入库）"""
+    start = date(2025, 1, 1)
+    now = datetime(2025, 1, 1, 8, 0)
+    rows = []
+    while len(rows) < days:
+        cycle_no = len(rows) // 21 + 1
+        for d in generate_cycle_data(cycle_no, 21, random.choice(["mild", "normal", "severe"])):
+            i = len(rows)
+            if i >= days:
+                break
+            rows.append(DailyLog(
+                id=i + 1, family_id=1, date=start + timedelta(days=i), cycle_no=cycle_no,
+                cycle_day=d["day"], energy=d["energy"], nausea=d["nausea"], appetite=d["appetite"],
+                sleep_quality=d["sleep"], fever=d["fever"], temp_c=d["temp"],
+                stool_count=d["stool_count"], diarrhea=d["diarrhea"], is_tough_day=d["is_tough"],
+                numbness=d["numbness"], mouth_sore=d["mouth_sore"], note=d.get("note"),
+                stool_blood_count=d["blood"], stool_mucus_count=d["mucus"],
+                stool_tenesmus_count=d["tenesmus"], created_at=now, updated_at=now,
+            ))
+    return rows
+
+
+_loop = asyncio.new_event_loop()
+
+
+def _fastapi_path(field, content) -> bytes:
+    """与路由返回 ORM 列表时相同的处理（不计同步路由额外的线程池切换）"""
+    serialized = _loop.run_until_complete(serialize_response(field=field, response_content=content))
+    return JSONResponse(serialized).body
+
+
+def _manual_trends(logs) -> List[TrendPoint]:
+    """原 _build_summary 的写法：逐行手工构造 TrendPoint"""
+    return [
+        TrendPoint(
+            date=log.date, cycle_day=log.cycle_day, energy=log.energy, nausea=log.nausea,
+            appetite=log.appetite, sleep_quality=log.sleep_quality, stool_count=log.stool_count,
+            diarrhea=log.diarrhea, fever=log.fever, temp_c=log.temp_c, is_tough_day=log.is_tough_day,
+        )
+        for log in logs
+    ]
+
+
+def _bench(label: str, fn, number: int) -> float:
+    best = min(timeit.repeat(fn, number=number, repeat=5)) / number * 1000
+    print(f"  {label:<44} {best:8.3f} ms")
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--number", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    logs = _logs(args.days)
+    ok = True
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all(logs)
+        db.commit()
+    db = Session(engine)
+
+    def entities():
+        db.expunge_all()
+        return db.query(DailyLog).order_by(DailyLog.date).all()
+
+    def rows():
+        return rows_json(db.execute(select(*schema_columns(DailyLogOut, DailyLog)).order_by(DailyLog.date)))
+
+    print(f"/daily/range：{args.days} 条 DailyLogOut（查询 + 序列化）")
+    field = create_model_field("Response_get_daily_range", List[DailyLogOut], mode="serialization")
+    paths = {
+        "fastapi response_model + JSONResponse": lambda: _fastapi_path(field, entities()),
+        "ORM 实体 + TypeAdapter.dump_json": lambda: dump_json(List[DailyLogOut], entities()),
+        "按字段查列 + orjson": rows,
+    }
+    outputs = [json.loads(fn()) for fn in paths.values()]
+    if any(out != outputs[0] for out in outputs):
+        print("  ✗ 各路径输出不一致")
+        ok = False
+    times = [_bench(label, fn, args.number) for label, fn in paths.items()]
+    print("  加速 " + " / ".join(f"{times[0] / t:.1f}x" for t in times[1:]))
+
+    print(f"/summary 趋势：{args.days} 个 TrendPoint（由查询得到的 Row 构建 + 序列化）")
+    trend_rows = db.query(*_SUMMARY_COLUMNS).order_by(DailyLog.date).all()
+    if json.loads(dump_json(List[TrendPoint], _manual_trends(trend_rows))) != json.loads(dump_json(List[TrendPoint], row_dicts(trend_rows))):
+        print("  ✗ 两条路径输出不一致")
+        ok = False
+    old = _bench(
+        "手工构造 TrendPoint + 序列化",
+        lambda: dump_json(List[TrendPoint], _manual_trends(trend_rows)), args.number,
+    )
+    new = _bench("TypeAdapter 校验 Row 字典 + 序列化", lambda: dump_json(List[TrendPoint], row_dicts(trend_rows)), args.number)
+    print(f"  加速 {old / new:.1f}x")
+
+    db.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+实时推送压测：同一家庭开多个 SSE 连接（可分布在不同 worker 上），逐条写入排便记录，
+检查每个连接都收到全部 change 事件并统计推送延迟
+--slow N：额外开 N 个只连接不读取的连接，验证慢客户端不会拖住其他连接
+
+用法（先用 seed_data.py 准备数据并启动后端，建议 PostgreSQL + 多 worker）:
+  uvicorn main:app --port 8000 --workers 4
+  python -m bench.live_fanout --base http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import date
+from urllib.parse import urlsplit
+
+import httpx
+
+
+async def _login(client: httpx.AsyncClient, phone: str, password: str) -> str:
+    r = await client.post("/auth/login", json={"phone": phone, "password": password})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def _listen(client: httpx.AsyncClient, token: str, received: list, ready: asyncio.Event):
+    """读取 SSE，记录 (到达时间, seq)"""
+    async with client.stream("GET", "/live", params={"token": token}, timeout=None) as r:
+        r.raise_for_status()
+        event = None
+        async for line in r.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                if event == "hello":
+                    ready.set()
+                elif event == "change":
+                    received.append((time.perf_counter(), json.loads(line[6:])["seq"]))
+
+
+async def _slow(base: str, token: str):
+    """只发请求、从不读取响应的连接"""
+    url = urlsplit(base)
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    writer.write(f"GET /live?token={token} HTTP/1.1\r\nHost: {url.netloc}\r\n\r\n".encode())
+    await writer.drain()
+    return writer
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://localhost:8000")
+    parser.add_argument("--phones", default="13800001111,13800002222", help="同一家庭的成员手机号，逗号分隔")
+    parser.add_argument("--password", default="123456")
+    parser.add_argument("--listeners", type=int, default=8)
+    parser.add_argument("--slow", type=int, default=1)
+    parser.add_argument("--writes", type=int, default=50)
+    parser.add_argument("--date", type=date.fromisoformat, default=date(2000, 1, 2))
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.listeners + 4)
+    async with httpx.AsyncClient(base_url=args.base, limits=limits, timeout=30) as client:
+        phones = args.phones.split(",")
+        tokens = [await _login(client, phones[i % len(phones)], args.password) for i in range(args.listeners)]
+        headers = {"Authorization": f"Bearer {tokens[0]}"}
+
+        slow = [await _slow(args.base, tokens[0]) for _ in range(args.slow)]
+        received = [[] for _ in tokens]
+        ready = [asyncio.Event() for _ in tokens]
+        tasks = [
+            asyncio.create_task(_listen(client, t, rec, ev))
+            for t, rec, ev in zip(tokens, received, ready)
+        ]
+        await asyncio.wait_for(asyncio.gather(*[ev.wait() for ev in ready]), 10)
+
+        print(f"{args.listeners} 个连接（另有 {args.slow} 个不读取），写入 {args.writes} 次")
+        sent, created = [], []
+        for _ in range(args.writes):
+            sent.append(time.perf_counter())
+            r = await client.post("/stool", json={"date": str(args.date), "bristol": 4}, headers=headers)
+            r.raise_for_status()
+            created.append(r.json()["id"])
+
+        deadline = time.perf_counter() + 10
+        while time.perf_counter() < deadline and any(len(rec) < args.writes for rec in received):
+            await asyncio.sleep(0.05)
+
+        ok = True
+        latencies = []
+        for i, rec in enumerate(received):
+            if len(rec) != args.writes:
+                print(f"  ✗ 连接 {i} 收到 {len(rec)}/{args.writes} 个事件")
+                ok = False
+            seqs = [seq for _, seq in rec]
+            if seqs != sorted(seqs):
+                print(f"  ✗ 连接 {i} 事件乱序")
+                ok = False
+            for (arrived, _), started in zip(sorted(rec, key=lambda x: x[1]), sent):
+                latencies.append((arrived - started) * 1000)
+        if latencies:
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"  推送延迟（写入开始 → 收到事件）p50={statistics.median(latencies):.1f}ms p95={p95:.1f}ms")
+
+        for task in tasks:
+            task.cancel()
+        for writer in slow:
+            writer.close()
+        for event_id in created:
+            await client.delete(f"/stool/{event_id}", headers=headers)
+        print(f"  /health live: {(await client.get('/health')).json().get('live')}")
+        print("  ✓ 全部连接收到全部事件" if ok else "  ✗ 有连接丢失事件")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,74 @@
+"""
+登录压测：scrypt 登录高峰对登录本身及其他请求的延迟影响
+先单独压 --probe 接口得到基线，再在 --logins 个并发登录的同时压同一接口，比较 p50 / p99
+
+用法（先用 seed_data.py 准备数据，再分别以两种方式启动后端）:
+  PASSWORD_WORKERS=0 uvicorn main:app --port 8000 --workers 2   # 在线程池中计算哈希
+  python -m bench.login_load --base http://localhost:8000 --label threadpool
+
+  PASSWORD_WORKERS=2 uvicorn main:app --port 8000 --workers 2   # 独立进程池
+  python -m bench.login_load --base http://localhost:8000 --label pool
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from bench.async_throughput import _login, _worker
+
+
+def _summary(latencies: List[float], errors: list) -> str:
+    latencies = sorted(latencies)
+    n = len(latencies)
+    if not n:
+        return f"0 次请求，错误 {len(errors)}"
+    p99 = latencies[max(int(n * 0.99) - 1, 0)]
+    return (
+        f"{n:6} 次  p50={statistics.median(latencies) * 1000:7.1f}ms  p99={p99 * 1000:7.1f}ms  "
+        f"错误 {len(errors)}"
+    )
+
+
+async def _run(client, headers, probe, probe_concurrency, logins, login_body, seconds):
+    deadline = time.perf_counter() + seconds
+    probe_lat, probe_err, login_lat, login_err = [], [], [], []
+    await asyncio.gather(
+        *[_worker(client, headers, "GET", probe, None, deadline, probe_lat, probe_err) for _ in range(probe_concurrency)],
+        *[_worker(client, None, "POST", "/auth/login", login_body, deadline, login_lat, login_err) for _ in range(logins)],
+    )
+    return (probe_lat, probe_err), (login_lat, login_err)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://localhost:8000")
+    parser.add_argument("--phone", default="13800001111")
+    parser.add_argument("--password", default="123456")
+    parser.add_argument("--probe", default="/daily/today", help="高峰期间同时压测的普通接口")
+    parser.add_argument("--probe-concurrency", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=32, help="并发登录数")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--label", default="")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.probe_concurrency + args.logins + 1)
+    async with httpx.AsyncClient(base_url=args.base, limits=limits, timeout=60) as client:
+        headers = await _login(client, args.phone, args.password)
+        body = {"phone": args.phone, "password": args.password}
+
+        print(f"== {args.label or args.base}  {args.seconds}s/阶段")
+        probe, _ = await _run(client, headers, args.probe, args.probe_concurrency, 0, body, args.seconds)
+        print(f"GET  {args.probe:<14}（无登录）  {_summary(*probe)}")
+        probe, login = await _run(
+            client, headers, args.probe, args.probe_concurrency, args.logins, body, args.seconds,
+        )
+        print(f"GET  {args.probe:<14}（登录高峰）{_summary(*probe)}")
+        print(f"POST {'/auth/login':<14}（{args.logins} 并发）{_summary(*login)}")
+        print(f"/health passwords: {(await client.get('/health')).json().get('passwords')}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
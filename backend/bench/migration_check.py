@@ -0,0 +1,128 @@
+"""
+迁移 2 / 5 的检查：旧版把手机号账号的 SHA-256 存在 avatar_url 中，迁移时只移走这种值
+- 从版本 1 升级：64 位十六进制哈希移入 password_hash；恰为 64 个字符的头像地址、
+  微信账号（无手机号）的 64 位值都留在 avatar_url
+- 早期的版本 2 已执行过的库：版本 5 把误移走的头像地址移回
+- 默认使用临时 SQLite 文件；也可用 DATABASE_URL 指向专用的空库
+
+用法:
+  python -m bench.migration_check
+"""
+import os
+import shutil
+import tempfile
+
+_TMP_DIR = None
+if "DATABASE_URL" not in os.environ:
+    _TMP_DIR = tempfile.mkdtemp(prefix="careline-migration-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/migration.db"
+
+import hashlib  # noqa: E402
+import sys  # noqa: E402
+
+from sqlalchemy import text  # noqa: E402
+
+from database import engine  # noqa: E402
+from migrations import LATEST, MIGRATIONS, schema_migrations, upgrade  # noqa: E402
+from models import Base, User  # noqa: E402
+
+HASH = hashlib.sha256(b"123456").hexdigest()
+URL = "https://thirdwx.qlogo.cn/mmopen/vi_32/" + "a" * 22 + "/132"   # 恰为 64 个字符
+URL_HEX = "f" * 64                                                 # 微信账号的 64 位十六进制值
+assert len(URL) == 64
+
+# 迁移 2 之前的 users 表（没有 password_hash）
+_LEGACY_USERS = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY,
+    openid VARCHAR(128) UNIQUE,
+    phone VARCHAR(20) UNIQUE,
+    nickname VARCHAR(64),
+    avatar_url VARCHAR(512),
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP
+)
+"""
+
+# (id, phone, openid, 升级前的值, 升级后预期的 (avatar_url, password_hash))
+USERS = [
+    (1, "13900000001", None, HASH, (None, HASH)),
+    (2, "13900000002", None, URL, (URL, None)),
+    (3, None, "wx-3", URL_HEX, (URL_HEX, None)),
+    (4, "13900000004", None, None, (None, None)),
+]
+
+
+def _reset() -> None:
+    Base.metadata.drop_all(engine)
+    schema_migrations.drop(engine, checkfirst=True)
+
+
+def _mark_applied(conn, up_to: int) -> None:
+    schema_migrations.create(conn, checkfirst=True)
+    for version, description, _ in MIGRATIONS:
+        if version <= up_to:
+            conn.execute(schema_migrations.insert().values(version=version, description=description))
+
+
+def _check(label: str, failures: list) -> None:
+    with engine.connect() as conn:
+        rows = {r.id: (r.avatar_url, r.password_hash) for r in conn.execute(
+            text("SELECT id, avatar_url, password_hash FROM users"))}
+    for user_id, _, _, _, expected in USERS:
+        if rows.get(user_id) != expected:
+            failures.append(f"{label}：用户 {user_id} 为 {rows.get(user_id)}，预期 {expected}")
+
+
+def from_version_1(failures: list) -> None:
+    """旧库：版本 1 之前就有 users 表，avatar_url 中存着哈希"""
+    _reset()
+    with engine.begin() as conn:
+        conn.execute(text(_LEGACY_USERS))
+        Base.metadata.create_all(conn)          # 其余的表；users 已存在，跳过
+        _mark_applied(conn, 1)
+        for user_id, phone, openid, value, _ in USERS:
+            conn.execute(
+                text("INSERT INTO users (id, phone, openid, avatar_url) VALUES (:id, :phone, :openid, :value)"),
+                {"id": user_id, "phone": phone, "openid": openid, "value": value},
+            )
+    upgrade(engine)
+    _check("从版本 1 升级", failures)
+
+
+def after_old_version_2(failures: list) -> None:
+    """早期的版本 2 已把所有 64 个字符的值移入 password_hash"""
+    _reset()
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        _mark_applied(conn, 4)
+        for user_id, phone, openid, value, _ in USERS:
+            conn.execute(User.__table__.insert().values(
+                id=user_id, phone=phone, openid=openid, avatar_url=None, password_hash=value,
+            ))
+    upgrade(engine)
+    _check("修复早期的版本 2", failures)
+
+
+def main() -> int:
+    failures = []
+    from_version_1(failures)
+    after_old_version_2(failures)
+    with engine.connect() as conn:
+        version = conn.execute(text("SELECT max(version) FROM schema_migrations")).scalar()
+    if version != LATEST:
+        failures.append(f"升级后版本为 {version}，预期 {LATEST}")
+    _reset()
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    print(f"2 个场景 × {len(USERS)} 个用户，{len(failures)} 项不通过")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        if _TMP_DIR:
+            shutil.rmtree(_TMP_DIR, ignore_errors=True)
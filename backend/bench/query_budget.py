@@ -0,0 +1,267 @@
+"""
+SQL 预算检查：逐个调用 routers/ 中的全部路由，检查每个接口的 SQL 条数与取回行数不超过预算
+- 数据由 seed_data.add_cycle_logs（generate_cycle_data）生成，两个规模各一个家庭：
+  SQL 条数必须与数据量无关（两个规模相同），行数按大规模家庭检查
+- 在进程内通过 TestClient 调用，数值取自响应头 X-DB-Queries / X-DB-Rows（见 query_stats）；
+  流式响应只统计开始发送前的语句，/stool/range 因此使用不流式的区间
+- 默认使用临时 SQLite 文件，无需外部服务；也可用 DATABASE_URL 指向专用的空库
+- routers/ 新增路由而 CASES 中没有时检查失败
+- 超出预算时先确认不是 N+1 / 多读了数据，确属预期再调整 CASES 中的数字
+
+用法:
+  python -m bench.query_budget
+  python -m bench.query_budget -v     # 打印每个接口的实际数值
+"""
+import os
+import shutil
+import tempfile
+
+_TMP_DIR = None
+if "DATABASE_URL" not in os.environ:
+    _TMP_DIR = tempfile.mkdtemp(prefix="careline-budget-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/budget.db"
+os.environ["QUERY_DEBUG"] = "true"
+os.environ.setdefault("PASSWORD_WORKERS", "0")
+os.environ.setdefault("MIGRATE_ON_STARTUP", "false")
+
+import argparse  # noqa: E402
+import random  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+from datetime import timedelta  # noqa: E402
+from typing import Any, Callable, NamedTuple, Optional  # noqa: E402
+
+from fastapi.routing import APIRoute  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import live  # noqa: E402
+from auth import generate_invite_code  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from main import app  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import ChemoCycle, Family, FamilyMember, FamilyMessage, RoleEnum, User  # noqa: E402
+from passwords import hash_password  # noqa: E402
+from seed_data import add_cycle_logs  # noqa: E402
+from streaks import rebuild_streaks  # noqa: E402
+from tz import china_today  # noqa: E402
+
+PASSWORD = "123456"
+CURRENT_CYCLE_DAY = 12
+_SEVERITIES = ("mild", "normal", "severe", "improving")
+
+
+class Scale(NamedTuple):
+    name: str
+    cycles: int    # 疗程数（最后一个进行中，第 CURRENT_CYCLE_DAY 天）
+    members: int   # 家庭成员数（1 个患者 + 家属）
+    messages: int  # 家属留言数
+
+
+SCALES = (Scale("small", 2, 2, 2), Scale("large", 6, 5, 8))
+
+
+class Case(NamedTuple):
+    method: str
+    route: str                # 路由模板，用于检查覆盖
+    max_queries: int
+    max_rows: int
+    path: str = ""            # 实际路径，str.format(**state)；默认同 route
+    json: Any = None          # 请求体，可为 state -> dict
+    user: str = "caregiver"   # state["tokens"] 中的用户
+    save: Optional[Callable[[dict, dict], None]] = None  # (state, 响应 JSON)
+
+
+def _save_token(name):
+    def save(state, body):
+        state["tokens"][name] = body["access_token"]
+    return save
+
+
+def _save(key, field="id"):
+    def save(state, body):
+        state[key] = body[field]
+    return save
+
+
+def _range(days):
+    return "?from={today_minus_%d}&to={today}" % days
+
+
+# 按顺序执行：先登录取 token，再读，最后写；行数预算按 large 规模（6 个疗程、5 名成员、8 条留言）
+# 预算取 SQLite 与 PostgreSQL 中较大者（PostgreSQL 下 /summary 在库内聚合、写入另有 pg_notify）
+CASES = (
+    Case("POST", "/auth/login", 3, 2, json=lambda s: {"phone": s["phones"]["patient"], "password": PASSWORD},
+         save=_save_token("patient")),
+    Case("POST", "/auth/login", 3, 2, json=lambda s: {"phone": s["phones"]["caregiver"], "password": PASSWORD},
+         save=_save_token("caregiver")),
+    Case("POST", "/auth/register", 5, 3, json=lambda s: {"phone": s["phones"]["new"], "password": PASSWORD},
+         save=_save_token("new")),
+    Case("POST", "/auth/wechat", 5, 3, json=lambda s: {"code": f"budget-{s['scale']}"}, save=_save_token("wechat")),
+    Case("GET", "/auth/me", 1, 1),
+    Case("GET", "/family/me", 1, 5),
+    Case("GET", "/cycle/current", 1, 1),
+    Case("GET", "/cycle/list", 1, 6),
+    Case("GET", "/daily/today", 1, 1, user="patient"),
+    Case("GET", "/daily/range", 1, 31, path="/daily/range" + _range(30)),
+    Case("GET", "/daily/range", 1, 11, path="/daily/range" + _range(30) + "&limit=10"),
+    Case("GET", "/daily/cycle/{cycle_no}", 1, 21, path="/daily/cycle/{cycle_no}"),
+    Case("GET", "/stool/today", 1, 10),
+    Case("GET", "/stool/range", 2, 130, path="/stool/range" + _range(30)),
+    Case("GET", "/summary", 6, 25),
+    Case("GET", "/summary/calendar", 3, 40),
+    Case("GET", "/summary/calendar/range", 2, 100, path="/summary/calendar/range" + _range(90)),
+    Case("GET", "/message/active", 1, 3, user="patient"),
+    Case("GET", "/home", 6, 12, user="patient"),
+    Case("GET", "/home", 6, 12),
+    Case("POST", "/live/ticket", 3, 1, user="patient", save=_save("live_ticket", "ticket")),
+    Case("GET", "/live", 3, 1, path="/live?ticket={live_ticket}"),
+    Case("PUT", "/daily/{log_date}", 11, 6, path="/daily/{today}", json={"energy": 2, "nausea": 1}, user="patient"),
+    # since=0 为全量同步，行数随数据量增长；之后的写入由增量同步（since=seq）取回
+    Case("GET", "/sync/changes", 4, 500, path="/sync/changes?since=0", save=_save("seq", "seq")),
+    Case("POST", "/stool", 6, 7, json={"bristol": 4}, user="patient", save=_save("event_id")),
+    Case("DELETE", "/stool/{event_id}", 6, 6, path="/stool/{event_id}", user="patient"),
+    Case("POST", "/message", 4, 3, json={"content": "今天感觉不错"}),
+    Case("POST", "/sync/batch", 27, 20, user="patient", json=lambda s: {"ops": [
+        {"op": "daily.upsert", "client_id": f"{s['scale']}-1", "date": s["today_minus_1"], "daily": {"energy": 1}},
+        {"op": "stool.create", "client_id": f"{s['scale']}-2", "stool": {"date": s["today_minus_1"], "bristol": 5}},
+        {"op": "stool.create", "client_id": f"{s['scale']}-3", "stool": {"bristol": 6}},
+    ]}),
+    Case("PATCH", "/cycle/{cycle_no}", 5, 5, path="/cycle/{cycle_no}", json={"regimen": "FOLFOX"}),
+    Case("POST", "/cycle", 6, 6, json=lambda s: {"cycle_no": s["cycle_no"] + 1, "start_date": s["today"]}),
+    Case("GET", "/sync/changes", 5, 20, path="/sync/changes?since={seq}"),
+    Case("POST", "/family/create", 7, 5, json={"name": "预算检查"}, user="new"),
+    Case("POST", "/family/join", 5, 9, json=lambda s: {"invite_code": s["invite_code"], "role": "caregiver"},
+         user="wechat"),
+    # 吊销后该用户的 token 全部失效，放在最后
+    Case("POST", "/auth/logout", 2, 2, user="wechat"),
+)
+
+
+def seed_family(db, index: int, scale: Scale) -> dict:
+    """一个家庭：scale.cycles 个疗程（generate_cycle_data 生成每日记录与排便），成员与留言；返回请求用的 state"""
+    today = china_today()
+    phones = {role: f"1990{index}{n:06d}" for n, role in enumerate(("patient", "caregiver", "new"))}
+    patient = User(phone=phones["patient"], nickname="患者", password_hash=hash_password(PASSWORD))
+    caregivers = [
+        User(phone=phones["caregiver"] if n == 0 else f"1991{index}{n:06d}", nickname=f"家属{n + 1}",
+             password_hash=hash_password(PASSWORD))
+        for n in range(scale.members - 1)
+    ]
+    db.add_all([patient, *caregivers])
+    db.flush()
+
+    family = Family(name=f"预算-{scale.name}", invite_code=generate_invite_code(), created_by=caregivers[0].id)
+    db.add(family)
+    db.flush()
+    db.add(FamilyMember(user_id=patient.id, family_id=family.id, role=RoleEnum.patient))
+    db.add_all(FamilyMember(user_id=u.id, family_id=family.id, role=RoleEnum.caregiver) for u in caregivers)
+
+    start = today - timedelta(days=CURRENT_CYCLE_DAY - 1)
+    for cycle_no in range(scale.cycles, 0, -1):
+        active = cycle_no == scale.cycles
+        db.add(ChemoCycle(family_id=family.id, cycle_no=cycle_no, start_date=start, length_days=21,
+                          regimen="FOLFOX", is_active=active))
+        days = (today - start).days if active else 21
+        add_cycle_logs(db, family.id, patient.id, cycle_no, start, days, _SEVERITIES[cycle_no % 4], today)
+        start -= timedelta(days=21 + 4)
+
+    for n in range(scale.messages):
+        db.add(FamilyMessage(family_id=family.id, sender_id=caregivers[n % len(caregivers)].id,
+                             content=f"留言 {n + 1}", is_active=True))
+    db.flush()
+    rebuild_streaks(db, family.id)
+    db.commit()
+
+    state = {
+        "scale": scale.name, "family_id": family.id, "invite_code": family.invite_code,
+        "cycle_no": scale.cycles, "phones": phones, "tokens": {}, "today": today.isoformat(),
+    }
+    state.update({f"today_minus_{d}": (today - timedelta(days=d)).isoformat() for d in (1, 30, 90)})
+    return state
+
+
+def _end_live_stream(family_id: int) -> None:
+    """SSE 连接建立后投递 reset，让 /live 的响应结束"""
+    deadline = time.monotonic() + 10
+    while live.broker.connections() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    live.broker.publish(family_id, live.RESET)
+
+
+def run_case(client: TestClient, case: Case, state: dict):
+    """执行一个用例，返回 (状态码, SQL 条数, 行数)"""
+    token = state["tokens"].get(case.user)
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    body = case.json(state) if callable(case.json) else case.json
+    if case.route == "/live":
+        threading.Thread(target=_end_live_stream, args=(state["family_id"],), daemon=True).start()
+        headers = {}
+
+    resp = client.request(case.method, (case.path or case.route).format(**state), json=body, headers=headers)
+    if resp.status_code < 400 and case.save:
+        case.save(state, resp.json())
+    return resp.status_code, int(resp.headers["x-db-queries"]), int(resp.headers["x-db-rows"])
+
+
+def uncovered_routes() -> list:
+    """routers/ 中没有用例的路由"""
+    routes = {
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.endpoint.__module__.startswith("routers.")
+        for method in route.methods
+    }
+    return sorted(routes - {(case.method, case.route) for case in CASES})
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-v", "--verbose", action="store_true", help="打印每个接口的实际数值")
+    args = parser.parse_args()
+
+    failures = [f"{method} {path}：没有预算用例" for method, path in uncovered_routes()]
+
+    random.seed(0)
+    upgrade(engine)
+    db = SessionLocal()
+    try:
+        states = [seed_family(db, index, scale) for index, scale in enumerate(SCALES)]
+    finally:
+        db.close()
+
+    results = {}  # case 序号 -> [(状态码, SQL 条数, 行数), ...]（按 SCALES 顺序）
+    with TestClient(app) as client:
+        for state in states:
+            for i, case in enumerate(CASES):
+                results.setdefault(i, []).append(run_case(client, case, state))
+
+    for i, case in enumerate(CASES):
+        name = f"{case.method} {(case.path or case.route).split('?')[0]}"
+        measured = results[i]
+        status, queries, rows = measured[-1]
+        if args.verbose:
+            counts = " / ".join(f"{q} 条 {r} 行" for _, q, r in measured)
+            print(f"  {name:32s} {counts}（预算 {case.max_queries} 条 {case.max_rows} 行）")
+        if any(s >= 400 for s, _, _ in measured):
+            failures.append(f"{name}：状态码 {[s for s, _, _ in measured]}")
+            continue
+        if len({q for _, q, _ in measured}) > 1:
+            failures.append(f"{name}：SQL 条数随数据量变化 {[q for _, q, _ in measured]}")
+        if queries > case.max_queries:
+            failures.append(f"{name}：{queries} 条 SQL，预算 {case.max_queries}")
+        if rows > case.max_rows:
+            failures.append(f"{name}：取回 {rows} 行，预算 {case.max_rows}")
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    print(f"{len(CASES)} 个用例 × {len(SCALES)} 个规模，{len(failures)} 项不符合预算")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        if _TMP_DIR:
+            shutil.rmtree(_TMP_DIR, ignore_errors=True)
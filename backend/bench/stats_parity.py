@@ -0,0 +1,43 @@
+"""
+关键指标一致性检查：PostgreSQL 聚合（stats_sql）vs Python 列式引擎（stats_engine）
+对库中每个家庭的每个疗程、每个 recent_days 取值比较两边的 KeyStats
+
+用法:
+  DATABASE_URL=postgresql://... python -m bench.stats_parity
+"""
+import sys
+
+from database import SessionLocal
+from models import ChemoCycle
+from stats_engine import compute_key_stats, load_cycle_columns
+from stats_sql import compute_key_stats_sql
+
+
+def main() -> int:
+    db = SessionLocal()
+    checked = mismatches = 0
+    try:
+        cycles = db.query(ChemoCycle.family_id, ChemoCycle.cycle_no).order_by(
+            ChemoCycle.family_id, ChemoCycle.cycle_no,
+        ).all()
+        for family_id, cycle_no in cycles:
+            cols = load_cycle_columns(db, family_id, [cycle_no]).get(cycle_no)
+            if cols is None:
+                continue
+            for recent_days in range(1, 8):
+                expected = compute_key_stats(cols, recent_days=recent_days).model_dump()
+                actual = compute_key_stats_sql(db, family_id, cycle_no, recent_days=recent_days).model_dump()
+                checked += 1
+                if expected != actual:
+                    mismatches += 1
+                    diff = {k: (expected[k], actual[k]) for k in expected if expected[k] != actual[k]}
+                    print(f"✗ family={family_id} cycle={cycle_no} recent={recent_days}: {diff}")
+    finally:
+        db.close()
+
+    print(f"{checked} 组比较，{mismatches} 组不一致")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
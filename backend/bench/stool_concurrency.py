@@ -0,0 +1,109 @@
+"""
+排便计数并发压测：多个客户端同时对同一天点击「+1」/ 删除，
+检查 daily_logs 上的 stool_count 与血/粘液计数是否与 stool_events 一致（无丢失更新）
+--retries N：每次点击带同一个 Idempotency-Key 并发重发 N 次，检查没有重复记录
+
+用法（先用 seed_data.py 准备数据并启动后端，建议多 worker）:
+  uvicorn main:app --port 8000 --workers 4
+  python -m bench.stool_concurrency --base http://localhost:8000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import uuid
+from datetime import date
+
+import httpx
+
+
+async def _login(client: httpx.AsyncClient, phone: str, password: str) -> dict:
+    r = await client.post("/auth/login", json={"phone": phone, "password": password})
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+async def _tap(client, headers, day: date, n: int, created: list, retries: int = 0):
+    for _ in range(n):
+        body = {"date": str(day), "bristol": 6, "blood": random.random() < 0.3, "mucus": random.random() < 0.5}
+        keyed = {**headers, "Idempotency-Key": uuid.uuid4().hex}
+        responses = await asyncio.gather(*[
+            client.post("/stool", json=body, headers=keyed) for _ in range(retries + 1)
+        ])
+        for r in responses:
+            r.raise_for_status()
+        ids = {r.json()["id"] for r in responses}
+        if len(ids) != 1:
+            print(f"  ✗ 同一 Idempotency-Key 产生了 {len(ids)} 条记录")
+        created.extend(ids)
+
+
+async def _delete(client, headers, ids: list):
+    for event_id in ids:
+        r = await client.delete(f"/stool/{event_id}", headers=headers)
+        r.raise_for_status()
+
+
+async def _counts(client, headers, day: date):
+    """(stool_events 汇总, daily_log 计数)，各为 (次数, 带血, 黏液)"""
+    stool = (await client.get("/stool/range", params={"from": str(day), "to": str(day)}, headers=headers)).json()[0]
+    daily = (await client.get("/daily/range", params={"from": str(day), "to": str(day)}, headers=headers)).json()
+    log = daily[0] if daily else {}
+    events = (stool["count"], stool["blood_count"], stool["mucus_count"])
+    counters = (log.get("stool_count") or 0, log.get("stool_blood_count") or 0, log.get("stool_mucus_count") or 0)
+    return events, counters
+
+
+async def _check(client, headers, day: date, baseline) -> bool:
+    """比较相对起始状态的变化量（种子数据里的 stool_count 可能与事件数不同）"""
+    events, counters = await _counts(client, headers, day)
+    expected = tuple(a - b for a, b in zip(events, baseline[0]))
+    actual = tuple(a - b for a, b in zip(counters, baseline[1]))
+    ok = expected == actual
+    print(f"  events Δ={expected} daily_log Δ={actual} {'✓' if ok else '✗ 丢失更新'}")
+    return ok
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://localhost:8000")
+    parser.add_argument("--phones", default="13800001111,13800002222", help="同一家庭的成员手机号，逗号分隔")
+    parser.add_argument("--password", default="123456")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--taps", type=int, default=25, help="每个客户端点击次数")
+    parser.add_argument("--retries", type=int, default=0, help="每次点击额外并发重发的次数（同一 Idempotency-Key）")
+    # 默认用一个没有 daily_log 的日期，同时验证「当天无记录时自动建行」
+    parser.add_argument("--date", type=date.fromisoformat, default=date(2000, 1, 1))
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.base, limits=limits, timeout=30) as client:
+        # 多个家庭成员各自登录（患者与照护者同时点击）
+        phones = args.phones.split(",")
+        headers = [await _login(client, phones[i % len(phones)], args.password) for i in range(args.clients)]
+
+        baseline = await _counts(client, headers[0], args.date)
+        print(f"并发 +1：{args.clients} 个客户端 × {args.taps} 次")
+        created: list = []
+        await asyncio.gather(*[_tap(client, h, args.date, args.taps, created, args.retries) for h in headers])
+        ok = await _check(client, headers[0], args.date, baseline)
+        if len(created) != args.clients * args.taps:
+            print(f"  ✗ {args.clients * args.taps} 次点击产生了 {len(created)} 条记录")
+            ok = False
+
+        print("并发删除一半")
+        random.shuffle(created)
+        half = created[: len(created) // 2]
+        chunks = [half[i:: args.clients] for i in range(args.clients)]
+        await asyncio.gather(*[_delete(client, h, c) for h, c in zip(headers, chunks)])
+        ok = await _check(client, headers[0], args.date, baseline) and ok
+
+        # 清理剩余事件
+        await _delete(client, headers[0], created[len(half):])
+        ok = await _check(client, headers[0], args.date, baseline) and ok
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
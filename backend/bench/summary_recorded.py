@@ -0,0 +1,95 @@
+"""
+/summary 只统计填写过症状的日子：点排便按钮建立、只有排便计数的记录不进入趋势、关键指标与最辛苦的日子
+- 一天只点排便（多次、带血），另一天填写症状；汇总中只能出现后者
+- PostgreSQL 下分别检查库内聚合（stats_sql）与 Python 列式引擎（stats_engine）
+- 默认使用临时 SQLite 文件；也可用 DATABASE_URL 指向专用的空库
+
+用法:
+  python -m bench.summary_recorded
+  DATABASE_URL=postgresql://... python -m bench.summary_recorded
+"""
+import os
+import shutil
+import tempfile
+
+_TMP_DIR = None
+if "DATABASE_URL" not in os.environ:
+    _TMP_DIR = tempfile.mkdtemp(prefix="careline-summary-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/summary.db"
+os.environ.setdefault("PASSWORD_WORKERS", "0")
+os.environ.setdefault("MIGRATE_ON_STARTUP", "false")
+
+import sys  # noqa: E402
+from datetime import timedelta  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import database  # noqa: E402
+from main import app  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from routers import summary_router  # noqa: E402
+from tz import china_today  # noqa: E402
+
+
+def _headers(client: TestClient, phone: str) -> dict:
+    r = client.post("/auth/register", json={"phone": phone, "password": "123456"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _check(summary: dict, logged: str) -> list:
+    """汇总中只能出现 logged 这一天"""
+    stats = summary["key_stats"]
+    failures = []
+    trend_days = [point["date"] for point in summary["trends"]]
+    if trend_days != [logged]:
+        failures.append(f"trends 为 {trend_days}，预期 [{logged}]")
+    if [day["date"] for day in stats["worst_days"]] != [logged]:
+        failures.append(f"worst_days 为 {stats['worst_days']}")
+    if stats["blood_events"]:
+        failures.append(f"blood_events 为 {stats['blood_events']}，只点排便的那天不应计入")
+    if stats["max_stool"] is not None or stats["avg_stool_7d"] is not None:
+        failures.append(f"排便指标为 max={stats['max_stool']} avg={stats['avg_stool_7d']}，预期为空")
+    if stats["avg_energy_7d"] != 3.0:
+        failures.append(f"avg_energy_7d 为 {stats['avg_energy_7d']}，预期 3.0")
+    return failures
+
+
+def main() -> int:
+    upgrade(database.engine)
+    today = china_today()
+    stool_day, logged_day = today - timedelta(days=2), today - timedelta(days=1)
+
+    failures = []
+    with TestClient(app) as client:
+        h = _headers(client, "13900000101")
+        fam = client.post("/family/create", json={"name": "汇总检查"}, headers=h).json()
+        h = {"Authorization": f"Bearer {fam['access_token']}"}
+        client.post("/cycle", json={"cycle_no": 1, "start_date": str(today - timedelta(days=5))}, headers=h)
+
+        for _ in range(6):
+            client.post("/stool", json={"date": str(stool_day), "bristol": 7, "blood": True}, headers=h)
+        client.put(f"/daily/{logged_day}", json={"energy": 3, "nausea": 1}, headers=h)
+
+        engines = [False, True] if database.engine.dialect.name == "postgresql" else [False]
+        for stats_sql in engines:
+            summary_router.SUMMARY_STATS_SQL = stats_sql
+            summary_router.summary_cache.clear()
+            r = client.get("/summary", headers=h)
+            label = "stats_sql" if stats_sql else "stats_engine"
+            if r.status_code != 200:
+                failures.append(f"{label}：状态码 {r.status_code}")
+                continue
+            failures += [f"{label}：{failure}" for failure in _check(r.json(), str(logged_day))]
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    print(f"{len(engines)} 种统计实现，{len(failures)} 项不通过")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    finally:
+        if _TMP_DIR:
+            shutil.rmtree(_TMP_DIR, ignore_errors=True)
@@ -0,0 +1,57 @@
+"""
+列式响应（format=columnar）：图表只需要按字段的平行数组，不必每行重复字段名
+编码规则见 schemas.ColumnarTable；客户端解码见 frontend/src/utils/columnar.js、miniprogram/utils/util.js
+"""
+from datetime import date
+from typing import Any, Optional, Sequence
+
+import orjson
+from sqlalchemy.engine import Result
+
+from schemas import ResponseFormat
+from serialization import FastJSONResponse, rows_json
+
+
+def encode_column(values: Sequence) -> Any:
+    """按取值选择编码：日期 → 相对天数，布尔 → 0/1，空值多 → 稀疏"""
+    present = [i for i, v in enumerate(values) if v is not None]
+    if not present:
+        return {"i": [], "v": []}
+
+    sample = values[present[0]]
+    if type(sample) is date:  # datetime 也是 date 的子类，保持原样输出
+        return {"base": sample.isoformat(), "d": [None if v is None else (v - sample).days for v in values]}
+    if isinstance(sample, bool):
+        values = [None if v is None else int(v) for v in values]
+
+    if 2 * len(present) < len(values):
+        return {"i": present, "v": [values[i] for i in present]}
+    return list(values)
+
+
+def to_columnar(rows: Sequence, keys: Optional[Sequence[str]] = None) -> dict:
+    """查询得到的 Row 列表 → {"n", "columns"}；keys 指定输出的列及顺序（默认全部）"""
+    fields = rows[0]._fields if rows else ()
+    columns = dict(zip(fields, zip(*rows)))
+    return {
+        "n": len(rows),
+        "columns": {key: encode_column(columns.get(key, ())) for key in (keys or fields)},
+    }
+
+
+def table_response(result: Result, fmt: ResponseFormat = ResponseFormat.rows) -> FastJSONResponse:
+    """查询结果按请求的格式输出（对象数组或列式）"""
+    if fmt == ResponseFormat.columnar:
+        return FastJSONResponse(orjson.dumps(to_columnar(result.all(), list(result.keys()))))
+    return FastJSONResponse(rows_json(result))
+
+
+def page_response(
+    rows: Sequence, keys: Sequence[str], fmt: ResponseFormat, next_cursor: Optional[str],
+) -> FastJSONResponse:
+    """一页查询结果（行末附带的排序键列不输出）：{"items", "next_cursor"}"""
+    if fmt == ResponseFormat.columnar:
+        items = to_columnar(rows, keys)
+    else:
+        items = [dict(zip(keys, row)) for row in rows]
+    return FastJSONResponse(orjson.dumps({"items": items, "next_cursor": next_cursor}))
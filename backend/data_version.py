@@ -0,0 +1,80 @@
+"""
+家庭数据版本号：写入时 +1（与写入同一事务），读取方据此判断缓存是否过期
+版本存在数据库中，因此对所有 uvicorn worker 一致
+同时作为变更流水（change_log）的序号：本事务登记的变更以新版本号写入
+提交后向该家庭的在线连接推送 change 事件（见 live.py）
+
+写入路径的行锁顺序（各路径一致，避免 PostgreSQL 上互相等待成死锁）：
+  daily_logs / stool_events / chemo_cycles 行 → family_streaks（record_log_date）→ family_data_versions（本模块）
+bump_family_version 应是事务中最后一个加锁的写入
+"""
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from live import publish_on_commit
+from models import ChangeLog, FamilyDataVersion
+
+_PENDING_CHANGES = "pending_changes"
+
+
+def record_change(db: Session, entity: str, entity_id: int) -> None:
+    """登记本事务中变更（新增/修改/删除）的记录，在 bump_family_version 时写入 change_log"""
+    db.info.setdefault(_PENDING_CHANGES, set()).add((entity, entity_id))
+
+
+def pending_changes(db: Session) -> set:
+    """本事务已登记、尚未写入的变更（批量同步在保存点回滚时用来恢复）"""
+    return set(db.info.get(_PENDING_CHANGES, ()))
+
+
+def restore_pending_changes(db: Session, changes: set) -> None:
+    db.info[_PENDING_CHANGES] = set(changes)
+
+
+def bump_family_version(db: Session, family_id: int) -> int:
+    """在当前事务中将家庭数据版本 +1（随调用方的 commit 生效），返回新版本号
+    首次写入与并发写入都走同一条 upsert：两个事务同时建行时后者等待并在其上 +1，不会主键冲突"""
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    now = datetime.utcnow()
+    stmt = insert(FamilyDataVersion).values(family_id=family_id, version=1, updated_at=now)
+    version = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[FamilyDataVersion.family_id],
+            set_={"version": FamilyDataVersion.version + 1, "updated_at": now},
+        )
+        .returning(FamilyDataVersion.version)
+    ).scalar_one()
+
+    changes = db.info.pop(_PENDING_CHANGES, None)
+    if changes:
+        db.add_all([
+            ChangeLog(family_id=family_id, seq=version, entity=entity, entity_id=entity_id)
+            for entity, entity_id in sorted(changes)
+        ])
+    db.flush()
+    publish_on_commit(db, family_id, {
+        "type": "change",
+        "seq": version,
+        "entities": sorted({entity for entity, _ in changes or ()}),
+    })
+    return version
+
+
+def get_family_version(db: Session, family_id: int) -> int:
+    return (
+        db.query(FamilyDataVersion.version)
+        .filter(FamilyDataVersion.family_id == family_id)
+        .scalar()
+    ) or 0
+
+
+async def get_family_version_async(db: AsyncSession, family_id: int) -> int:
+    """同上（DB_ASYNC 的 async 路由）"""
+    return (await db.execute(
+        select(FamilyDataVersion.version).where(FamilyDataVersion.family_id == family_id)
+    )).scalar() or 0
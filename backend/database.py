@@ -1,23 +1,63 @@
 """
 Database connection and session management
+同步（psycopg2）与异步（asyncpg）两套引擎，由 DB_ASYNC 切换
 """
 import os
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from models import Base
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+import query_stats
 
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "postgresql://careline:careline_secret@db:5432/careline"
 )
+# 开启后热点读接口（GET /summary）、登录注册与 /stool/range 流式响应改用 AsyncSession（asyncpg）；
+# 其他同步路由仍在线程池中用同步会话执行（经 run_sync 放到事件循环上反而更慢，见 README）
+ASYNC_DB = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, pool_size=10, max_overflow=20)
+# SQLite（本地/测试）使用 SQLAlchemy 默认连接池，不接受 pool_size 等参数；
+# 其他数据库的连接池带占用与等待指标（metrics）
+_SQLITE = DATABASE_URL.startswith("sqlite")
+POOL_KWARGS = {} if _SQLITE else {"pool_size": 10, "max_overflow": 20}
+
+engine = create_engine(
+    DATABASE_URL, pool_pre_ping=True, **POOL_KWARGS,
+    **({} if _SQLITE else {"poolclass": metrics.InstrumentedQueuePool}),
+)
+metrics.instrument_engine(engine)
+query_stats.instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def init_db():
-    """Create all tables"""
-    Base.metadata.create_all(bind=engine)
+def _async_url(url: str) -> str:
+    for sync_prefix, async_prefix in (
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    async_engine = create_async_engine(
+        _async_url(DATABASE_URL), pool_pre_ping=True, **POOL_KWARGS,
+        **({} if _SQLITE else {"poolclass": metrics.InstrumentedAsyncAdaptedQueuePool}),
+    )
+    metrics.instrument_engine(async_engine.sync_engine)
+    query_stats.instrument_engine(async_engine.sync_engine)
+    # expire_on_commit=False：响应序列化发生在 greenlet 之外，不能再触发懒加载
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False,
+    )
 
 
 def get_db():
@@ -27,3 +67,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency: yield an AsyncSession (DB_ASYNC 模式)"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# async 路由直接依赖的会话：DB_ASYNC 时为 AsyncSession，否则为 Session；配合 run_db 使用
+get_session = get_async_db if ASYNC_DB else get_db
+
+
+async def run_db(db, fn, *args):
+    """在 async 路由中执行同步的数据库函数 fn(db, *args)：
+    DB_ASYNC 时经 AsyncSession.run_sync 在事件循环上执行，否则放到线程池"""
+    if ASYNC_DB:
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
@@ -0,0 +1,111 @@
+"""
+写接口幂等：客户端在请求头带 Idempotency-Key，同一用户同一 key 只执行一次
+- 首次请求：响应与业务写入在同一事务中保存
+- 重试：直接返回保存的响应（带 Idempotent-Replayed 头），不再改动任何计数
+- 同一 key 用于不同的请求（路径或请求体不同）：422
+- 超过 IDEMPOTENCY_TTL_HOURS 的记录视为过期，写入时按小概率顺带清理
+"""
+import hashlib
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from fastapi import Header, HTTPException, Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import IdempotencyKey
+
+IDEMPOTENCY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+PRUNE_PROBABILITY = 0.01
+
+
+def idempotency_key_header(
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=64),
+) -> Optional[str]:
+    """Dependency: 读取 Idempotency-Key 请求头（可选）"""
+    return idempotency_key or None
+
+
+def request_hash(payload: Any) -> str:
+    if isinstance(payload, BaseModel):
+        payload = payload.model_dump(mode="json")
+    return hashlib.sha1(to_json(payload)).hexdigest()
+
+
+def find_key(db: Session, user_id: int, key: str) -> Optional[IdempotencyKey]:
+    """未过期的幂等记录；已过期的顺手删除，以便重新使用该 key"""
+    record = db.get(IdempotencyKey, (user_id, key))
+    if record is not None and record.created_at < datetime.utcnow() - IDEMPOTENCY_TTL:
+        db.delete(record)
+        db.flush()
+        return None
+    return record
+
+
+def _replayed(record: IdempotencyKey, endpoint: str, payload: Any) -> Response:
+    """返回保存的响应；同一 key 用于不同的请求时 422"""
+    if record.endpoint != endpoint or record.request_hash != request_hash(payload):
+        raise HTTPException(status_code=422, detail="Idempotency-Key 已用于其他请求")
+    return Response(
+        content=record.response,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def replay(db: Session, user_id: int, key: Optional[str], endpoint: str, payload: Any) -> Optional[Response]:
+    """已处理过的请求返回保存的响应；否则返回 None，由调用方正常执行"""
+    if not key:
+        return None
+    record = find_key(db, user_id, key)
+    if record is None:
+        return None
+    return _replayed(record, endpoint, payload)
+
+
+def save_key(db: Session, user_id: int, key: str, endpoint: str, payload: Any, body: BaseModel) -> None:
+    """在当前事务中记录响应（随业务写入一起提交）"""
+    db.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        endpoint=endpoint,
+        request_hash=request_hash(payload),
+        response=body.model_dump_json(),
+    ))
+    db.flush()
+    if random.random() < PRUNE_PROBABILITY:
+        prune_keys(db)
+
+
+def commit_with_key(db: Session, user_id: int, key: Optional[str], endpoint: str, payload: Any, body: BaseModel):
+    """
+    保存幂等记录并提交业务写入，返回响应
+    并发的同 key 请求会在插入幂等记录时冲突：回滚本次写入，返回先完成的那次的响应
+    （与 replay 一样先比对路径与请求体，不同则 422）
+    """
+    if not key:
+        db.commit()
+        return body
+    try:
+        save_key(db, user_id, key, endpoint, payload, body)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        record = find_key(db, user_id, key)
+        if record is None:
+            raise
+        return _replayed(record, endpoint, payload)
+    return body
+
+
+def prune_keys(db: Session) -> int:
+    """删除过期的幂等记录"""
+    return (
+        db.query(IdempotencyKey)
+        .filter(IdempotencyKey.created_at < datetime.utcnow() - IDEMPOTENCY_TTL)
+        .delete(synchronize_session=False)
+    )
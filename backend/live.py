@@ -0,0 +1,233 @@
+"""
+家庭实时推送：写入提交后向同一家庭的在线连接（SSE）广播事件
+- 事件只是提示（{"type": "change", "seq": ...} / {"type": "message"}），客户端收到后按 /sync/changes 拉取
+- 跨 worker：PostgreSQL 下写入事务内 pg_notify（随 commit 投递、随 rollback 丢弃），
+  每个 worker 一个 LISTEN 线程接收后分发给本进程的连接
+- 其他数据库（SQLite 本地/测试）：进程内广播，在 Session after_commit 时发布
+- 背压：每个连接一个有界队列；队列满说明客户端跟不上，清空队列改发 reset，客户端全量重拉
+"""
+import asyncio
+import json
+import os
+import select
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+LIVE_CHANNEL = "careline_live"
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "32"))
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+# 内置 LISTEN 线程：auto（PostgreSQL 时启用）| local（只做进程内广播）
+LIVE_BACKEND = os.getenv("LIVE_BACKEND", "auto").lower()
+
+RESET = {"type": "reset"}
+
+_PENDING_EVENTS = "live_events"
+
+
+class Subscriber:
+    """一个 SSE 连接"""
+
+    __slots__ = ("family_id", "queue", "lagging")
+
+    def __init__(self, family_id: int, maxsize: int):
+        self.family_id = family_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.lagging = False
+
+    def offer(self, item: dict) -> bool:
+        """非阻塞投递；队列满时丢弃积压，只留一个 reset（之后的事件不再投递）。返回是否触发 reset"""
+        if self.lagging:
+            return False
+        try:
+            self.queue.put_nowait(item)
+            return False
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+            self.lagging = True
+            return True
+
+
+class LocalBroker:
+    """进程内广播：family_id -> 连接集合；发布可来自任意线程"""
+
+    # 写入方是否需要在事务内通过数据库投递（pg_notify）
+    transactional = False
+
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscriber]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.delivered = 0
+        self.resets = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        self._loop = None
+
+    def subscribe(self, family_id: int) -> Subscriber:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        sub = Subscriber(family_id, self.queue_size)
+        self._subscribers[family_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        subs = self._subscribers.get(sub.family_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.family_id]
+
+    def publish(self, family_id: int, item: dict) -> None:
+        """线程安全：在事件循环上分发"""
+        loop = self._loop
+        if loop is None or loop.is_closed() or family_id not in self._subscribers:
+            return
+        loop.call_soon_threadsafe(self._dispatch, family_id, item)
+
+    def _dispatch(self, family_id: int, item: dict) -> None:
+        for sub in list(self._subscribers.get(family_id, ())):
+            if sub.offer(item):
+                self.resets += 1
+            else:
+                self.delivered += 1
+
+    def connections(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "connections": self.connections(),
+            "delivered": self.delivered,
+            "resets": self.resets,
+        }
+
+
+class PostgresBroker(LocalBroker):
+    """跨 worker：后台线程 LISTEN，收到的 NOTIFY 转交进程内广播"""
+
+    transactional = True
+
+    def __init__(self, dsn: str, queue_size: int = LIVE_QUEUE_SIZE):
+        super().__init__(queue_size)
+        self.dsn = dsn
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    async def start(self) -> None:
+        await super().start()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="live-listen", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join, 5)
+            self._thread = None
+        await super().stop()
+
+    def _listen_forever(self) -> None:
+        import psycopg2
+
+        while not self._stopping.is_set():
+            try:
+                conn = psycopg2.connect(self.dsn)
+            except psycopg2.Error as exc:
+                print(f"⚠️ live LISTEN 连接失败: {exc}")
+                self._stopping.wait(5)
+                continue
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {LIVE_CHANNEL}")
+                # 重连期间可能漏掉通知：让所有连接重拉一次
+                self._broadcast_reset()
+                while not self._stopping.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._receive(conn.notifies.pop(0).payload)
+            except psycopg2.Error as exc:
+                print(f"⚠️ live LISTEN 中断，重连: {exc}")
+            finally:
+                conn.close()
+
+    def _receive(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+            family_id = int(message.pop("family_id"))
+        except (ValueError, KeyError, TypeError):
+            return
+        LocalBroker.publish(self, family_id, message)
+
+    def _broadcast_reset(self) -> None:
+        for family_id in list(self._subscribers):
+            LocalBroker.publish(self, family_id, RESET)
+
+
+broker: LocalBroker = LocalBroker()
+
+
+def configure(database_url: str) -> LocalBroker:
+    """按数据库选择广播实现（应用启动时调用一次）"""
+    global broker
+    if LIVE_BACKEND != "local" and database_url.startswith("postgresql"):
+        broker = PostgresBroker(database_url.replace("postgresql+psycopg2://", "postgresql://", 1))
+    else:
+        broker = LocalBroker()
+    return broker
+
+
+def publish_on_commit(db: Session, family_id: int, item: dict) -> None:
+    """登记一个事件：当前事务提交后才对客户端可见，回滚则丢弃"""
+    if broker.transactional and db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": LIVE_CHANNEL, "payload": json.dumps({"family_id": family_id, **item})},
+        )
+        return
+    db.info.setdefault(_PENDING_EVENTS, []).append((family_id, item))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    for family_id, item in session.info.pop(_PENDING_EVENTS, ()):
+        broker.publish(family_id, item)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_EVENTS, None)
+
+
+def sse_event(item: dict) -> str:
+    """SSE 帧：event 名为事件 type，data 为 JSON"""
+    return f"event: {item['type']}\ndata: {json.dumps(item, ensure_ascii=False)}\n\n"
+
+
+async def event_stream(sub: Subscriber, hello: dict):
+    """SSE 响应体：hello → 事件 / 心跳；reset 后结束，由客户端重连"""
+    try:
+        yield f"retry: 5000\n{sse_event(hello)}"
+        while True:
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield sse_event(item)
+            if item["type"] == RESET["type"]:
+                return
+    finally:
+        broker.unsubscribe(sub)
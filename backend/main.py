@@ -5,10 +5,18 @@ FastAPI 后端主入口
 import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import SQLAlchemyError
 
-from database import init_db
+from auth import context_cache, revocation_cache, token_cache
+import live
+import metrics
+import migrations
+import passwords
+import query_stats
+from database import DATABASE_URL, engine
+from serialization import FastJSONResponse
 from routers import (
     auth_router,
     family_router,
@@ -17,15 +25,30 @@ from routers import (
     stool_router,
     summary_router,
     message_router,
+    home_router,
+    sync_router,
+    live_router,
 )
 
 
+# 启动时执行迁移（本地开发 / 单进程测试用）；部署时由 python migrations.py 在 worker 启动前执行
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application startup/shutdown"""
-    init_db()
-    print("✅ CareLine 数据库已初始化")
+    if MIGRATE_ON_STARTUP:
+        migrations.upgrade(engine)
+    version = migrations.check_schema(engine)
+    print(f"✅ CareLine 数据库结构版本 {version}")
+    passwords.start()
+    broker = live.configure(DATABASE_URL)
+    await broker.start()
     yield
+    await broker.stop()
+    passwords.stop()
+    metrics.mark_process_dead()
     print("👋 CareLine 关闭")
 
 
@@ -34,6 +57,7 @@ app = FastAPI(
     description="化疗周期副作用管理系统 - 直肠癌定制版",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # CORS - allow frontend dev server and WeChat
@@ -45,6 +69,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(query_stats.QueryStatsMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Register routers
 app.include_router(auth_router.router)
@@ -54,6 +80,9 @@ app.include_router(daily_router.router)
 app.include_router(stool_router.router)
 app.include_router(summary_router.router)
 app.include_router(message_router.router)
+app.include_router(home_router.router)
+app.include_router(sync_router.router)
+app.include_router(live_router.router)
 
 
 @app.get("/")
@@ -68,4 +97,29 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "auth_cache": {
+            "token": token_cache.stats(),
+            "context": context_cache.stats(),
+            "revocation": revocation_cache.stats(),
+        },
+        "live": live.broker.stats(),
+        "passwords": passwords.stats(),
+    }
+
+
+@app.get("/ready")
+def ready():
+    """就绪检查：实际访问数据库（连接 + 结构版本），不可用时返回 503"""
+    try:
+        version = migrations.check_schema(engine)
+    except (SQLAlchemyError, RuntimeError) as exc:
+        return FastJSONResponse({"status": "unavailable", "detail": str(exc)}, status_code=503)
+    return {"status": "ready", "schema_version": version}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus 指标（多 worker 时汇总全部 worker）"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
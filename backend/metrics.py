@@ -0,0 +1,124 @@
+"""
+Prometheus 指标：按路由的请求延迟、在途请求数、连接池占用与等待、SQL 语句耗时
+- 多 worker：设置 PROMETHEUS_MULTIPROC_DIR 后各 worker 把指标写入该目录，/metrics 汇总全部 worker
+  （目录需在 worker 启动前清空，见 Dockerfile；未设置时只统计当前进程）
+- 路由以模板路径为标签（/daily/{log_date}），语句以类型为标签（select / insert / ...），避免标签基数膨胀
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUESTS = Counter("http_requests_total", "HTTP 请求数", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP 请求耗时", ["method", "route"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "处理中的 HTTP 请求", multiprocess_mode="livesum")
+
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "已借出的数据库连接", ["pool"], multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "超出 pool_size 的连接数（负数表示池中尚有未建立的连接）", ["pool"], multiprocess_mode="livesum",
+)
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "从连接池借出连接的等待时间", ["pool"], buckets=_DB_BUCKETS)
+STATEMENT_LATENCY = Histogram("db_statement_duration_seconds", "SQL 语句耗时", ["operation"], buckets=_DB_BUCKETS)
+
+_OPERATIONS = {"select", "insert", "update", "delete", "with"}
+
+
+def _instrumented_pool(base, name: str):
+    """带指标的连接池：借出等待时间（池满时 _do_get 阻塞等待归还），借出 / 归还后更新占用数"""
+
+    class InstrumentedPool(base):
+        def _do_get(self):
+            t0 = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                POOL_WAIT.labels(name).observe(time.perf_counter() - t0)
+                self._update_gauges()
+
+        def _do_return_conn(self, record):
+            super()._do_return_conn(record)
+            self._update_gauges()
+
+        def _update_gauges(self):
+            POOL_CHECKED_OUT.labels(name).set(self.checkedout())
+            POOL_OVERFLOW.labels(name).set(self.overflow())
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+InstrumentedQueuePool = _instrumented_pool(QueuePool, "sync")
+InstrumentedAsyncAdaptedQueuePool = _instrumented_pool(AsyncAdaptedQueuePool, "async")
+
+
+def instrument_engine(engine) -> None:
+    """按语句类型统计 SQL 耗时；异步引擎传入 async_engine.sync_engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        operation = statement.lstrip()[:6].lower()
+        STATEMENT_LATENCY.labels(operation if operation in _OPERATIONS else "other").observe(
+            time.perf_counter() - started
+        )
+
+
+class MetricsMiddleware:
+    """ASGI 中间件（不缓冲响应体，SSE 等流式响应照常工作）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            # 路由匹配后 FastAPI 把匹配到的路由写入 scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - t0)
+            REQUESTS.labels(scope["method"], route, str(status)).inc()
+
+
+def render() -> bytes:
+    """全部 worker（多进程模式）或当前进程的指标，Prometheus 文本格式"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead() -> None:
+    """worker 退出时清理其 livesum 类指标文件"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
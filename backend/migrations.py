@@ -0,0 +1,160 @@
+"""
+数据库结构迁移：按版本号顺序执行，每个版本只执行一次（已执行的版本记录在 schema_migrations 表）
+- 部署时在启动 worker 之前运行一次：python migrations.py（Dockerfile 的 CMD 已包含）
+- worker 启动时只做一次版本检查（check_schema），不再 create_all / 反射表结构
+- 新增结构变更：修改 models.py，并在 MIGRATIONS 末尾追加 (版本号, 说明, 函数)
+  版本 1 按当前 models 建表，之后的迁移要兼容新库中表 / 列已由版本 1 建好的情况（先检查再修改）
+
+用法:
+  python migrations.py           # 执行未执行的迁移
+  python migrations.py --check   # 只检查，落后时退出码为 1
+"""
+import argparse
+import re
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from models import Base, LiveTicket
+from streaks import rebuild_streaks
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(128), nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+# 多个实例同时部署时，PostgreSQL 下用事务级 advisory lock 保证只有一个在执行
+_LOCK_ID = 0x6361_7265  # "care"
+
+
+def _create_tables(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+
+# 旧版无盐 SHA-256：hexdigest，恰为 64 位小写十六进制
+_LEGACY_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def _password_hash_column(conn: Connection) -> None:
+    if "password_hash" in {column["name"] for column in inspect(conn).get_columns("users")}:
+        return
+    conn.execute(text("ALTER TABLE users ADD COLUMN password_hash VARCHAR(255)"))
+    # 旧版把手机号账号的无盐 SHA-256 存在 avatar_url 中：移到 password_hash，登录成功后改存 scrypt
+    # 十六进制在 Python 中判断（SQLite 与 PostgreSQL 的正则写法不同）；恰为 64 个字符的头像地址不动
+    rows = conn.execute(text(
+        "SELECT id, avatar_url FROM users WHERE phone IS NOT NULL AND length(avatar_url) = 64"
+    )).all()
+    for user_id, value in rows:
+        if _LEGACY_HASH.fullmatch(value):
+            conn.execute(
+                text("UPDATE users SET password_hash = avatar_url, avatar_url = NULL WHERE id = :id"),
+                {"id": user_id},
+            )
+
+
+def _restore_avatar_urls(conn: Connection) -> None:
+    # 早期的版本 2 把所有 64 个字符的 avatar_url 都当作密码哈希移走了：
+    # 非十六进制的、以及微信账号（无手机号，不会有密码）的移回 avatar_url
+    rows = conn.execute(text(
+        "SELECT id, phone, password_hash FROM users "
+        "WHERE avatar_url IS NULL AND length(password_hash) = 64"
+    )).all()
+    for user_id, phone, value in rows:
+        if phone is None or not _LEGACY_HASH.fullmatch(value):
+            conn.execute(
+                text("UPDATE users SET avatar_url = password_hash, password_hash = NULL WHERE id = :id"),
+                {"id": user_id},
+            )
+
+
+def _rebuild_streaks(conn: Connection) -> None:
+    # 连续记录天数改为只统计填写过症状的日子（不含点排便按钮建立的记录）
+    session = Session(bind=conn)
+    try:
+        rebuild_streaks(session)
+    finally:
+        session.close()
+
+
+def _live_tickets(conn: Connection) -> None:
+    LiveTicket.__table__.create(conn, checkfirst=True)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "初始表结构", _create_tables),
+    (2, "users.password_hash（旧版哈希从 avatar_url 迁入）", _password_hash_column),
+    (3, "按填写症状的日子重建连续记录天数", _rebuild_streaks),
+    (4, "live_tickets（/live 一次性票据）", _live_tickets),
+    (5, "把版本 2 误移入 password_hash 的头像地址移回 avatar_url", _restore_avatar_urls),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    """已执行到的版本；尚未建立 schema_migrations 时为 0"""
+    try:
+        with conn.begin_nested():
+            return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+    except DBAPIError:
+        return 0
+
+
+def upgrade(engine: Engine) -> List[int]:
+    """执行全部未执行的迁移（同一事务），返回本次执行的版本号"""
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _LOCK_ID})
+        schema_migrations.create(conn, checkfirst=True)
+        done = current_version(conn)
+        applied = []
+        for version, description, migrate in MIGRATIONS:
+            if version <= done:
+                continue
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=version, description=description))
+            applied.append(version)
+        return applied
+
+
+def check_schema(engine: Engine) -> int:
+    """worker 启动时的版本检查（一次查询）：落后于代码时拒绝启动"""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST:
+        raise RuntimeError(
+            f"数据库结构版本为 {version}，当前代码需要 {LATEST}：请先运行 python migrations.py"
+        )
+    return version
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="只检查版本，不执行迁移")
+    args = parser.parse_args()
+
+    from database import engine
+
+    if args.check:
+        with engine.connect() as conn:
+            version = current_version(conn)
+        print(f"数据库结构版本 {version} / 最新 {LATEST}")
+        return 0 if version >= LATEST else 1
+
+    applied = upgrade(engine)
+    if applied:
+        print(f"✅ 已执行迁移 {', '.join(map(str, applied))}，当前版本 {LATEST}")
+    else:
+        print(f"✅ 数据库结构已是最新（版本 {LATEST}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,10 @@ CareLine Database Models
 """
 from datetime import date, datetime
 from sqlalchemy import (
-    Column, Integer, String, Float, Boolean, Date, DateTime,
-    Text, ForeignKey, UniqueConstraint, Index, Enum as SAEnum
+    Column, Integer, BigInteger, String, Float, Boolean, Date, DateTime,
+    Text, ForeignKey, UniqueConstraint, Index, Enum as SAEnum, or_, true
 )
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, declarative_base
 import enum
 import uuid
@@ -27,6 +28,7 @@ class User(Base):
     phone = Column(String(20), unique=True, nullable=True)
     nickname = Column(String(64), nullable=True)
     avatar_url = Column(String(512), nullable=True)
+    password_hash = Column(String(255), nullable=True)  # passwords.hash_password：scrypt$N$r$p$salt$hash
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -34,6 +36,15 @@ class User(Base):
     family_memberships = relationship("FamilyMember", back_populates="user")
 
 
+class TokenRevocation(Base):
+    """Token 吊销表：token 中的 ver 小于 min_version 即视为失效"""
+    __tablename__ = "token_revocations"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    min_version = Column(Integer, nullable=False, default=0)
+    revoked_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Family(Base):
     __tablename__ = "families"
 
@@ -51,6 +62,71 @@ class Family(Base):
     messages = relationship("FamilyMessage", back_populates="family")
 
 
+class FamilyDataVersion(Base):
+    """家庭数据版本号：每次写入（每日记录/排便/疗程）+1，用于缓存失效"""
+    __tablename__ = "family_data_versions"
+
+    family_id = Column(Integer, ForeignKey("families.id"), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class FamilyStreak(Base):
+    """连续记录天数：写入每日记录时增量维护，streaks.py 可从 daily_logs 全量重建"""
+    __tablename__ = "family_streaks"
+
+    family_id = Column(Integer, ForeignKey("families.id"), primary_key=True)
+    current_streak = Column(Integer, nullable=False, default=0)  # 截至 last_date 的连续天数
+    longest_streak = Column(Integer, nullable=False, default=0)
+    last_date = Column(Date, nullable=True)  # 最近一段连续记录的最后一天
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ChangeLog(Base):
+    """家庭数据变更流水：seq 为写入事务中递增后的家庭数据版本号，供 /sync/changes 增量同步"""
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    seq = Column(BigInteger, nullable=False)
+    entity = Column(String(16), nullable=False)  # daily / stool / cycle
+    entity_id = Column(Integer, nullable=False)  # 记录已不存在即为删除（墓碑）
+
+    __table_args__ = (
+        Index("ix_change_family_seq", "family_id", "seq"),
+    )
+
+
+class LiveTicket(Base):
+    """/live 的一次性票据：EventSource 无法设置请求头，URL 中只放它，不放长期有效的 token"""
+    __tablename__ = "live_tickets"
+
+    ticket_hash = Column(String(64), primary_key=True)  # sha256(ticket)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_live_tickets_created", "created_at"),
+    )
+
+
+class IdempotencyKey(Base):
+    """写接口幂等键：保存首次请求的响应，客户端重试时原样返回（按 created_at 过期清理）"""
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(64), primary_key=True)
+    endpoint = Column(String(64), nullable=False)  # e.g. "POST /stool"
+    request_hash = Column(String(40), nullable=False)
+    response = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_created", "created_at"),
+    )
+
+
 class FamilyMember(Base):
     __tablename__ = "family_members"
 
@@ -141,6 +217,25 @@ class DailyLog(Base):
 
     family = relationship("Family", back_populates="daily_logs")
 
+    # 症状字段：点排便按钮会为当天建立只有排便计数的记录，这些字段都为空时不算「已记录」
+    SYMPTOM_VALUES = ("energy", "nausea", "appetite", "sleep_quality", "temp_c", "diarrhea", "note")
+    SYMPTOM_FLAGS = ("fever", "numbness", "mouth_sore", "is_tough_day")
+
+    @hybrid_property
+    def symptoms_recorded(self) -> bool:
+        """当天是否填写过症状（日历「已记录」、连续记录天数、首页「今天已记录」均以此为准）"""
+        return (
+            any(getattr(self, name) is not None for name in self.SYMPTOM_VALUES)
+            or any(getattr(self, name) for name in self.SYMPTOM_FLAGS)
+        )
+
+    @symptoms_recorded.expression
+    def symptoms_recorded(cls):
+        return or_(
+            *[getattr(cls, name).isnot(None) for name in cls.SYMPTOM_VALUES],
+            *[getattr(cls, name) == true() for name in cls.SYMPTOM_FLAGS],
+        )
+
 
 class StoolEvent(Base):
     """单次排便事件（即时记录）"""
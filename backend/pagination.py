@@ -0,0 +1,79 @@
+"""
+历史数据分页（keyset）：按排序键（如 (date, id)）翻页，下一页从上一页最后一条之后开始
+- 游标是排序键的 base64url 编码，对客户端不透明；不依赖 OFFSET，翻页期间有新写入也不会重复或跳过
+- 每页条数由服务端限定（PAGE_SIZE_MAX）；不分页时区间不能超过 RANGE_MAX_DAYS 天
+"""
+import base64
+import binascii
+import os
+from datetime import date
+from typing import Any, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import Session
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "200"))
+RANGE_MAX_DAYS = int(os.getenv("RANGE_MAX_DAYS", "366"))
+
+_KEY_PREFIX = "_cursor_"
+
+
+def page_size(limit: Optional[int]) -> int:
+    """请求的每页条数，限制在 [1, PAGE_SIZE_MAX]"""
+    return max(1, min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX))
+
+
+def check_range(start: date, end: date) -> None:
+    """不分页的区间查询：校验起止日期与最长天数"""
+    if end < start:
+        raise HTTPException(status_code=400, detail="结束日期不能早于开始日期")
+    if (end - start).days + 1 > RANGE_MAX_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"日期范围超过 {RANGE_MAX_DAYS} 天，请使用 limit / cursor 分页",
+        )
+
+
+def encode_cursor(*key: Any) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(key)).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple:
+    """游标 → 排序键（按 types 转换）；格式不符返回 400"""
+    try:
+        raw = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(raw, list) or len(raw) != len(types):
+            raise ValueError
+        key = []
+        for value, tp in zip(raw, types):
+            if tp is date:
+                key.append(date.fromisoformat(value))
+            elif tp is int and type(value) is int:
+                key.append(value)
+            else:
+                raise ValueError
+        return tuple(key)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="无效的 cursor")
+
+
+def keyset_page(
+    db: Session, stmt: Select, key_columns: Sequence, limit: int, cursor: Optional[str],
+) -> Tuple[List, Optional[str]]:
+    """按 key_columns 升序取 cursor 之后的一页：返回 (行, 下一页游标或 None)
+    排序键附加在 SELECT 末尾（列名带前缀），行的前面各列与 stmt 一致"""
+    if cursor is not None:
+        after = decode_cursor(cursor, [column.type.python_type for column in key_columns])
+        stmt = stmt.where(tuple_(*key_columns) > tuple_(*after))
+    rows = db.execute(
+        stmt.add_columns(*[column.label(f"{_KEY_PREFIX}{column.key}") for column in key_columns])
+        .order_by(None)
+        .order_by(*key_columns)
+        .limit(limit + 1)
+    ).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*rows[-1][-len(key_columns):])
@@ -0,0 +1,120 @@
+"""
+密码哈希：scrypt（加盐、内存密集），在独立进程池中计算
+- 存储格式：scrypt$N$r$p$<salt>$<hash>（base64），参数随哈希保存，调整参数后旧哈希仍可验证
+- 旧版无盐 SHA-256（64 位十六进制）仍可验证，登录成功后由调用方改存 scrypt（needs_rehash）
+- 进程池最多 PASSWORD_WORKERS 个进程：登录高峰只占用这些 CPU，不拖慢其他请求的线程池 / 事件循环；
+  排队超过 PASSWORD_MAX_PENDING 时直接返回 503
+- PASSWORD_WORKERS=0 时在线程池中计算（不能创建子进程的环境）
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "64"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # maxmem 需大于 128 * N * r，否则 OpenSSL 拒绝较大的 N
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES, maxmem=256 * n * r + 1024 * 1024,
+    )
+
+
+def hash_password(password: str) -> str:
+    """计算新的 scrypt 哈希（同步，CPU 密集）"""
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password: str, stored: Optional[str]) -> bool:
+    """校验密码（同步，CPU 密集）；支持 scrypt 与旧版 SHA-256"""
+    if not stored:
+        return False
+    if not stored.startswith("scrypt$"):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: Optional[str]) -> bool:
+    """旧版哈希或参数低于当前设置时，登录成功后应重新计算"""
+    return not (stored or "").startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+def _mp_context():
+    """forkserver：子进程由单线程的服务进程 fork，不继承应用的线程与连接，也不重新导入 __main__"""
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload([__name__])
+    return ctx
+
+
+def start() -> None:
+    """创建进程池（应用启动时调用）"""
+    global _pool
+    if PASSWORD_WORKERS > 0 and _pool is None:
+        _pool = ProcessPoolExecutor(PASSWORD_WORKERS, mp_context=_mp_context())
+
+
+def stop() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _run(fn, *args):
+    global _pending
+    if _pending >= PASSWORD_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="登录请求过多，请稍后再试")
+    _pending += 1
+    try:
+        if PASSWORD_WORKERS > 0:
+            start()
+            return await asyncio.get_running_loop().run_in_executor(_pool, fn, *args)
+        return await run_in_threadpool(fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(password: str, stored: Optional[str]) -> bool:
+    return await _run(verify_password, password, stored)
+
+
+def stats() -> dict:
+    return {"workers": PASSWORD_WORKERS, "pending": _pending}
@@ -0,0 +1,128 @@
+"""
+按请求统计 SQL：语句数、取回的行数、数据库总耗时、相同语句（参数化后的 SQL 文本）的重复次数
+- 统计对象放在 contextvar 中：同步路由在线程池中执行、async 路由在事件循环上执行（run_db 经 run_sync），上下文都会带过去
+- 同一语句在一个请求内执行超过 QUERY_REPEAT_THRESHOLD 次时输出 N+1 警告
+  （按批次重复同一语句是设计如此的路由，如分块流式输出，调用 allow_repeats() 跳过警告）
+- QUERY_DEBUG=true 时响应带 X-DB-Queries / X-DB-Rows / X-DB-Time-Ms / X-DB-Max-Repeat 头，并逐个请求输出统计
+"""
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "false").lower() in ("1", "true", "yes")
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "2"))
+
+
+class QueryStats:
+    """一个请求内的 SQL 统计"""
+
+    __slots__ = ("count", "rows", "seconds", "shapes", "repeats_expected")
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+        self.repeats_expected = False
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement] += 1
+
+    def most_repeated(self):
+        """(语句, 次数)；没有语句时为 (None, 0)"""
+        return self.shapes.most_common(1)[0] if self.shapes else (None, 0)
+
+    def headers(self) -> list:
+        return [
+            (b"x-db-queries", str(self.count).encode()),
+            (b"x-db-rows", str(self.rows).encode()),
+            (b"x-db-time-ms", f"{self.seconds * 1000:.1f}".encode()),
+            (b"x-db-max-repeat", str(self.most_repeated()[1]).encode()),
+        ]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def allow_repeats() -> None:
+    """当前请求会按批次重复执行同一语句（预期行为），不输出 N+1 警告"""
+    stats = _current.get()
+    if stats is not None:
+        stats.repeats_expected = True
+
+
+def _count_row(cursor, row):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += 1
+    return row
+
+
+def instrument_engine(engine) -> None:
+    """把语句计入当前请求的统计；异步引擎传入 async_engine.sync_engine
+    行数：psycopg2 / asyncpg 取回结果集后 rowcount 即行数；pysqlite 的 SELECT rowcount 恒为 -1，
+    改用 row_factory 逐行计数（aiosqlite 不统计行数）"""
+    pysqlite = engine.dialect.driver == "pysqlite"
+
+    if pysqlite:
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            dbapi_connection.row_factory = _count_row
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._query_stats_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        started = getattr(context, "_query_stats_started", None)
+        if stats is not None and started is not None:
+            stats.record(statement, time.perf_counter() - started)
+            if not pysqlite and cursor.description is not None and cursor.rowcount > 0:
+                stats.rows += cursor.rowcount
+
+
+def _one_line(statement: str, limit: int = 200) -> str:
+    text = " ".join(statement.split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class QueryStatsMiddleware:
+    """ASGI 中间件：为每个请求建立统计，响应头（QUERY_DEBUG）与日志"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if QUERY_DEBUG and message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), *stats.headers()]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", scope["path"])
+            statement, repeats = stats.most_repeated()
+            if repeats > QUERY_REPEAT_THRESHOLD and not stats.repeats_expected:
+                print(f"⚠️ 疑似 N+1：{scope['method']} {route} 同一语句执行 {repeats} 次：{_one_line(statement)}")
+            if QUERY_DEBUG:
+                print(f"🔎 {scope['method']} {route}：{stats.count} 条 SQL，{stats.rows} 行，{stats.seconds * 1000:.1f}ms，最多重复 {repeats} 次")
@@ -1,79 +1,80 @@
 """
-Auth Router: 注册 / 登录 / 微信登录
+Auth Router: 注册 / 登录 / 微信登录 / 退出登录
 修复：登录时如果用户不存在则自动注册
 """
+from typing import Optional, Tuple
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from database import get_db
+from database import get_db, get_session, run_db
 from models import User
 from schemas import (
     RegisterRequest, PhoneLoginRequest, WechatLoginRequest,
     TokenResponse, UserOut,
 )
-from auth import (
-    hash_password, verify_password, create_access_token, get_current_user,
-)
+from auth import issue_token, revoke_user_tokens, RequestContext, get_request_context
+from passwords import hash_password_async, verify_password_async, needs_rehash
 
 router = APIRouter(prefix="/auth", tags=["认证"])
 
 
-@router.post("/register", response_model=TokenResponse)
-def register(req: RegisterRequest, db: Session = Depends(get_db)):
-    """手机号注册（开发/测试用）"""
-    existing = db.query(User).filter(User.phone == req.phone).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="该账号已注册")
+def _find_user(db: Session, phone: str) -> Optional[Tuple[int, Optional[str], str]]:
+    """按手机号查 (user_id, password_hash, nickname)；随后结束事务，把连接还给连接池"""
+    row = db.query(User.id, User.password_hash, User.nickname).filter(User.phone == phone).first()
+    db.rollback()
+    return tuple(row) if row else None
 
-    user = User(
-        phone=req.phone,
-        nickname=req.nickname or f"用户{req.phone[-4:]}",
-        openid=None,
-    )
-    user.avatar_url = hash_password(req.password)
+
+def _create_user(db: Session, phone: str, nickname: str, password_hash: str) -> TokenResponse:
+    user = User(phone=phone, nickname=nickname, openid=None, password_hash=password_hash)
     db.add(user)
     db.commit()
     db.refresh(user)
+    return TokenResponse(access_token=issue_token(db, user.id), user_id=user.id, nickname=user.nickname)
+
+
+def _login_user(db: Session, user_id: int, nickname: str, new_hash: Optional[str]) -> TokenResponse:
+    """签发 token；new_hash 非空时顺带把旧哈希换成新的"""
+    if new_hash is not None:
+        db.query(User).filter(User.id == user_id).update({User.password_hash: new_hash})
+        db.commit()
+    return TokenResponse(access_token=issue_token(db, user_id), user_id=user_id, nickname=nickname)
 
-    token = create_access_token(user.id)
-    return TokenResponse(
-        access_token=token,
-        user_id=user.id,
-        nickname=user.nickname,
-    )
+
+# 密码哈希在进程池中计算（passwords），数据库操作经 run_db 执行；
+# 计算哈希前的 run_db 步骤都会结束事务（_find_user），等待哈希期间不占用数据库连接
+@router.post("/register", response_model=TokenResponse)
+async def register(req: RegisterRequest, db: Session = Depends(get_session)):
+    """手机号注册（开发/测试用）"""
+    if await run_db(db, _find_user, req.phone):
+        raise HTTPException(status_code=400, detail="该账号已注册")
+
+    password_hash = await hash_password_async(req.password)
+    return await run_db(db, _create_user, req.phone, req.nickname or f"用户{req.phone[-4:]}", password_hash)
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(req: PhoneLoginRequest, db: Session = Depends(get_db)):
+async def login(req: PhoneLoginRequest, db: Session = Depends(get_session)):
     """
     登录（首次自动注册）
-    - 用户存在 → 验证密码
+    - 用户存在 → 验证密码（旧版哈希验证通过后改存 scrypt）
     - 用户不存在 → 自动创建账号
     """
-    user = db.query(User).filter(User.phone == req.phone).first()
+    found = await run_db(db, _find_user, req.phone)
 
-    if user:
-        # 已有账号，验证密码
-        if not verify_password(req.password, user.avatar_url or ""):
-            raise HTTPException(status_code=401, detail="密码错误")
-    else:
+    if found is None:
         # 首次登录，自动注册
-        user = User(
-            phone=req.phone,
-            nickname=f"用户{req.phone[-4:] if len(req.phone) >= 4 else req.phone}",
-            openid=None,
-        )
-        user.avatar_url = hash_password(req.password)
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+        password_hash = await hash_password_async(req.password)
+        nickname = f"用户{req.phone[-4:] if len(req.phone) >= 4 else req.phone}"
+        return await run_db(db, _create_user, req.phone, nickname, password_hash)
 
-    token = create_access_token(user.id)
-    return TokenResponse(
-        access_token=token,
-        user_id=user.id,
-        nickname=user.nickname,
-    )
+    # 已有账号，验证密码
+    user_id, stored, nickname = found
+    if not await verify_password_async(req.password, stored):
+        raise HTTPException(status_code=401, detail="密码错误")
+    new_hash = await hash_password_async(req.password) if needs_rehash(stored) else None
+    return await run_db(db, _login_user, user_id, nickname, new_hash)
 
 
 @router.post("/wechat", response_model=TokenResponse)
@@ -91,7 +92,7 @@ def wechat_login(req: WechatLoginRequest, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(user)
 
-    token = create_access_token(user.id)
+    token = issue_token(db, user.id)
     return TokenResponse(
         access_token=token,
         user_id=user.id,
@@ -100,6 +101,19 @@ def wechat_login(req: WechatLoginRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserOut)
-def get_me(user: User = Depends(get_current_user)):
+def get_me(
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_request_context),
+):
     """获取当前用户信息"""
-    return user
+    return db.query(User).filter(User.id == ctx.user_id).first()
+
+
+@router.post("/logout")
+def logout(
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_request_context),
+):
+    """退出登录：吊销该账号已签发的全部 token（所有设备都需重新登录）"""
+    revoke_user_tokens(db, ctx.user_id)
+    return {"ok": True, "message": "已退出登录"}
@@ -2,16 +2,19 @@
 Cycle Router: 化疗疗程管理
 """
 from datetime import date
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 from database import get_db
-from models import User, ChemoCycle
+from data_version import bump_family_version, record_change
+from models import ChemoCycle
 from schemas import CycleCreate, CycleUpdate, CycleOut
-from auth import get_current_user, get_user_family_role, require_family_access
+from auth import RequestContext, get_family_context, require_family_access
 from tz import china_today
+from idempotency import idempotency_key_header, replay, commit_with_key
 
 router = APIRouter(prefix="/cycle", tags=["疗程"])
 
@@ -40,21 +43,26 @@ def _cycle_to_out(cycle: ChemoCycle) -> CycleOut:
 @router.post("", response_model=CycleOut)
 def create_cycle(
     req: CycleCreate,
+    idempotency_key: Optional[str] = Depends(idempotency_key_header),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
     """创建/更新疗程"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
+    stored = replay(db, ctx.user_id, idempotency_key, "POST /cycle", req)
+    if stored is not None:
+        return stored
 
-    family_id = membership.family_id
+    family_id = ctx.family_id
 
     # Deactivate all previous cycles
-    db.query(ChemoCycle).filter(
-        ChemoCycle.family_id == family_id,
-        ChemoCycle.is_active == True,
-    ).update({"is_active": False})
+    deactivated = db.execute(
+        update(ChemoCycle)
+        .where(ChemoCycle.family_id == family_id, ChemoCycle.is_active == True)
+        .values(is_active=False)
+        .returning(ChemoCycle.id)
+    ).scalars().all()
+    for cycle_id in deactivated:
+        record_change(db, "cycle", cycle_id)
 
     # Check if cycle_no already exists
     existing = (
@@ -71,9 +79,10 @@ def create_cycle(
         existing.length_days = req.length_days
         existing.regimen = req.regimen
         existing.is_active = True
-        db.commit()
-        db.refresh(existing)
-        return _cycle_to_out(existing)
+        record_change(db, "cycle", existing.id)
+        bump_family_version(db, ctx.family_id)
+        db.flush()
+        return commit_with_key(db, ctx.user_id, idempotency_key, "POST /cycle", req, _cycle_to_out(existing))
 
     cycle = ChemoCycle(
         family_id=family_id,
@@ -84,25 +93,22 @@ def create_cycle(
         is_active=True,
     )
     db.add(cycle)
-    db.commit()
-    db.refresh(cycle)
-    return _cycle_to_out(cycle)
+    db.flush()
+    record_change(db, "cycle", cycle.id)
+    bump_family_version(db, ctx.family_id)
+    return commit_with_key(db, ctx.user_id, idempotency_key, "POST /cycle", req, _cycle_to_out(cycle))
 
 
 @router.get("/current", response_model=CycleOut)
 def get_current_cycle(
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
     """获取当前活跃疗程"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
     cycle = (
         db.query(ChemoCycle)
         .filter(
-            ChemoCycle.family_id == membership.family_id,
+            ChemoCycle.family_id == ctx.family_id,
             ChemoCycle.is_active == True,
         )
         .first()
@@ -116,16 +122,12 @@ def get_current_cycle(
 @router.get("/list", response_model=List[CycleOut])
 def list_cycles(
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
     """获取所有疗程"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
     cycles = (
         db.query(ChemoCycle)
-        .filter(ChemoCycle.family_id == membership.family_id)
+        .filter(ChemoCycle.family_id == ctx.family_id)
         .order_by(ChemoCycle.cycle_no)
         .all()
     )
@@ -137,17 +139,13 @@ def update_cycle(
     cycle_no: int,
     req: CycleUpdate,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
     """更新疗程信息"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
     cycle = (
         db.query(ChemoCycle)
         .filter(
-            ChemoCycle.family_id == membership.family_id,
+            ChemoCycle.family_id == ctx.family_id,
             ChemoCycle.cycle_no == cycle_no,
         )
         .first()
@@ -164,6 +162,8 @@ def update_cycle(
     if req.is_active is not None:
         cycle.is_active = req.is_active
 
+    record_change(db, "cycle", cycle.id)
+    bump_family_version(db, ctx.family_id)
     db.commit()
     db.refresh(cycle)
     return _cycle_to_out(cycle)
@@ -2,15 +2,23 @@
 DailyLog Router: 每日记录（核心）
 """
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from database import get_db
-from models import User, DailyLog, ChemoCycle, StoolEvent
-from schemas import DailyLogUpsert, DailyLogOut
-from auth import get_current_user, get_user_family_role
+from data_version import bump_family_version, record_change
+from streaks import record_log_date
+from idempotency import idempotency_key_header, replay, commit_with_key
+from models import DailyLog, ChemoCycle, StoolEvent
+from columnar import page_response, table_response
+from pagination import check_range, keyset_page, page_size
+from schemas import DailyLogUpsert, DailyLogOut, DailyLogPage, ColumnarTable, ResponseFormat
+from serialization import parse_fields, schema_columns
+from auth import RequestContext, get_family_context
 from tz import china_today
 
 router = APIRouter(prefix="/daily", tags=["每日记录"])
@@ -35,23 +43,16 @@ def _get_cycle_info(db: Session, family_id: int, log_date: date):
     return cycle.cycle_no, delta
 
 
-@router.put("/{log_date}", response_model=DailyLogOut)
-def upsert_daily_log(
-    log_date: date,
-    req: DailyLogUpsert,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
+def apply_daily_upsert(
+    db: Session, ctx: RequestContext, log_date: date, req: DailyLogUpsert,
+) -> Tuple[DailyLog, bool]:
     """
-    创建或更新当天记录（Upsert）
+    创建或更新当天记录（不提交，不更新数据版本，供单条写入与批量同步共用）
+    返回 (记录, 是否第一次填写症状)；后者为真时调用方在写完全部 daily_logs 后调用 record_log_date（锁顺序见 data_version）
     如果是 tough_day 模式，未填字段会用前一天数据填充
     stool_count 直接使用前端传入的值（步进器为权威来源）
     """
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
-    family_id = membership.family_id
+    family_id = ctx.family_id
     cycle_no, cycle_day = _get_cycle_info(db, family_id, log_date)
 
     # Find existing
@@ -79,93 +80,115 @@ def upsert_daily_log(
                     data[field] = getattr(yesterday, field, None)
 
     if existing:
+        # 已有的可能是点排便按钮建立的记录：第一次填写症状时才计入连续记录天数
+        was_recorded = existing.symptoms_recorded
         for key, value in data.items():
             if value is not None or key in ("note", "temp_c"):
                 setattr(existing, key, value)
         existing.cycle_no = cycle_no
         existing.cycle_day = cycle_day
-        existing.recorded_by = user.id
-        db.commit()
-        db.refresh(existing)
-        return existing
+        existing.recorded_by = ctx.user_id
+        db.flush()
+        record_change(db, "daily", existing.id)
+        return existing, existing.symptoms_recorded and not was_recorded
 
     log = DailyLog(
         family_id=family_id,
         date=log_date,
         cycle_no=cycle_no,
         cycle_day=cycle_day,
-        recorded_by=user.id,
+        recorded_by=ctx.user_id,
         **data,
     )
-    db.add(log)
-    db.flush()
-    db.commit()
-    db.refresh(log)
-    return log
+    try:
+        with db.begin_nested():
+            db.add(log)
+    except IntegrityError:
+        # 并发的写入（或排便按钮）刚建立了当天记录：按已有记录更新
+        return apply_daily_upsert(db, ctx, log_date, req)
+    record_change(db, "daily", log.id)
+    return log, log.symptoms_recorded
 
 
-@router.get("/range", response_model=List[DailyLogOut])
+@router.put("/{log_date}", response_model=DailyLogOut)
+def upsert_daily_log(
+    log_date: date,
+    req: DailyLogUpsert,
+    idempotency_key: Optional[str] = Depends(idempotency_key_header),
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """创建或更新当天记录（Upsert）"""
+    endpoint = f"PUT /daily/{log_date}"
+    stored = replay(db, ctx.user_id, idempotency_key, endpoint, req)
+    if stored is not None:
+        return stored
+
+    log, first_recorded = apply_daily_upsert(db, ctx, log_date, req)
+    # 锁顺序：daily_logs 行 → family_streaks → family_data_versions
+    if first_recorded:
+        record_log_date(db, ctx.family_id, log_date)
+    bump_family_version(db, ctx.family_id)
+    return commit_with_key(db, ctx.user_id, idempotency_key, endpoint, req, DailyLogOut.model_validate(log))
+
+
+@router.get("/range", response_model=Union[List[DailyLogOut], ColumnarTable, DailyLogPage])
 def get_daily_range(
     start: date = Query(..., alias="from"),
     end: date = Query(..., alias="to"),
+    fmt: ResponseFormat = Query(ResponseFormat.rows, alias="format"),
+    fields: Optional[str] = Query(None, description="只返回这些字段（逗号分隔），如 date,energy,nausea"),
+    limit: Optional[int] = Query(None, ge=1, description="分页：每页条数（服务端上限 PAGE_SIZE_MAX）"),
+    cursor: Optional[str] = Query(None, description="分页：上一页返回的 next_cursor"),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
-    """获取日期范围内的记录"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
-    logs = (
-        db.query(DailyLog)
-        .filter(
-            DailyLog.family_id == membership.family_id,
-            DailyLog.date >= start,
-            DailyLog.date <= end,
-        )
-        .order_by(DailyLog.date)
-        .all()
+    """获取日期范围内的记录（format=columnar 时按字段返回数组）
+    带 limit 或 cursor 时按 (date, id) 分页返回 {"items", "next_cursor"}；不分页时区间不能超过 RANGE_MAX_DAYS 天"""
+    columns = schema_columns(DailyLogOut, DailyLog, parse_fields(DailyLogOut, fields))
+    stmt = select(*columns).where(
+        DailyLog.family_id == ctx.family_id,
+        DailyLog.date >= start,
+        DailyLog.date <= end,
     )
-    return logs
+    if limit is not None or cursor is not None:
+        rows, next_cursor = keyset_page(db, stmt, (DailyLog.date, DailyLog.id), page_size(limit), cursor)
+        return page_response(rows, [column.key for column in columns], fmt, next_cursor)
+
+    check_range(start, end)
+    return table_response(db.execute(stmt.order_by(DailyLog.date)), fmt)
 
 
-@router.get("/cycle/{cycle_no}", response_model=List[DailyLogOut])
+@router.get("/cycle/{cycle_no}", response_model=Union[List[DailyLogOut], ColumnarTable])
 def get_cycle_logs(
     cycle_no: int,
+    fmt: ResponseFormat = Query(ResponseFormat.rows, alias="format"),
+    fields: Optional[str] = Query(None, description="只返回这些字段（逗号分隔），如 date,energy,nausea"),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
-    """获取某疗程的所有记录"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
-    logs = (
-        db.query(DailyLog)
-        .filter(
-            DailyLog.family_id == membership.family_id,
+    """获取某疗程的所有记录（format=columnar 时按字段返回数组）"""
+    result = db.execute(
+        select(*schema_columns(DailyLogOut, DailyLog, parse_fields(DailyLogOut, fields)))
+        .where(
+            DailyLog.family_id == ctx.family_id,
             DailyLog.cycle_no == cycle_no,
         )
         .order_by(DailyLog.date)
-        .all()
     )
-    return logs
+    return table_response(result, fmt)
 
 
 @router.get("/today", response_model=Optional[DailyLogOut])
 def get_today(
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
     """获取今日记录"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
     log = (
         db.query(DailyLog)
         .filter(
-            DailyLog.family_id == membership.family_id,
+            DailyLog.family_id == ctx.family_id,
             DailyLog.date == china_today(),
         )
         .first()
@@ -1,27 +1,76 @@
 """
 Family Router: 家庭空间管理
 """
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from database import get_db
-from models import User, Family, FamilyMember
+from models import Family, FamilyMember, User
 from schemas import FamilyCreate, FamilyJoin, FamilyOut, FamilyMemberOut, RoleEnum
-from auth import get_current_user, generate_invite_code, get_user_family_role
+from auth import (
+    RequestContext, get_request_context,
+    generate_invite_code, invalidate_request_context, issue_token,
+)
 
 router = APIRouter(prefix="/family", tags=["家庭"])
 
 
+def _reissue_token(db: Session, ctx: RequestContext, family_id: int, role: RoleEnum) -> str:
+    """家庭关系变化后重新签发 token，使其携带新的 family_id / role"""
+    return issue_token(db, ctx.user_id, RequestContext(
+        user_id=ctx.user_id,
+        nickname=ctx.nickname,
+        family_id=family_id,
+        role=role,
+    ))
+
+
+def load_family(
+    db: Session, family_id: int, my_role: RoleEnum, access_token: Optional[str] = None,
+) -> FamilyOut:
+    """家庭 + 成员昵称：一次 JOIN"""
+    rows = (
+        db.query(
+            Family.id, Family.name, Family.invite_code,
+            FamilyMember.user_id, FamilyMember.role, FamilyMember.joined_at,
+            User.nickname,
+        )
+        .join(FamilyMember, FamilyMember.family_id == Family.id)
+        .outerjoin(User, User.id == FamilyMember.user_id)
+        .filter(Family.id == family_id)
+        .order_by(FamilyMember.id)
+        .all()
+    )
+    first = rows[0]
+    return FamilyOut(
+        id=first.id,
+        name=first.name,
+        invite_code=first.invite_code,
+        my_role=my_role,
+        members=[
+            FamilyMemberOut(
+                user_id=r.user_id,
+                nickname=r.nickname,
+                role=r.role,
+                joined_at=r.joined_at,
+            )
+            for r in rows
+        ],
+        access_token=access_token,
+    )
+
+
 @router.post("/create", response_model=FamilyOut)
 def create_family(
     req: FamilyCreate,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_request_context),
 ):
     """创建家庭空间"""
     # Check if user already in a family (V1: one family per user)
-    existing = get_user_family_role(db, user.id)
-    if existing:
+    if ctx.family_id is not None:
         raise HTTPException(status_code=400, detail="您已加入一个家庭")
 
     invite_code = generate_invite_code()
@@ -32,19 +81,20 @@ def create_family(
     family = Family(
         name=req.name,
         invite_code=invite_code,
-        created_by=user.id,
+        created_by=ctx.user_id,
     )
     db.add(family)
     db.flush()
 
     member = FamilyMember(
-        user_id=user.id,
+        user_id=ctx.user_id,
         family_id=family.id,
         role=req.role,
     )
     db.add(member)
     db.commit()
     db.refresh(family)
+    invalidate_request_context(ctx.user_id)
 
     return FamilyOut(
         id=family.id,
@@ -53,12 +103,13 @@ def create_family(
         my_role=req.role,
         members=[
             FamilyMemberOut(
-                user_id=user.id,
-                nickname=user.nickname,
+                user_id=ctx.user_id,
+                nickname=ctx.nickname,
                 role=req.role,
                 joined_at=member.joined_at,
             )
         ],
+        access_token=_reissue_token(db, ctx, family.id, req.role),
     )
 
 
@@ -66,11 +117,10 @@ def create_family(
 def join_family(
     req: FamilyJoin,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_request_context),
 ):
     """通过邀请码加入家庭"""
-    existing = get_user_family_role(db, user.id)
-    if existing:
+    if ctx.family_id is not None:
         raise HTTPException(status_code=400, detail="您已加入一个家庭")
 
     family = (
@@ -94,61 +144,26 @@ def join_family(
         if existing_patient:
             raise HTTPException(status_code=400, detail="该家庭已有患者")
 
+    family_id = family.id
     member = FamilyMember(
-        user_id=user.id,
-        family_id=family.id,
+        user_id=ctx.user_id,
+        family_id=family_id,
         role=req.role,
     )
     db.add(member)
     db.commit()
-    db.refresh(family)
-
-    members_out = []
-    for m in family.members:
-        members_out.append(
-            FamilyMemberOut(
-                user_id=m.user_id,
-                nickname=m.user.nickname if m.user else None,
-                role=m.role,
-                joined_at=m.joined_at,
-            )
-        )
+    invalidate_request_context(ctx.user_id)
 
-    return FamilyOut(
-        id=family.id,
-        name=family.name,
-        invite_code=family.invite_code,
-        my_role=req.role,
-        members=members_out,
-    )
+    return load_family(db, family_id, req.role, _reissue_token(db, ctx, family_id, req.role))
 
 
 @router.get("/me", response_model=FamilyOut)
 def get_my_family(
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_request_context),
 ):
     """获取我的家庭与角色"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
+    if ctx.family_id is None:
         raise HTTPException(status_code=404, detail="您还没有加入家庭")
 
-    family = membership.family
-    members_out = []
-    for m in family.members:
-        members_out.append(
-            FamilyMemberOut(
-                user_id=m.user_id,
-                nickname=m.user.nickname if m.user else None,
-                role=m.role,
-                joined_at=m.joined_at,
-            )
-        )
-
-    return FamilyOut(
-        id=family.id,
-        name=family.name,
-        invite_code=family.invite_code,
-        my_role=membership.role,
-        members=members_out,
-    )
+    return load_family(db, ctx.family_id, ctx.role)
@@ -0,0 +1,78 @@
+"""
+Home Router: 首页一次性加载（疗程 + 今日记录 + 今日排便 + 留言 + 家庭）
+"""
+import hashlib
+
+from fastapi import APIRouter, Depends
+from pydantic_core import to_json
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import ChemoCycle, DailyLog, StoolEvent
+from schemas import HomeResponse, DailyLogOut, StoolDailySummary, StoolEventOut, StreakOut
+from auth import RequestContext, get_family_context
+from routers.cycle_router import _cycle_to_out
+from routers.family_router import load_family
+from routers.message_router import load_active_messages
+from streaks import get_streak
+from tz import china_today
+
+router = APIRouter(prefix="/home", tags=["首页"])
+
+
+def _stamp(section) -> str:
+    """区块版本戳：序列化内容的短哈希"""
+    return hashlib.sha1(to_json(section)).hexdigest()[:12]
+
+
+def _load_streak(db: Session, ctx: RequestContext, today) -> StreakOut:
+    current, longest = get_streak(db, ctx.family_id, today)
+    return StreakOut(current=current, longest=longest)
+
+
+@router.get("", response_model=HomeResponse)
+def get_home(
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """首页所需数据一次返回，每个区块附带版本戳"""
+    today = china_today()
+
+    cycle = (
+        db.query(ChemoCycle)
+        .filter(ChemoCycle.family_id == ctx.family_id, ChemoCycle.is_active == True)
+        .first()
+    )
+    today_log = (
+        db.query(DailyLog)
+        .filter(DailyLog.family_id == ctx.family_id, DailyLog.date == today)
+        .first()
+    )
+    events = (
+        db.query(StoolEvent)
+        .filter(StoolEvent.family_id == ctx.family_id, StoolEvent.date == today)
+        .order_by(StoolEvent.recorded_at)
+        .all()
+    )
+
+    sections = {
+        "family": load_family(db, ctx.family_id, ctx.role),
+        "cycle": _cycle_to_out(cycle) if cycle else None,
+        "today_log": DailyLogOut.model_validate(today_log) if today_log else None,
+        "today_stool": StoolDailySummary(
+            date=today,
+            count=len(events),
+            events=[StoolEventOut.model_validate(e) for e in events],
+            blood_count=sum(1 for e in events if e.blood),
+            mucus_count=sum(1 for e in events if e.mucus),
+            tenesmus_count=sum(1 for e in events if e.tenesmus),
+        ),
+        "messages": load_active_messages(db, ctx),
+        "streak": _load_streak(db, ctx, today),
+    }
+
+    return HomeResponse(
+        date=today,
+        versions={name: _stamp(value) for name, value in sections.items()},
+        **sections,
+    )
@@ -0,0 +1,96 @@
+"""
+Live Router: 家庭实时推送（Server-Sent Events）
+- 能设置请求头的客户端（小程序）带 Authorization 头订阅
+- 浏览器 EventSource 不能设置请求头：先 POST /live/ticket 换一次性票据，再以 /live?ticket= 订阅；
+  URL 会进入代理与访问日志，因此只接受短时有效、用过即删的票据，不接受 token
+"""
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+import live
+from auth import RequestContext, get_family_context, resolve_request_context, security
+from data_version import get_family_version
+from database import get_db
+from models import LiveTicket
+from schemas import LiveTicketOut
+
+router = APIRouter(prefix="/live", tags=["实时推送"])
+
+LIVE_TICKET_TTL = timedelta(seconds=float(os.getenv("LIVE_TICKET_TTL_SECONDS", "30")))
+
+
+def _ticket_hash(ticket: str) -> str:
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+
+@router.post("/ticket", response_model=LiveTicketOut)
+def create_live_ticket(
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """换取 /live 的一次性订阅票据（LIVE_TICKET_TTL_SECONDS 秒内有效）；顺带清理过期票据"""
+    db.query(LiveTicket).filter(
+        LiveTicket.created_at < datetime.utcnow() - LIVE_TICKET_TTL,
+    ).delete(synchronize_session=False)
+    ticket = secrets.token_urlsafe(32)
+    db.add(LiveTicket(ticket_hash=_ticket_hash(ticket), user_id=ctx.user_id, family_id=ctx.family_id))
+    db.commit()
+    return LiveTicketOut(ticket=ticket, expires_in=int(LIVE_TICKET_TTL.total_seconds()))
+
+
+def _redeem_ticket(db: Session, ticket: str) -> RequestContext:
+    """删除并返回票据对应的身份：各 worker 共用数据库，同一票据只有一次删除能成功"""
+    row = db.execute(
+        delete(LiveTicket)
+        .where(LiveTicket.ticket_hash == _ticket_hash(ticket))
+        .returning(LiveTicket.user_id, LiveTicket.family_id, LiveTicket.created_at)
+    ).first()
+    db.commit()
+    if row is None or row.created_at < datetime.utcnow() - LIVE_TICKET_TTL:
+        raise HTTPException(status_code=401, detail="订阅票据无效或已过期")
+    return RequestContext(user_id=row.user_id, family_id=row.family_id)
+
+
+def _live_context(
+    ticket: Optional[str] = Query(None, description="POST /live/ticket 换取的一次性票据（EventSource 用）"),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+):
+    """鉴权 + 当前 seq；数据库会话在开始推送前释放"""
+    if credentials:
+        ctx = resolve_request_context(db, credentials.credentials)
+    elif ticket:
+        ctx = _redeem_ticket(db, ticket)
+    else:
+        raise HTTPException(status_code=401, detail="未登录")
+    if ctx.family_id is None:
+        raise HTTPException(status_code=400, detail="请先加入家庭")
+    return ctx, get_family_version(db, ctx.family_id)
+
+
+@router.get("")
+async def live_events(context=Depends(_live_context)):
+    """
+    订阅本家庭的实时事件（text/event-stream）
+    - hello：连接建立，附当前 seq
+    - change：每日记录 / 排便 / 疗程有变化，附新 seq 与涉及的实体，客户端以 /sync/changes 拉取
+    - message：有新留言
+    - reset：推送积压或服务端重连，客户端应全量刷新后重新订阅
+    空闲时每 LIVE_HEARTBEAT_SECONDS 秒发送一次心跳注释
+    """
+    ctx, seq = context
+    sub = live.broker.subscribe(ctx.family_id)
+    return StreamingResponse(
+        live.event_stream(sub, {"type": "hello", "seq": seq}),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,15 +1,17 @@
 """
 Message Router: 家人留言
 """
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from database import get_db
 from models import User, FamilyMessage
 from schemas import MessageCreate, MessageOut
-from auth import get_current_user, get_user_family_role
+from auth import RequestContext, get_family_context
+from idempotency import idempotency_key_header, replay, commit_with_key
+from live import publish_on_commit
 
 router = APIRouter(prefix="/message", tags=["留言"])
 
@@ -17,71 +19,72 @@ router = APIRouter(prefix="/message", tags=["留言"])
 @router.post("", response_model=MessageOut)
 def send_message(
     req: MessageCreate,
+    idempotency_key: Optional[str] = Depends(idempotency_key_header),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
     """发送留言（家属给患者，或反过来）"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
+    stored = replay(db, ctx.user_id, idempotency_key, "POST /message", req)
+    if stored is not None:
+        return stored
 
     # Deactivate previous active messages from this sender
     db.query(FamilyMessage).filter(
-        FamilyMessage.family_id == membership.family_id,
-        FamilyMessage.sender_id == user.id,
+        FamilyMessage.family_id == ctx.family_id,
+        FamilyMessage.sender_id == ctx.user_id,
         FamilyMessage.is_active == True,
     ).update({"is_active": False})
 
     msg = FamilyMessage(
-        family_id=membership.family_id,
-        sender_id=user.id,
+        family_id=ctx.family_id,
+        sender_id=ctx.user_id,
         content=req.content,
         is_active=True,
     )
     db.add(msg)
-    db.commit()
-    db.refresh(msg)
+    db.flush()
+    publish_on_commit(db, ctx.family_id, {"type": "message", "id": msg.id})
 
-    return MessageOut(
+    out = MessageOut(
         id=msg.id,
         sender_id=msg.sender_id,
-        sender_nickname=user.nickname,
+        sender_nickname=db.query(User.nickname).filter(User.id == ctx.user_id).scalar(),
         content=msg.content,
         created_at=msg.created_at,
     )
+    return commit_with_key(db, ctx.user_id, idempotency_key, "POST /message", req, out)
 
 
-@router.get("/active", response_model=List[MessageOut])
-def get_active_messages(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    """获取当前活跃的留言（首页展示用）"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
-    messages = (
-        db.query(FamilyMessage)
+def load_active_messages(db: Session, ctx: RequestContext) -> List[MessageOut]:
+    """活跃留言（不含自己发的）+ 发送者昵称：一次 JOIN"""
+    rows = (
+        db.query(FamilyMessage, User.nickname)
+        .outerjoin(User, User.id == FamilyMessage.sender_id)
         .filter(
-            FamilyMessage.family_id == membership.family_id,
+            FamilyMessage.family_id == ctx.family_id,
             FamilyMessage.is_active == True,
-            FamilyMessage.sender_id != user.id,  # Don't show own messages
+            FamilyMessage.sender_id != ctx.user_id,
         )
         .order_by(FamilyMessage.created_at.desc())
         .limit(3)
         .all()
     )
-
-    results = []
-    for msg in messages:
-        sender = db.query(User).filter(User.id == msg.sender_id).first()
-        results.append(MessageOut(
+    return [
+        MessageOut(
             id=msg.id,
             sender_id=msg.sender_id,
-            sender_nickname=sender.nickname if sender else None,
+            sender_nickname=nickname,
             content=msg.content,
             created_at=msg.created_at,
-        ))
+        )
+        for msg, nickname in rows
+    ]
+
 
-    return results
+@router.get("/active", response_model=List[MessageOut])
+def get_active_messages(
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """获取当前活跃的留言（首页展示用）"""
+    return load_active_messages(db, ctx)
@@ -1,74 +1,125 @@
 """
 Stool Router: 排便即时记录（浮动按钮触发）
 """
-from datetime import date, datetime
-from typing import List
+import functools
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Date, Integer, case, cast, func, literal, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from database import get_db
-from models import User, StoolEvent, DailyLog
-from schemas import StoolEventCreate, StoolEventOut, StoolDailySummary
-from auth import get_current_user, get_user_family_role
+from database import ASYNC_DB, AsyncSessionLocal, SessionLocal, get_db
+from data_version import bump_family_version, record_change
+from idempotency import idempotency_key_header, replay, commit_with_key
+from models import StoolEvent, DailyLog, ChemoCycle
+import query_stats
+from pagination import check_range, decode_cursor, encode_cursor, page_size
+from schemas import StoolEventCreate, StoolEventOut, StoolDailySummary, StoolDailyPage
+from serialization import FastJSONResponse, parse_fields, schema_columns
+from auth import RequestContext, get_family_context
 from tz import china_today, china_now
 
 router = APIRouter(prefix="/stool", tags=["排便记录"])
 
+# 超过该天数的 /stool/range 逐月流式输出
+STOOL_STREAM_DAYS = int(os.getenv("STOOL_STREAM_DAYS", "62"))
 
-def _increment_daily_stool(db: Session, family_id: int, event_date: date, event: "StoolEvent"):
-    """添加排便后：stool_count +1，更新血/粘液/里急后重计数"""
-    daily = (
-        db.query(DailyLog)
-        .filter(DailyLog.family_id == family_id, DailyLog.date == event_date)
-        .first()
-    )
-    if daily:
-        daily.stool_count = (daily.stool_count or 0) + 1
-        if event.blood:
-            daily.stool_blood_count = (daily.stool_blood_count or 0) + 1
-        if event.mucus:
-            daily.stool_mucus_count = (daily.stool_mucus_count or 0) + 1
-        if event.tenesmus:
-            daily.stool_tenesmus_count = (daily.stool_tenesmus_count or 0) + 1
-
-
-def _decrement_daily_stool(db: Session, family_id: int, event_date: date, event: "StoolEvent"):
-    """删除排便后：stool_count -1，更新血/粘液/里急后重计数"""
-    daily = (
-        db.query(DailyLog)
-        .filter(DailyLog.family_id == family_id, DailyLog.date == event_date)
-        .first()
-    )
-    if daily:
-        daily.stool_count = max(0, (daily.stool_count or 0) - 1)
-        if event.blood:
-            daily.stool_blood_count = max(0, (daily.stool_blood_count or 0) - 1)
-        if event.mucus:
-            daily.stool_mucus_count = max(0, (daily.stool_mucus_count or 0) - 1)
-        if event.tenesmus:
-            daily.stool_tenesmus_count = max(0, (daily.stool_tenesmus_count or 0) - 1)
 
+# 由 stool_events 汇总到 daily_logs 的计数列：(列名, StoolEvent 上对应的标记)
+_STOOL_COUNTERS = (
+    ("stool_blood_count", "blood"),
+    ("stool_mucus_count", "mucus"),
+    ("stool_tenesmus_count", "tenesmus"),
+)
 
-@router.post("", response_model=StoolEventOut)
-def create_stool_event(
-    req: StoolEventCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    """记录一次排便（即时，每次排便后点击）"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
 
-    event_date = req.date or china_today()
-    event_time = req.time or china_now().strftime("%H:%M")
+def _cycle_info_subqueries(dialect: str, family_id: int, event_date: date):
+    """当前活跃疗程的 cycle_no / cycle_day 子查询（规则同 daily_router._get_cycle_info）"""
+    active = (ChemoCycle.family_id == family_id) & (ChemoCycle.is_active == True)
+    cycle_no = select(ChemoCycle.cycle_no).where(active).limit(1).scalar_subquery()
+    if dialect == "postgresql":
+        delta = literal(event_date, Date) - ChemoCycle.start_date + 1
+    else:
+        delta = cast(func.julianday(literal(event_date, Date)) - func.julianday(ChemoCycle.start_date), Integer) + 1
+    cycle_day = select(case((delta >= 1, delta))).where(active).limit(1).scalar_subquery()
+    return cycle_no, cycle_day
+
+
+def stool_delta(event: "StoolEvent", sign: int = 1) -> Dict[str, int]:
+    """一条排便记录对 daily_logs 计数列的变化量（添加 +1 / 删除 -1）"""
+    delta = {"stool_count": sign}
+    for column, flag in _STOOL_COUNTERS:
+        if getattr(event, flag):
+            delta[column] = sign
+    return delta
+
 
+def apply_stool_delta(
+    db: Session, family_id: int, event_date: date, delta: Dict[str, int], user_id: int = None,
+) -> None:
+    """把计数变化量写入当天 daily_logs：单条语句，结果不低于 0
+    有正增量时用 INSERT ... ON CONFLICT (family_id, date) DO UPDATE，当天没有记录时直接建行；
+    只有减量时用 UPDATE（不为删除操作建行）
+    这样建立的记录只有排便计数，不算「已记录」（见 DailyLog.symptoms_recorded），也不计入连续记录天数
+    """
+    delta = {column: step for column, step in delta.items() if step}
+    if not delta:
+        return
+
+    def shifted(column: str, step: int):
+        value = func.coalesce(getattr(DailyLog, column), 0) + step
+        return value if step > 0 else case((value > 0, value), else_=0)
+
+    updates = {column: shifted(column, step) for column, step in delta.items()}
+    if all(step < 0 for step in delta.values()):
+        daily_id = db.execute(
+            update(DailyLog)
+            .where(DailyLog.family_id == family_id, DailyLog.date == event_date)
+            .values({getattr(DailyLog, column): value for column, value in updates.items()})
+            .returning(DailyLog.id)
+        ).scalar()
+        if daily_id is not None:
+            record_change(db, "daily", daily_id)
+        return
+
+    dialect = db.get_bind().dialect.name
+    insert = pg_insert if dialect == "postgresql" else sqlite_insert
+    cycle_no, cycle_day = _cycle_info_subqueries(dialect, family_id, event_date)
+    values = {
+        "family_id": family_id,
+        "date": event_date,
+        "cycle_no": cycle_no,
+        "cycle_day": cycle_day,
+        "recorded_by": user_id,
+        "stool_count": 0,
+        **{column: 0 for column, _ in _STOOL_COUNTERS},
+    }
+    values.update({column: max(step, 0) for column, step in delta.items()})
+
+    stmt = insert(DailyLog).values(**values)
+    daily_id = db.execute(
+        # ON CONFLICT DO UPDATE 不会应用 ORM 的 onupdate，updated_at 需显式设置（与 UPDATE 分支一致）
+        stmt.on_conflict_do_update(
+            index_elements=["family_id", "date"], set_={**updates, "updated_at": datetime.utcnow()},
+        )
+        .returning(DailyLog.id)
+    ).scalar()
+    record_change(db, "daily", daily_id)
+
+
+def add_stool_event(db: Session, ctx: RequestContext, req: StoolEventCreate) -> StoolEvent:
+    """新增排便记录（不更新计数、不提交）"""
     event = StoolEvent(
-        family_id=membership.family_id,
-        date=event_date,
-        time=event_time,
+        family_id=ctx.family_id,
+        date=req.date or china_today(),
+        time=req.time or china_now().strftime("%H:%M"),
         bristol=req.bristol,
         blood=req.blood,
         mucus=req.mucus,
@@ -76,30 +127,61 @@ def create_stool_event(
     )
     db.add(event)
     db.flush()
+    record_change(db, "stool", event.id)
+    return event
 
-    # stool_count +1
-    _increment_daily_stool(db, membership.family_id, event_date, event)
 
-    db.commit()
-    db.refresh(event)
+def remove_stool_event(db: Session, ctx: RequestContext, event_id: int) -> StoolEvent:
+    """删除排便记录（不更新计数、不提交）；返回被删除的记录"""
+    event = (
+        db.query(StoolEvent)
+        .filter(
+            StoolEvent.id == event_id,
+            StoolEvent.family_id == ctx.family_id,
+        )
+        .first()
+    )
+    if not event:
+        raise HTTPException(status_code=404, detail="记录不存在")
+    db.delete(event)
+    db.flush()
+    record_change(db, "stool", event_id)
     return event
 
 
+@router.post("", response_model=StoolEventOut)
+def create_stool_event(
+    req: StoolEventCreate,
+    idempotency_key: Optional[str] = Depends(idempotency_key_header),
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """记录一次排便（即时，每次排便后点击；带 Idempotency-Key 时重试不会重复记录）"""
+    stored = replay(db, ctx.user_id, idempotency_key, "POST /stool", req)
+    if stored is not None:
+        return stored
+
+    event = add_stool_event(db, ctx, req)
+
+    # stool_count +1；锁顺序：daily_logs 行 → family_data_versions（见 data_version）
+    apply_stool_delta(db, ctx.family_id, event.date, stool_delta(event), ctx.user_id)
+    bump_family_version(db, ctx.family_id)
+    return commit_with_key(
+        db, ctx.user_id, idempotency_key, "POST /stool", req, StoolEventOut.model_validate(event),
+    )
+
+
 @router.get("/today", response_model=StoolDailySummary)
 def get_today_stool(
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
     """获取今日排便汇总"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
     today = china_today()
     events = (
         db.query(StoolEvent)
         .filter(
-            StoolEvent.family_id == membership.family_id,
+            StoolEvent.family_id == ctx.family_id,
             StoolEvent.date == today,
         )
         .order_by(StoolEvent.recorded_at)
@@ -116,78 +198,196 @@ def get_today_stool(
     )
 
 
-@router.get("/range", response_model=List[StoolDailySummary])
+# 按日汇总的计数列：PostgreSQL 片段 / 其他数据库的表达式
+_PG_AGGREGATES = {
+    "count": "COUNT(e.id)",
+    "blood_count": "COUNT(e.id) FILTER (WHERE e.blood)",
+    "mucus_count": "COUNT(e.id) FILTER (WHERE e.mucus)",
+    "tenesmus_count": "COUNT(e.id) FILTER (WHERE e.tenesmus)",
+}
+
+
+def _flag_count(column):
+    return func.coalesce(func.sum(case((column == True, 1), else_=0)), 0)
+
+
+_AGGREGATES = {
+    "count": lambda: func.count(StoolEvent.id),
+    "blood_count": lambda: _flag_count(StoolEvent.blood),
+    "mucus_count": lambda: _flag_count(StoolEvent.mucus),
+    "tenesmus_count": lambda: _flag_count(StoolEvent.tenesmus),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _day_counts_sql(aggregates: Tuple[str, ...]):
+    """PostgreSQL：generate_series 补齐无记录的日子，只计算请求的计数列"""
+    if not aggregates:
+        return text("""
+SELECT d::date AS date
+FROM generate_series(CAST(:start AS date), CAST(:end AS date), interval '1 day') AS d
+ORDER BY d
+""")
+    selected = ",\n    ".join(f"{_PG_AGGREGATES[name]} AS {name}" for name in aggregates)
+    return text(f"""
+SELECT
+    d::date AS date,
+    {selected}
+FROM generate_series(CAST(:start AS date), CAST(:end AS date), interval '1 day') AS d
+LEFT JOIN stool_events e ON e.family_id = :family_id AND e.date = d::date
+GROUP BY d
+ORDER BY d
+""")
+
+
+def _day_counts(
+    db: Session, family_id: int, start: date, end: date,
+    aggregates: Tuple[str, ...] = tuple(_AGGREGATES),
+) -> list:
+    """[start, end] 内每天一行：(date, *aggregates)"""
+    if db.get_bind().dialect.name == "postgresql":
+        params = {"family_id": family_id, "start": start, "end": end}
+        return db.execute(_day_counts_sql(aggregates), params).all()
+
+    rows = {}
+    if aggregates:
+        rows = {
+            row[0]: tuple(row)
+            for row in db.query(StoolEvent.date, *[_AGGREGATES[name]().label(name) for name in aggregates])
+            .filter(StoolEvent.family_id == family_id, StoolEvent.date >= start, StoolEvent.date <= end)
+            .group_by(StoolEvent.date)
+        }
+    empty = (0,) * len(aggregates)
+    days = []
+    current = start
+    while current <= end:
+        days.append(rows.get(current) or (current, *empty))
+        current += timedelta(days=1)
+    return days
+
+
+def _day_summaries(
+    db: Session, family_id: int, start: date, end: date,
+    fields: Sequence[str] = tuple(StoolDailySummary.model_fields),
+) -> List[dict]:
+    """按日汇总，每天一个只含 fields 的字典；SQL 只查询所需的计数列与明细列"""
+    aggregates = tuple(name for name in fields if name in _AGGREGATES)
+    grouped = defaultdict(list)
+    if "events" in fields:
+        result = db.execute(
+            select(*schema_columns(StoolEventOut, StoolEvent))
+            .where(
+                StoolEvent.family_id == family_id,
+                StoolEvent.date >= start,
+                StoolEvent.date <= end,
+            )
+            .order_by(StoolEvent.date, StoolEvent.recorded_at)
+        )
+        keys = list(result.keys())
+        for row in result:
+            grouped[row.date].append(dict(zip(keys, row)))
+
+    days = []
+    for row in _day_counts(db, family_id, start, end, aggregates):
+        values = dict(zip(("date",) + aggregates, row))
+        values["events"] = grouped.get(row[0], [])
+        days.append({name: values[name] for name in fields})
+    return days
+
+
+def _month_chunks(start: date, end: date):
+    """把 [start, end] 切成按自然月的区间"""
+    while start <= end:
+        next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        chunk_end = min(end, next_month - timedelta(days=1))
+        yield start, chunk_end
+        start = chunk_end + timedelta(days=1)
+
+
+def _array_items(days: List[dict], first: bool) -> bytes:
+    """一段数组元素：序列化后去掉方括号，非首段前加逗号"""
+    return (b"" if first else b",") + orjson.dumps(days)[1:-1]
+
+
+def _stream_day_summaries(family_id: int, start: date, end: date, fields: Sequence[str]):
+    """逐月查询并输出 JSON 数组，避免在内存中拼出整个范围
+    使用独立的会话：请求依赖中的会话在响应开始发送前就已关闭"""
+    db = SessionLocal()
+    try:
+        yield b"["
+        first = True
+        for chunk_start, chunk_end in _month_chunks(start, end):
+            days = _day_summaries(db, family_id, chunk_start, chunk_end, fields)
+            if days:
+                yield _array_items(days, first)
+                first = False
+        yield b"]"
+    finally:
+        db.close()
+
+
+async def _stream_day_summaries_async(family_id: int, start: date, end: date, fields: Sequence[str]):
+    """同上（DB_ASYNC）：AsyncSession 逐月查询，不占用线程池与同步连接池"""
+    async with AsyncSessionLocal() as db:
+        yield b"["
+        first = True
+        for chunk_start, chunk_end in _month_chunks(start, end):
+            days = await db.run_sync(_day_summaries, family_id, chunk_start, chunk_end, fields)
+            if days:
+                yield _array_items(days, first)
+                first = False
+        yield b"]"
+
+
+@router.get("/range", response_model=Union[List[StoolDailySummary], StoolDailyPage])
 def get_stool_range(
     start: date = Query(..., alias="from"),
     end: date = Query(..., alias="to"),
+    include_events: bool = Query(True, description="false 时只返回每日计数，不含排便明细"),
+    fields: Optional[str] = Query(None, description="只返回这些字段（逗号分隔），如 date,count,blood_count"),
+    limit: Optional[int] = Query(None, ge=1, description="分页：每页天数（服务端上限 PAGE_SIZE_MAX）"),
+    cursor: Optional[str] = Query(None, description="分页：上一页返回的 next_cursor"),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
-    """获取日期范围内的排便记录"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
-    events = (
-        db.query(StoolEvent)
-        .filter(
-            StoolEvent.family_id == membership.family_id,
-            StoolEvent.date >= start,
-            StoolEvent.date <= end,
-        )
-        .order_by(StoolEvent.date, StoolEvent.recorded_at)
-        .all()
-    )
+    """获取日期范围内的排便记录（按日汇总；超过 STOOL_STREAM_DAYS 天时流式返回）
+    带 limit 或 cursor 时按日分页返回 {"items", "next_cursor"}；不分页时区间不能超过 RANGE_MAX_DAYS 天"""
+    selected = parse_fields(StoolDailySummary, fields) or tuple(StoolDailySummary.model_fields)
+    if not include_events:
+        selected = tuple(name for name in selected if name != "events")
 
-    # Group by date
-    from collections import defaultdict
-    grouped = defaultdict(list)
-    for e in events:
-        grouped[e.date].append(e)
-
-    results = []
-    current = start
-    while current <= end:
-        day_events = grouped.get(current, [])
-        results.append(StoolDailySummary(
-            date=current,
-            count=len(day_events),
-            events=day_events,
-            blood_count=sum(1 for e in day_events if e.blood),
-            mucus_count=sum(1 for e in day_events if e.mucus),
-            tenesmus_count=sum(1 for e in day_events if e.tenesmus),
-        ))
-        current += __import__("datetime").timedelta(days=1)
+    if limit is not None or cursor is not None:
+        # 每天恰好一项，日期本身就是排序键：本页从游标日期的下一天开始，最多 limit 天
+        if cursor is not None:
+            (after,) = decode_cursor(cursor, (date,))
+            start = max(start, after + timedelta(days=1))
+        page_end = min(end, start + timedelta(days=page_size(limit) - 1))
+        items = _day_summaries(db, ctx.family_id, start, page_end, selected) if start <= end else []
+        next_cursor = encode_cursor(page_end) if page_end < end else None
+        return FastJSONResponse(orjson.dumps({"items": items, "next_cursor": next_cursor}))
 
-    return results
+    check_range(start, end)
+    if (end - start).days + 1 > STOOL_STREAM_DAYS:
+        query_stats.allow_repeats()  # 每月一次查询
+        stream = _stream_day_summaries_async if ASYNC_DB else _stream_day_summaries
+        return StreamingResponse(
+            stream(ctx.family_id, start, end, selected),
+            media_type="application/json",
+        )
+    return FastJSONResponse(orjson.dumps(_day_summaries(db, ctx.family_id, start, end, selected)))
 
 
 @router.delete("/{event_id}")
 def delete_stool_event(
     event_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    ctx: RequestContext = Depends(get_family_context),
 ):
     """删除一条排便记录（误操作补救）"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
-    event = (
-        db.query(StoolEvent)
-        .filter(
-            StoolEvent.id == event_id,
-            StoolEvent.family_id == membership.family_id,
-        )
-        .first()
-    )
-    if not event:
-        raise HTTPException(status_code=404, detail="记录不存在")
-
-    event_date = event.date
+    event = remove_stool_event(db, ctx, event_id)
     # stool_count -1
-    _decrement_daily_stool(db, membership.family_id, event_date, event)
-    db.delete(event)
+    apply_stool_delta(db, ctx.family_id, event.date, stool_delta(event, -1))
+    bump_family_version(db, ctx.family_id)
     db.commit()
 
     return {"ok": True, "message": "已删除"}
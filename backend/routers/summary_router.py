@@ -2,121 +2,63 @@
 Summary Router: 趋势 + 就诊摘要 + 患者日历
 修复版：cycle_day 超过 length_days 时标注「已超期」
 """
+import hashlib
+import os
+from bisect import bisect_right
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from database import get_db
-from models import User, DailyLog, ChemoCycle
+from cache import TTLCache
+from database import ASYNC_DB, SessionLocal, get_async_db, get_db
+from data_version import get_family_version, get_family_version_async
+from models import DailyLog, ChemoCycle
 from schemas import (
-    SummaryResponse, SummaryMode, KeyStats, TrendPoint,
-    CalendarResponse, CalendarDay,
+    SummaryResponse, SummaryMode, KeyStats, TrendPoint, ResponseFormat,
+    CalendarResponse, CalendarDay, CalendarRangeResponse,
 )
-from auth import get_current_user, get_user_family_role
+from auth import RequestContext, get_family_context, get_family_context_async
+from columnar import to_columnar
+from serialization import adapter, model_response, row_dicts
+from stats_engine import CycleColumns, compute_key_stats, day_status
+from stats_sql import compute_key_stats_sql
+from streaks import get_streak
 from tz import china_today
 
 router = APIRouter(prefix="/summary", tags=["摘要"])
 
+# 趋势与关键指标所需的列（不加载 note 等字段）
+_SUMMARY_COLUMNS = (
+    DailyLog.date,
+    DailyLog.cycle_day,
+    DailyLog.energy,
+    DailyLog.nausea,
+    DailyLog.appetite,
+    DailyLog.sleep_quality,
+    DailyLog.stool_count,
+    DailyLog.diarrhea,
+    DailyLog.fever,
+    DailyLog.temp_c,
+    DailyLog.is_tough_day,
+    DailyLog.stool_blood_count,
+)
 
-def _compute_key_stats(logs: List[DailyLog], recent_days: int = 7) -> KeyStats:
-    """Compute peak/valley and averages"""
-    stats = KeyStats()
-    if not logs:
-        return stats
-
-    # Peaks
-    nausea_logs = [(l.nausea, l.cycle_day, l.date) for l in logs if l.nausea is not None]
-    if nausea_logs:
-        max_n = max(nausea_logs, key=lambda x: x[0])
-        stats.max_nausea = max_n[0]
-        stats.max_nausea_day = max_n[1]
-
-    energy_logs = [(l.energy, l.cycle_day, l.date) for l in logs if l.energy is not None]
-    if energy_logs:
-        worst_e = max(energy_logs, key=lambda x: x[0])
-        stats.min_energy = worst_e[0]
-        stats.min_energy_day = worst_e[1]
-
-    stool_logs = [(l.stool_count, l.cycle_day, l.date) for l in logs if l.stool_count is not None]
-    if stool_logs:
-        max_s = max(stool_logs, key=lambda x: x[0])
-        stats.max_stool = max_s[0]
-        stats.max_stool_day = max_s[1]
-
-    diarrhea_logs = [(l.diarrhea, l.cycle_day, l.date) for l in logs if l.diarrhea is not None]
-    if diarrhea_logs:
-        max_d = max(diarrhea_logs, key=lambda x: x[0])
-        stats.max_diarrhea = max_d[0]
-        stats.max_diarrhea_day = max_d[1]
-
-    # Fever events
-    fever_logs = [l for l in logs if l.fever and l.temp_c]
-    stats.fever_events = [
-        {"date": str(l.date), "day": l.cycle_day, "temp": l.temp_c}
-        for l in fever_logs
-    ]
-
-    # Blood events
-    blood_logs = [l for l in logs if l.stool_blood_count and l.stool_blood_count > 0]
-    stats.blood_events = [
-        {"date": str(l.date), "day": l.cycle_day, "count": l.stool_blood_count}
-        for l in blood_logs
-    ]
-
-    # Recent N days averages
-    recent = sorted(logs, key=lambda l: l.date, reverse=True)[:recent_days]
-    if recent:
-        e_vals = [l.energy for l in recent if l.energy is not None]
-        n_vals = [l.nausea for l in recent if l.nausea is not None]
-        s_vals = [l.stool_count for l in recent if l.stool_count is not None]
-        sl_vals = [l.sleep_quality for l in recent if l.sleep_quality is not None]
-
-        if e_vals:
-            stats.avg_energy_7d = round(sum(e_vals) / len(e_vals), 1)
-        if n_vals:
-            stats.avg_nausea_7d = round(sum(n_vals) / len(n_vals), 1)
-        if s_vals:
-            stats.avg_stool_7d = round(sum(s_vals) / len(s_vals), 1)
-        if sl_vals:
-            stats.avg_sleep_7d = round(sum(sl_vals) / len(sl_vals), 1)
-
-    # Worst 3 days (composite score)
-    scored = []
-    for l in logs:
-        score = 0
-        reasons = []
-        if l.energy is not None:
-            score += l.energy
-            if l.energy >= 3:
-                reasons.append(f"体力{l.energy}")
-        if l.nausea is not None:
-            score += l.nausea
-            if l.nausea >= 2:
-                reasons.append(f"恶心{l.nausea}")
-        if l.fever and l.temp_c:
-            score += 3
-            reasons.append(f"发热{l.temp_c}℃")
-        if l.stool_count and l.stool_count >= 5:
-            score += 2
-            reasons.append(f"排便{l.stool_count}次")
-        scored.append((score, l.cycle_day, str(l.date), reasons))
-
-    scored.sort(key=lambda x: -x[0])
-    stats.worst_days = [
-        {"day": s[1], "date": s[2], "reasons": s[3]}
-        for s in scored[:3]
-    ]
+# 摘要缓存：键中包含家庭数据版本（写入即失效）与当天日期（cycle_day 随日期变化）
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "600"))
+summary_cache = TTLCache(maxsize=512, ttl=SUMMARY_CACHE_TTL)
 
-    return stats
+# PostgreSQL 下关键指标在库内聚合；关闭或非 PostgreSQL 时使用 Python 列式引擎
+SUMMARY_STATS_SQL = os.getenv("SUMMARY_STATS_SQL", "true").lower() in ("1", "true", "yes")
 
 
 def _generate_caregiver_summary(
     cycle: ChemoCycle, cycle_day: int, stats: KeyStats,
 ) -> str:
     """生成家属模式就诊摘要文本"""
-
     # 🔧 修复：如果 cycle_day 超过 length_days，说明疗程已超期
     display_day = cycle_day
     overdue = False
@@ -215,23 +157,11 @@ def _generate_patient_summary(
     return "\n".join(lines)
 
 
-@router.get("", response_model=SummaryResponse)
-def get_summary(
-    cycle_no: Optional[int] = None,
-    days: int = Query(14, ge=1, le=60),
-    mode: SummaryMode = SummaryMode.caregiver,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    """
-    获取汇总数据
-    """
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
-    family_id = membership.family_id
-
+def _build_summary(
+    db: Session, family_id: int, cycle_no: Optional[int], days: int, mode: SummaryMode,
+    fmt: ResponseFormat = ResponseFormat.rows,
+) -> SummaryResponse:
+    """加载疗程与记录，生成趋势、关键指标与摘要文本"""
     # Find cycle
     if cycle_no:
         cycle = (
@@ -251,36 +181,30 @@ def get_summary(
 
     current_day = (china_today() - cycle.start_date).days + 1
 
-    # Get logs for this cycle
+    # Get logs for this cycle（只含填写过症状的日子：点排便按钮建立的记录不进入趋势与指标）
     logs = (
-        db.query(DailyLog)
+        db.query(*_SUMMARY_COLUMNS)
         .filter(
             DailyLog.family_id == family_id,
             DailyLog.cycle_no == cycle.cycle_no,
+            DailyLog.symptoms_recorded,
         )
         .order_by(DailyLog.date)
         .all()
     )
 
-    # Build trends
-    trends = []
-    for log in logs:
-        trends.append(TrendPoint(
-            date=log.date,
-            cycle_day=log.cycle_day,
-            energy=log.energy,
-            nausea=log.nausea,
-            appetite=log.appetite,
-            sleep_quality=log.sleep_quality,
-            stool_count=log.stool_count,
-            diarrhea=log.diarrhea,
-            fever=log.fever,
-            temp_c=log.temp_c,
-            is_tough_day=log.is_tough_day,
-        ))
+    # Build trends（整列一次校验；列式时直接按列编码）
+    if fmt == ResponseFormat.columnar:
+        trends = to_columnar(logs, list(TrendPoint.model_fields))
+    else:
+        trends = adapter(List[TrendPoint]).validate_python(row_dicts(logs))
 
     # Compute stats
-    key_stats = _compute_key_stats(logs, recent_days=min(days, 7))
+    recent_days = min(days, 7)
+    if SUMMARY_STATS_SQL and db.get_bind().dialect.name == "postgresql":
+        key_stats = compute_key_stats_sql(db, family_id, cycle.cycle_no, recent_days=recent_days)
+    else:
+        key_stats = compute_key_stats(CycleColumns.from_rows(logs), recent_days=recent_days)
 
     # Generate text
     if mode == SummaryMode.caregiver:
@@ -300,116 +224,205 @@ def get_summary(
     )
 
 
-@router.get("/calendar", response_model=CalendarResponse)
-def get_calendar(
-    year: int = Query(None),
-    month: int = Query(None, ge=1, le=12),
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    """获取状态日历数据"""
-    membership = get_user_family_role(db, user.id)
-    if not membership:
-        raise HTTPException(status_code=400, detail="请先加入家庭")
-
+def _etag(body: bytes) -> str:
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def _summary_key(family_id: int, cycle_no: Optional[int], days: int, mode: SummaryMode,
+                 fmt: ResponseFormat, version: int) -> tuple:
+    return (family_id, cycle_no, mode, days, fmt, china_today(), version)
+
+
+def _render_summary(db: Session, key: tuple) -> Tuple[str, bytes]:
+    """生成摘要并按 key 缓存，返回 (ETag, 响应体)"""
+    family_id, cycle_no, mode, days, fmt = key[:5]
+    body = _build_summary(db, family_id, cycle_no, days, mode, fmt).model_dump_json().encode()
+    cached = (_etag(body), body)
+    summary_cache.set(key, cached)
+    return cached
+
+
+def _render_summary_in_thread(key: tuple) -> Tuple[str, bytes]:
+    with SessionLocal() as db:
+        return _render_summary(db, key)
+
+
+def _summary_response(cached: Tuple[str, bytes], if_none_match: Optional[str]) -> Response:
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+if ASYNC_DB:
+    @router.get("", response_model=SummaryResponse)
+    async def get_summary(
+        cycle_no: Optional[int] = None,
+        days: int = Query(14, ge=1, le=60),
+        mode: SummaryMode = SummaryMode.caregiver,
+        fmt: ResponseFormat = Query(ResponseFormat.rows, alias="format", description="columnar：trends 按字段返回数组"),
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_async_db),
+        ctx: RequestContext = Depends(get_family_context_async),
+    ):
+        """
+        获取汇总数据（DB_ASYNC）
+        命中缓存时只 await 一次数据版本查询，不占用线程池；未命中时在线程池中用同步会话生成（CPU 密集）
+        """
+        version = await get_family_version_async(db, ctx.family_id)
+        key = _summary_key(ctx.family_id, cycle_no, days, mode, fmt, version)
+        cached = summary_cache.get(key)
+        if cached is None:
+            await db.close()  # 生成期间不占用异步连接
+            cached = await run_in_threadpool(_render_summary_in_thread, key)
+        return _summary_response(cached, if_none_match)
+else:
+    @router.get("", response_model=SummaryResponse)
+    def get_summary(
+        cycle_no: Optional[int] = None,
+        days: int = Query(14, ge=1, le=60),
+        mode: SummaryMode = SummaryMode.caregiver,
+        fmt: ResponseFormat = Query(ResponseFormat.rows, alias="format", description="columnar：trends 按字段返回数组"),
+        if_none_match: Optional[str] = Header(None),
+        db: Session = Depends(get_db),
+        ctx: RequestContext = Depends(get_family_context),
+    ):
+        """
+        获取汇总数据
+        结果按（家庭, 疗程, 模式, 天数, 格式, 日期, 数据版本）缓存；带强 ETag，未变化时返回 304
+        """
+        key = _summary_key(ctx.family_id, cycle_no, days, mode, fmt, get_family_version(db, ctx.family_id))
+        cached = summary_cache.get(key) or _render_summary(db, key)
+        return _summary_response(cached, if_none_match)
+
+
+# 日历所需的列
+_CALENDAR_COLUMNS = (DailyLog.date, DailyLog.energy, DailyLog.nausea, DailyLog.is_tough_day)
+
+CALENDAR_MAX_DAYS = 366
+
+
+class _CycleLookup:
+    """按开始日期排序的全部疗程，二分查找某天所在疗程（后开始的疗程优先）"""
+
+    def __init__(self, cycles):
+        self.cycles = sorted(cycles, key=lambda c: c.start_date)
+        self.starts = [c.start_date for c in self.cycles]
+
+    def locate(self, day: date):
+        """返回 (cycle_no, cycle_day)；不在任何疗程内时为 (None, None)"""
+        i = bisect_right(self.starts, day) - 1
+        if i < 0:
+            return None, None
+        cycle = self.cycles[i]
+        delta = (day - cycle.start_date).days + 1
+        if delta > cycle.length_days:
+            return None, None
+        return cycle.cycle_no, delta
+
+
+def _calendar_days(db: Session, family_id: int, start: date, end: date) -> List[CalendarDay]:
+    """[start, end] 每天的日历状态：一次查询记录 + 一次查询全部疗程"""
     today = china_today()
-    year = year or today.year
-    month = month or today.month
-
-    import calendar
-    _, days_in_month = calendar.monthrange(year, month)
-    start = date(year, month, 1)
-    end = date(year, month, days_in_month)
-
-    logs = (
-        db.query(DailyLog)
-        .filter(
-            DailyLog.family_id == membership.family_id,
+    # 只有排便计数的日子（点排便按钮建立的记录）不算已记录
+    log_map = {
+        row.date: row
+        for row in db.query(*_CALENDAR_COLUMNS).filter(
+            DailyLog.family_id == family_id,
             DailyLog.date >= start,
             DailyLog.date <= end,
+            DailyLog.symptoms_recorded,
         )
+    }
+    lookup = _CycleLookup(
+        db.query(ChemoCycle.cycle_no, ChemoCycle.start_date, ChemoCycle.length_days)
+        .filter(ChemoCycle.family_id == family_id)
         .all()
     )
-    log_map = {l.date: l for l in logs}
-
-    cycle = (
-        db.query(ChemoCycle)
-        .filter(
-            ChemoCycle.family_id == membership.family_id,
-            ChemoCycle.is_active == True,
-        )
-        .first()
-    )
 
     calendar_days = []
-    streak = 0
-    counting_streak = True
-
-    for d in range(days_in_month, 0, -1):
-        day_date = date(year, month, d)
-        if day_date > today:
-            continue
-        log = log_map.get(day_date)
-        if log:
-            if counting_streak:
-                streak += 1
-        else:
-            counting_streak = False
-
-    streak_count = streak
-    for d in range(1, days_in_month + 1):
-        day_date = date(year, month, d)
+    day_date = start
+    while day_date <= end:
         log = log_map.get(day_date)
-
-        cycle_day = None
-        if cycle:
-            delta = (day_date - cycle.start_date).days + 1
-            if 1 <= delta <= cycle.length_days:
-                cycle_day = delta
+        cycle_no, cycle_day = lookup.locate(day_date)
 
         if log:
-            score = 0
-            if log.energy is not None:
-                score += log.energy
-            if log.nausea is not None:
-                score += log.nausea
-
-            if score <= 2:
-                status = "good"
-                emoji = "😊"
-            elif score <= 4:
-                status = "okay"
-                emoji = "😐"
-            else:
-                status = "tough"
-                emoji = "💪"
-
-            if log.is_tough_day:
-                status = "tough"
-                emoji = "💪"
-        elif day_date <= today:
-            status = "rest" if not cycle_day else "none"
-            emoji = ""
+            status, emoji = day_status(log.energy, log.nausea, log.is_tough_day)
+        elif day_date <= today and not cycle_day:
+            status, emoji = "rest", ""
         else:
-            status = "none"
-            emoji = ""
+            status, emoji = "none", ""
 
         calendar_days.append(CalendarDay(
             date=day_date,
+            cycle_no=cycle_no,
             cycle_day=cycle_day,
             status=status,
             emoji=emoji,
             recorded=log is not None,
         ))
+        day_date += timedelta(days=1)
+    return calendar_days
 
-    good_days = sum(1 for cd in calendar_days if cd.status == "good")
-    total_recorded = sum(1 for cd in calendar_days if cd.recorded)
+
+@router.get("/calendar", response_model=CalendarResponse)
+def get_calendar(
+    year: int = Query(None),
+    month: int = Query(None, ge=1, le=12),
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """获取状态日历数据（单月）"""
+    today = china_today()
+    year = year or today.year
+    month = month or today.month
+
+    import calendar
+    _, days_in_month = calendar.monthrange(year, month)
+    start = date(year, month, 1)
+    end = date(year, month, days_in_month)
+
+    calendar_days = _calendar_days(db, ctx.family_id, start, end)
+    streak, longest_streak = get_streak(db, ctx.family_id, today)
 
     return CalendarResponse(
         year=year,
         month=month,
         days=calendar_days,
-        total_recorded=total_recorded,
-        good_days=good_days,
-        streak=streak_count,
+        total_recorded=sum(1 for cd in calendar_days if cd.recorded),
+        good_days=sum(1 for cd in calendar_days if cd.status == "good"),
+        streak=streak,
+        longest_streak=longest_streak,
     )
+
+
+@router.get("/calendar/range", response_model=CalendarRangeResponse)
+def get_calendar_range(
+    start: date = Query(..., alias="from"),
+    end: date = Query(..., alias="to"),
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """任意区间（最长一年）的状态日历，供年视图热力图使用"""
+    if end < start:
+        raise HTTPException(status_code=400, detail="结束日期不能早于开始日期")
+    if (end - start).days + 1 > CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail="日期范围不能超过一年")
+
+    calendar_days = _calendar_days(db, ctx.family_id, start, end)
+    return model_response(CalendarRangeResponse, CalendarRangeResponse(
+        start=start,
+        end=end,
+        days=calendar_days,
+        total_recorded=sum(1 for cd in calendar_days if cd.recorded),
+        good_days=sum(1 for cd in calendar_days if cd.status == "good"),
+    ))
@@ -0,0 +1,235 @@
+"""
+Sync Router: 离线队列批量上传（小程序在医院断网时累积的每日记录与排便操作）
+"""
+import json
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+import query_stats
+from database import get_db
+from data_version import (
+    bump_family_version, get_family_version, pending_changes, restore_pending_changes,
+)
+from models import ChangeLog, ChemoCycle, DailyLog, StoolEvent
+from schemas import (
+    SyncBatchRequest, SyncBatchResponse, SyncItemResult, SyncOp, SyncOpType,
+    ChangesResponse,
+)
+from auth import RequestContext, get_family_context
+from routers.cycle_router import _cycle_to_out
+from routers.daily_router import apply_daily_upsert
+from routers.stool_router import add_stool_event, remove_stool_event, stool_delta, apply_stool_delta
+from streaks import record_log_date
+from idempotency import find_key, request_hash, save_key
+from serialization import model_response
+
+router = APIRouter(prefix="/sync", tags=["离线同步"])
+
+# /sync/changes 单次最多返回的变更条数（超出时 has_more=true，客户端以返回的 seq 继续拉取）
+CHANGES_LIMIT = 2000
+
+# change_log.entity -> 模型
+_ENTITIES = {"daily": DailyLog, "stool": StoolEvent, "cycle": ChemoCycle}
+
+
+def _write_stool_delta(db: Session, ctx: RequestContext, pending: Dict[date, Counter], day: date) -> None:
+    """把某天累积的排便计数变化一次写入 daily_logs（调用方负责从 pending 中移除）"""
+    delta = pending.get(day)
+    if delta:
+        apply_stool_delta(db, ctx.family_id, day, delta, ctx.user_id)
+
+
+def _batch_endpoint(op: SyncOp) -> str:
+    return f"POST /sync/batch {op.op.value}"
+
+
+def _same_request(record, op: SyncOp) -> bool:
+    """幂等记录是否就是这条操作：批量上传时保存的，或带同一 Idempotency-Key 直接提交时保存的"""
+    forms = [(_batch_endpoint(op), op)]
+    if op.op == SyncOpType.daily_upsert and op.daily is not None:
+        forms.append((f"PUT /daily/{op.date}", op.daily))
+    elif op.op == SyncOpType.stool_create and op.stool is not None:
+        forms.append(("POST /stool", op.stool))
+    return any(record.endpoint == endpoint and record.request_hash == request_hash(payload)
+               for endpoint, payload in forms)
+
+
+def _apply_op(db: Session, ctx: RequestContext, op: SyncOp, pending: Dict[date, Counter]):
+    """执行一条操作，返回 (记录 id, 日期, 计数变化量)；排便计数由调用方合并
+    daily.upsert 的日期仅在第一次填写症状时返回，由调用方最后统一更新连续记录天数"""
+    if op.op == SyncOpType.daily_upsert:
+        if op.date is None or op.daily is None:
+            raise HTTPException(status_code=400, detail="daily.upsert 需要 date 和 daily")
+        # 先写入当天已累积的排便计数，保持「步进器为权威来源」的覆盖顺序
+        _write_stool_delta(db, ctx, pending, op.date)
+        log, first_recorded = apply_daily_upsert(db, ctx, op.date, op.daily)
+        return log.id, (op.date if first_recorded else None), None
+
+    if op.op == SyncOpType.stool_create:
+        if op.stool is None:
+            raise HTTPException(status_code=400, detail="stool.create 需要 stool")
+        event = add_stool_event(db, ctx, op.stool)
+        return event.id, event.date, stool_delta(event)
+
+    if op.event_id is None:
+        raise HTTPException(status_code=400, detail="stool.delete 需要 event_id")
+    event = remove_stool_event(db, ctx, op.event_id)
+    return op.event_id, event.date, stool_delta(event, -1)
+
+
+@router.post("/batch", response_model=SyncBatchResponse)
+def sync_batch(
+    req: SyncBatchRequest,
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """
+    按顺序应用一批离线操作，整体一个事务
+    每条操作一个保存点：失败只回滚该条，并在结果中返回原因；数据库写入出错时 retry=true，客户端稍后重传
+    排便计数按日期合并，每个日期只写一次 daily_logs
+    client_id 同时作为幂等键：已处理过的操作（包括曾带同一 Idempotency-Key 直接提交成功的）
+    不再执行，直接返回成功并计入 replayed；同一 client_id 用于不同操作时该条失败
+    只有新写入（applied > 0）才更新数据版本并通知其他设备
+    """
+    query_stats.allow_repeats()  # 每条操作各自写入 change_log / 幂等键
+    results = []
+    pending: Dict[date, Counter] = defaultdict(Counter)
+    recorded_days = set()
+    applied = replayed = 0
+
+    for index, op in enumerate(req.ops):
+        done = find_key(db, ctx.user_id, op.client_id) if op.client_id else None
+        if done is not None:
+            if not _same_request(done, op):
+                results.append(SyncItemResult(
+                    index=index, client_id=op.client_id, ok=False, error="client_id 已用于其他请求",
+                ))
+                continue
+            record_id = json.loads(done.response).get("id")
+            results.append(SyncItemResult(index=index, client_id=op.client_id, ok=True, id=record_id))
+            replayed += 1
+            continue
+
+        changes = pending_changes(db)
+        savepoint = db.begin_nested()
+        try:
+            record_id, day, delta = _apply_op(db, ctx, op, pending)
+            if op.client_id:
+                save_key(
+                    db, ctx.user_id, op.client_id, _batch_endpoint(op), op,
+                    SyncItemResult(index=index, client_id=op.client_id, ok=True, id=record_id),
+                )
+            savepoint.commit()
+        except HTTPException as exc:
+            savepoint.rollback()
+            restore_pending_changes(db, changes)
+            results.append(SyncItemResult(index=index, client_id=op.client_id, ok=False, error=exc.detail))
+            continue
+        except SQLAlchemyError:
+            savepoint.rollback()
+            restore_pending_changes(db, changes)
+            results.append(SyncItemResult(
+                index=index, client_id=op.client_id, ok=False, error="写入失败", retry=True,
+            ))
+            continue
+
+        if op.op == SyncOpType.daily_upsert:
+            pending.pop(op.date, None)
+            if day is not None:
+                recorded_days.add(day)
+        if delta:
+            pending[day].update(delta)
+        results.append(SyncItemResult(index=index, client_id=op.client_id, ok=True, id=record_id))
+        applied += 1
+
+    # 锁顺序：daily_logs 行 → family_streaks → family_data_versions（见 data_version）
+    for day in sorted(pending):
+        _write_stool_delta(db, ctx, pending, day)
+    for day in sorted(recorded_days):
+        record_log_date(db, ctx.family_id, day)
+
+    if applied:
+        bump_family_version(db, ctx.family_id)
+    db.commit()
+
+    return SyncBatchResponse(
+        applied=applied, failed=len(results) - applied - replayed, replayed=replayed, results=results,
+    )
+
+
+def _changed_ids(db: Session, family_id: int, since: int):
+    """since 之后变更过的记录：({entity: {id}}, 截止 seq, has_more)；按 seq 整批截断"""
+    rows = (
+        db.query(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id)
+        .filter(ChangeLog.family_id == family_id, ChangeLog.seq > since)
+        .order_by(ChangeLog.seq)
+        .limit(CHANGES_LIMIT + 1)
+        .all()
+    )
+    has_more = len(rows) > CHANGES_LIMIT
+    if has_more:
+        boundary = rows[-1].seq
+        rows = [r for r in rows if r.seq < boundary]
+        if not rows:  # 单个 seq 的变更就超过上限：整批返回
+            rows = (
+                db.query(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id)
+                .filter(ChangeLog.family_id == family_id, ChangeLog.seq == boundary)
+                .all()
+            )
+
+    ids = defaultdict(set)
+    for row in rows:
+        ids[row.entity].add(row.entity_id)
+    return ids, (rows[-1].seq if rows else since), has_more
+
+
+@router.get("/changes", response_model=ChangesResponse)
+def get_changes(
+    since: int = Query(0, ge=0, description="上次同步返回的 seq；0 表示全量"),
+    db: Session = Depends(get_db),
+    ctx: RequestContext = Depends(get_family_context),
+):
+    """
+    增量同步：返回 since 之后新增/修改的每日记录、排便记录、疗程，以及已删除记录的 id（墓碑）
+    客户端保存返回的 seq，下次以 since=seq 拉取；has_more 时立即继续拉取
+    """
+    current = get_family_version(db, ctx.family_id)
+
+    if since == 0 or since > current:
+        # 全量：变更流水上线前的数据没有流水记录，直接读表；since 超前（如数据已重置）同样全量
+        ids = None
+        seq, has_more = current, False
+    else:
+        ids, seq, has_more = _changed_ids(db, ctx.family_id, since)
+        if not has_more:
+            seq = max(seq, current)
+
+    found = {}
+    deleted = {}
+    for entity, model in _ENTITIES.items():
+        query = db.query(model).filter(model.family_id == ctx.family_id)
+        if ids is not None:
+            wanted = ids.get(entity)
+            if not wanted:
+                found[entity] = []
+                continue
+            query = query.filter(model.id.in_(wanted))
+        found[entity] = query.order_by(model.id).all()
+        if ids is not None:
+            missing = wanted - {row.id for row in found[entity]}
+            if missing:
+                deleted[entity] = sorted(missing)
+
+    return model_response(ChangesResponse, {
+        "seq": seq,
+        "has_more": has_more,
+        "daily": found["daily"],
+        "stool": found["stool"],
+        "cycles": [_cycle_to_out(row) for row in found["cycle"]],
+        "deleted": deleted,
+    })
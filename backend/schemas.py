@@ -2,10 +2,12 @@
 Pydantic schemas for API request/response
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Any, Optional, List, Dict, Union
 from datetime import date, datetime
 from enum import Enum
 
+_Date = date  # 字段名为 date 时用于注解，避免类体内名称遮蔽
+
 
 # ─── Enums ────────────────────────────────────────────────────────────
 class RoleEnum(str, Enum):
@@ -18,6 +20,11 @@ class SummaryMode(str, Enum):
     caregiver = "caregiver"
 
 
+class ResponseFormat(str, Enum):
+    rows = "rows"          # 对象数组（默认）
+    columnar = "columnar"  # 每个字段一个数组，见 ColumnarTable
+
+
 # ─── Auth ─────────────────────────────────────────────────────────────
 class WechatLoginRequest(BaseModel):
     code: str
@@ -78,6 +85,7 @@ class FamilyOut(BaseModel):
     invite_code: str
     my_role: RoleEnum
     members: List[FamilyMemberOut] = []
+    access_token: Optional[str] = None  # 创建/加入后重新签发（含家庭信息）
 
     class Config:
         from_attributes = True
@@ -157,7 +165,7 @@ class DailyLogOut(BaseModel):
 
 # ─── StoolEvent ──────────────────────────────────────────────────────
 class StoolEventCreate(BaseModel):
-    date: Optional[date] = None  # defaults to today
+    date: Optional[_Date] = None  # defaults to today
     time: Optional[str] = None   # HH:MM
     bristol: Optional[int] = Field(None, ge=1, le=7)
     blood: bool = False
@@ -188,6 +196,12 @@ class StoolDailySummary(BaseModel):
     tenesmus_count: int
 
 
+class StoolDailyPage(BaseModel):
+    """/stool/range 分页：next_cursor 为空表示已到末页"""
+    items: List[StoolDailySummary]
+    next_cursor: Optional[str] = None
+
+
 # ─── FamilyMessage ───────────────────────────────────────────────────
 class MessageCreate(BaseModel):
     content: str = Field(..., max_length=500)
@@ -237,13 +251,31 @@ class TrendPoint(BaseModel):
     is_tough_day: bool
 
 
+class ColumnarTable(BaseModel):
+    """
+    列式数据（format=columnar）：n 行，columns 为 字段 -> 编码后的数组
+    - 普通数组：[v0, v1, ...]（可含 null）
+    - 稀疏（非空不足一半时）：{"i": [非空下标], "v": [对应值]}
+    - 日期：{"base": "YYYY-MM-DD", "d": [相对 base 的天数]}
+    - 布尔值以 0 / 1 表示
+    """
+    n: int
+    columns: Dict[str, Any]
+
+
+class DailyLogPage(BaseModel):
+    """/daily/range 分页：items 按 format 为对象数组或列式，next_cursor 为空表示已到末页"""
+    items: Union[List[DailyLogOut], ColumnarTable]
+    next_cursor: Optional[str] = None
+
+
 class SummaryResponse(BaseModel):
     cycle_no: int
     cycle_day: int
     start_date: date
     length_days: int
     mode: SummaryMode
-    trends: List[TrendPoint]
+    trends: Union[List[TrendPoint], ColumnarTable]
     key_stats: KeyStats
     summary_text: str
 
@@ -251,6 +283,7 @@ class SummaryResponse(BaseModel):
 # ─── Calendar ────────────────────────────────────────────────────────
 class CalendarDay(BaseModel):
     date: date
+    cycle_no: Optional[int] = None
     cycle_day: Optional[int]
     status: str  # good / okay / tough / rest / none
     emoji: str
@@ -263,4 +296,87 @@ class CalendarResponse(BaseModel):
     days: List[CalendarDay]
     total_recorded: int
     good_days: int
-    streak: int
+    streak: int  # 当前连续记录天数（跨月）
+    longest_streak: int = 0
+
+
+class CalendarRangeResponse(BaseModel):
+    """任意区间的日历（年视图）"""
+    start: date
+    end: date
+    days: List[CalendarDay]
+    total_recorded: int
+    good_days: int
+
+
+# ─── Streak ──────────────────────────────────────────────────────────
+class StreakOut(BaseModel):
+    current: int
+    longest: int
+
+
+# ─── Sync ────────────────────────────────────────────────────────────
+class SyncOpType(str, Enum):
+    daily_upsert = "daily.upsert"
+    stool_create = "stool.create"
+    stool_delete = "stool.delete"
+
+
+class SyncOp(BaseModel):
+    """离线队列中的一条写操作"""
+    op: SyncOpType
+    client_id: Optional[str] = Field(None, max_length=64)  # 客户端队列 id，原样返回
+    date: Optional[_Date] = None                 # daily.upsert
+    daily: Optional[DailyLogUpsert] = None       # daily.upsert
+    stool: Optional[StoolEventCreate] = None     # stool.create
+    event_id: Optional[int] = None               # stool.delete
+
+
+class SyncBatchRequest(BaseModel):
+    ops: List[SyncOp] = Field(..., max_length=500)
+
+
+class SyncItemResult(BaseModel):
+    index: int
+    client_id: Optional[str] = None
+    ok: bool
+    id: Optional[int] = None  # 写入的 daily_log / stool_event id
+    error: Optional[str] = None
+    retry: bool = False       # 暂时性失败（数据库写入出错）：客户端保留该条，稍后重传
+
+
+class SyncBatchResponse(BaseModel):
+    applied: int       # 本次新写入的操作数
+    failed: int
+    replayed: int = 0  # 已处理过、直接返回原结果的操作数
+    results: List[SyncItemResult]
+
+
+class ChangesResponse(BaseModel):
+    """增量同步：since 之后的变更；deleted 为已删除记录的 id（墓碑），如 {"stool": [12, 15]}"""
+    seq: int
+    has_more: bool = False
+    daily: List[DailyLogOut] = []
+    stool: List[StoolEventOut] = []
+    cycles: List[CycleOut] = []
+    deleted: Dict[str, List[int]] = {}
+
+
+# ─── Live ────────────────────────────────────────────────────────────
+class LiveTicketOut(BaseModel):
+    """/live 订阅票据：只能使用一次，expires_in 秒内有效"""
+    ticket: str
+    expires_in: int
+
+
+# ─── Home ────────────────────────────────────────────────────────────
+class HomeResponse(BaseModel):
+    """首页一次性加载：各区块 + 各自的版本戳（内容哈希）"""
+    date: date
+    family: FamilyOut
+    cycle: Optional[CycleOut] = None
+    today_log: Optional[DailyLogOut] = None
+    today_stool: StoolDailySummary
+    messages: List[MessageOut] = []
+    streak: StreakOut = StreakOut(current=0, longest=0)
+    versions: Dict[str, str] = {}  # {section: stamp}，未变化的区块客户端可跳过渲染
@@ -0,0 +1,79 @@
+"""
+快速 JSON 响应：每条记录只序列化一次
+- 按类型缓存的 TypeAdapter 直接从 ORM 对象 / Row 校验，并在 pydantic-core 中序列化为 bytes
+- 输出模型恰好是表中若干列时（如 DailyLogOut），按模型字段只查这些列，行直接交给 orjson，不构建任何对象；
+  ?fields= 进一步缩小 SELECT 列表
+- 路由返回 Response 时 FastAPI 跳过 response_model 的二次校验与序列化（response_model 仍用于文档）
+- 其余内容（字典等）用 orjson 序列化
+"""
+import functools
+from typing import Any, List, Optional, Sequence, Tuple, Type
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.engine import Result
+
+
+@functools.lru_cache(maxsize=None)
+def adapter(tp: Any) -> TypeAdapter:
+    """类型对应的 TypeAdapter（校验器与序列化器只编译一次）"""
+    return TypeAdapter(tp)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """bytes 视为已序列化的 JSON 原样输出，其他内容用 orjson"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dump_json(tp: Any, value: Any) -> bytes:
+    """按 tp 校验（支持 ORM 对象 / Row / 已构建的模型）并序列化为 JSON bytes"""
+    ta = adapter(tp)
+    return ta.dump_json(ta.validate_python(value, from_attributes=True))
+
+
+def model_response(tp: Any, value: Any, **kwargs) -> FastJSONResponse:
+    return FastJSONResponse(dump_json(tp, value), **kwargs)
+
+
+def parse_fields(schema: Type[BaseModel], fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """?fields=a,b,c → 字段元组（按请求顺序去重）；None 表示全部字段；未知字段返回 400"""
+    if fields is None:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not names:
+        raise HTTPException(status_code=400, detail="fields 不能为空")
+    unknown = [name for name in names if name not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(unknown)}")
+    return names
+
+
+@functools.lru_cache(maxsize=None)
+def schema_columns(schema: Type[BaseModel], model, fields: Optional[Tuple[str, ...]] = None) -> Tuple:
+    """输出模型各字段（或其中 fields 指定的部分）对应的表列，用作 SELECT 列表"""
+    table = model.__table__
+    return tuple(table.c[name] for name in (fields or schema.model_fields))
+
+
+def row_dicts(rows: Sequence) -> List[dict]:
+    """查询得到的 Row 转为字典（按列名）；TypeAdapter 校验字典远快于 from_attributes 逐个取属性"""
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def rows_json(result: Result) -> bytes:
+    """查询结果的每一行按列名转为 JSON 对象（日期时间格式与 pydantic 一致）"""
+    keys = list(result.keys())
+    return orjson.dumps([dict(zip(keys, row)) for row in result])
+
+
+def rows_response(result: Result, **kwargs) -> FastJSONResponse:
+    return FastJSONResponse(rows_json(result), **kwargs)
@@ -0,0 +1,245 @@
+"""
+列式关键指标引擎：疗程数据一次载入为数组，单次遍历算出全部 KeyStats
+- 峰值及其所在 cycle_day（同值取最早一天）
+- 发热 / 便血事件
+- 最近 N 天均值
+- 综合评分最高的 K 个「最辛苦的日子」
+支持一次传入多个疗程（跨疗程报表）
+"""
+import heapq
+import math
+from array import array
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from models import DailyLog
+from schemas import KeyStats
+
+NULL = -1  # 整数列的空值哨兵（各评分均为非负数）
+
+# 载入统计所需的列（不含 note 等大字段）
+STAT_COLUMNS = (
+    DailyLog.cycle_no,
+    DailyLog.date,
+    DailyLog.cycle_day,
+    DailyLog.energy,
+    DailyLog.nausea,
+    DailyLog.stool_count,
+    DailyLog.diarrhea,
+    DailyLog.sleep_quality,
+    DailyLog.fever,
+    DailyLog.temp_c,
+    DailyLog.stool_blood_count,
+)
+
+# (KeyStats 峰值字段, 所在天字段, 列名)
+_PEAKS = (
+    ("max_nausea", "max_nausea_day", "nausea"),
+    ("min_energy", "min_energy_day", "energy"),  # energy 越大越差
+    ("max_stool", "max_stool_day", "stool_count"),
+    ("max_diarrhea", "max_diarrhea_day", "diarrhea"),
+)
+# (KeyStats 均值字段, 列名)
+_AVERAGES = (
+    ("avg_energy_7d", "energy"),
+    ("avg_nausea_7d", "nausea"),
+    ("avg_stool_7d", "stool_count"),
+    ("avg_sleep_7d", "sleep_quality"),
+)
+
+
+def _int(value) -> int:
+    return NULL if value is None else int(value)
+
+
+def day_score(energy: Optional[int], nausea: Optional[int]) -> int:
+    """日历与「最辛苦日子」共用的基础分：体力 + 恶心"""
+    return (energy or 0) + (nausea or 0)
+
+
+def day_status(energy: Optional[int], nausea: Optional[int], is_tough_day: bool):
+    """已记录日的日历状态与表情"""
+    if is_tough_day:
+        return "tough", "💪"
+    score = day_score(energy, nausea)
+    if score <= 2:
+        return "good", "😊"
+    if score <= 4:
+        return "okay", "😐"
+    return "tough", "💪"
+
+
+class CycleColumns:
+    """一个疗程按日期升序排列的列式数据"""
+
+    __slots__ = (
+        "dates", "cycle_day", "energy", "nausea", "stool_count",
+        "diarrhea", "sleep_quality", "fever", "temp_c", "blood",
+    )
+
+    def __init__(self):
+        self.dates: List[date] = []
+        self.cycle_day = array("i")
+        self.energy = array("h")
+        self.nausea = array("h")
+        self.stool_count = array("h")
+        self.diarrhea = array("h")
+        self.sleep_quality = array("h")
+        self.fever = array("h")
+        self.temp_c = array("d")
+        self.blood = array("i")
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def append(self, row) -> None:
+        """追加一行（DailyLog 实体或包含同名属性的 Row）"""
+        self.dates.append(row.date)
+        self.cycle_day.append(_int(row.cycle_day))
+        self.energy.append(_int(row.energy))
+        self.nausea.append(_int(row.nausea))
+        self.stool_count.append(_int(row.stool_count))
+        self.diarrhea.append(_int(row.diarrhea))
+        self.sleep_quality.append(_int(row.sleep_quality))
+        self.fever.append(1 if row.fever else 0)
+        self.temp_c.append(math.nan if row.temp_c is None else row.temp_c)
+        self.blood.append(row.stool_blood_count or 0)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable) -> "CycleColumns":
+        cols = cls()
+        for row in sorted(rows, key=lambda r: r.date):
+            cols.append(row)
+        return cols
+
+
+def load_cycle_columns(
+    db: Session, family_id: int, cycle_nos: Optional[Sequence[int]] = None,
+) -> Dict[int, CycleColumns]:
+    """一次查询载入一个或多个疗程的统计列（只含填写过症状的日子，与 /summary 一致）"""
+    query = db.query(*STAT_COLUMNS).filter(DailyLog.family_id == family_id, DailyLog.symptoms_recorded)
+    if cycle_nos is not None:
+        query = query.filter(DailyLog.cycle_no.in_(list(cycle_nos)))
+    result: Dict[int, CycleColumns] = {}
+    for row in query.order_by(DailyLog.cycle_no, DailyLog.date):
+        cols = result.get(row.cycle_no)
+        if cols is None:
+            cols = result[row.cycle_no] = CycleColumns()
+        cols.append(row)
+    return result
+
+
+def _day(value: int) -> Optional[int]:
+    return None if value == NULL else value
+
+
+def compute_key_stats(cols: CycleColumns, recent_days: int = 7, top_k: int = 3) -> KeyStats:
+    """单次遍历计算 KeyStats"""
+    stats = KeyStats()
+    n = len(cols)
+    if not n:
+        return stats
+
+    peak_columns = [getattr(cols, name) for _, _, name in _PEAKS]
+    peak_val = [NULL] * len(_PEAKS)
+    peak_idx = [0] * len(_PEAKS)
+    avg_columns = [getattr(cols, name) for _, name in _AVERAGES]
+    avg_sum = [0] * len(_AVERAGES)
+    avg_cnt = [0] * len(_AVERAGES)
+    recent_from = n - recent_days
+
+    energy, nausea, stool = cols.energy, cols.nausea, cols.stool_count
+    fever, temp, blood = cols.fever, cols.temp_c, cols.blood
+    fever_idx, blood_idx = [], []
+    worst: list = []  # 小顶堆 (score, -i)：分数高者优先，同分取较早的一天
+
+    for i in range(n):
+        for k, column in enumerate(peak_columns):
+            v = column[i]
+            if v > peak_val[k]:
+                peak_val[k] = v
+                peak_idx[k] = i
+
+        if i >= recent_from:
+            for k, column in enumerate(avg_columns):
+                v = column[i]
+                if v != NULL:
+                    avg_sum[k] += v
+                    avg_cnt[k] += 1
+
+        has_fever = fever[i] and temp[i] == temp[i] and temp[i] != 0  # nan != nan
+        if has_fever:
+            fever_idx.append(i)
+        if blood[i] > 0:
+            blood_idx.append(i)
+
+        score = day_score(_day(energy[i]), _day(nausea[i]))
+        if has_fever:
+            score += 3
+        if stool[i] >= 5:
+            score += 2
+        entry = (score, -i)
+        if len(worst) < top_k:
+            heapq.heappush(worst, entry)
+        elif entry > worst[0]:
+            heapq.heapreplace(worst, entry)
+
+    for k, (value_field, day_field, _) in enumerate(_PEAKS):
+        if peak_val[k] != NULL:
+            setattr(stats, value_field, peak_val[k])
+            setattr(stats, day_field, _day(cols.cycle_day[peak_idx[k]]))
+
+    for k, (field, _) in enumerate(_AVERAGES):
+        if avg_cnt[k]:
+            setattr(stats, field, round(avg_sum[k] / avg_cnt[k], 1))
+
+    stats.fever_events = [
+        {"date": str(cols.dates[i]), "day": _day(cols.cycle_day[i]), "temp": temp[i]}
+        for i in fever_idx
+    ]
+    stats.blood_events = [
+        {"date": str(cols.dates[i]), "day": _day(cols.cycle_day[i]), "count": blood[i]}
+        for i in blood_idx
+    ]
+    stats.worst_days = [
+        {"day": _day(cols.cycle_day[-neg_i]), "date": str(cols.dates[-neg_i]), "reasons": _reasons(cols, -neg_i)}
+        for _, neg_i in sorted(worst, reverse=True)
+    ]
+    return stats
+
+
+def day_reasons(
+    energy: Optional[int], nausea: Optional[int], fever: bool,
+    temp_c: Optional[float], stool_count: Optional[int],
+) -> List[str]:
+    """「最辛苦的日子」的原因说明"""
+    reasons = []
+    if energy is not None and energy >= 3:
+        reasons.append(f"体力{energy}")
+    if nausea is not None and nausea >= 2:
+        reasons.append(f"恶心{nausea}")
+    if fever and temp_c:
+        reasons.append(f"发热{temp_c}℃")
+    if stool_count is not None and stool_count >= 5:
+        reasons.append(f"排便{stool_count}次")
+    return reasons
+
+
+def _reasons(cols: CycleColumns, i: int) -> List[str]:
+    t = cols.temp_c[i]
+    return day_reasons(
+        _day(cols.energy[i]), _day(cols.nausea[i]), bool(cols.fever[i]),
+        None if t != t else t, _day(cols.stool_count[i]),
+    )
+
+
+def compute_many(
+    columns: Dict[int, CycleColumns], recent_days: int = 7, top_k: int = 3,
+) -> Dict[int, KeyStats]:
+    """跨疗程：{cycle_no: CycleColumns} -> {cycle_no: KeyStats}"""
+    return {
+        cycle_no: compute_key_stats(cols, recent_days=recent_days, top_k=top_k)
+        for cycle_no, cols in columns.items()
+    }
@@ -0,0 +1,123 @@
+"""
+关键指标的 PostgreSQL 聚合实现：在库内完成峰值 / 均值 / 事件 / 最辛苦日子的计算
+只有少量结果行回传（聚合 1 行 + 峰值 ≤4 行 + 事件与最辛苦日子若干行）
+输出与 stats_engine.compute_key_stats 完全一致（见 bench/stats_parity.py）
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import DailyLog
+from schemas import KeyStats
+from stats_engine import day_reasons
+
+# DailyLog.symptoms_recorded：点排便按钮建立、只有排便计数的记录不参与统计
+_RECORDED = " OR ".join(
+    [f"{name} IS NOT NULL" for name in DailyLog.SYMPTOM_VALUES]
+    + [f"{name} IS TRUE" for name in DailyLog.SYMPTOM_FLAGS]
+)
+
+# 本疗程记录 + 「最近 N 天」排名 + 综合评分（与 stats_engine 的评分规则相同）
+_LOGS_CTE = """
+WITH logs AS (
+    SELECT
+        date, cycle_day, energy, nausea, stool_count, diarrhea, sleep_quality,
+        fever, temp_c,
+        COALESCE(stool_blood_count, 0) AS blood,
+        (fever AND temp_c <> 0) IS TRUE AS has_fever,
+        ROW_NUMBER() OVER (ORDER BY date DESC) AS recent_rank,
+        COALESCE(energy, 0) + COALESCE(nausea, 0)
+            + CASE WHEN fever AND temp_c <> 0 THEN 3 ELSE 0 END
+            + CASE WHEN stool_count >= 5 THEN 2 ELSE 0 END AS score
+    FROM daily_logs
+    WHERE family_id = :family_id AND cycle_no = :cycle_no AND (""" + _RECORDED + """)
+)
+"""
+
+# 最近 N 天的和与计数（均值在 Python 中按原规则取整）
+_AVERAGES_SQL = text(_LOGS_CTE + """
+SELECT
+    SUM(energy)        FILTER (WHERE recent_rank <= :recent_days) AS energy_sum,
+    COUNT(energy)      FILTER (WHERE recent_rank <= :recent_days) AS energy_cnt,
+    SUM(nausea)        FILTER (WHERE recent_rank <= :recent_days) AS nausea_sum,
+    COUNT(nausea)      FILTER (WHERE recent_rank <= :recent_days) AS nausea_cnt,
+    SUM(stool_count)   FILTER (WHERE recent_rank <= :recent_days) AS stool_sum,
+    COUNT(stool_count) FILTER (WHERE recent_rank <= :recent_days) AS stool_cnt,
+    SUM(sleep_quality)   FILTER (WHERE recent_rank <= :recent_days) AS sleep_sum,
+    COUNT(sleep_quality) FILTER (WHERE recent_rank <= :recent_days) AS sleep_cnt
+FROM logs
+""")
+
+# 各指标的峰值及其所在天（同值取最早一天）
+_PEAKS_SQL = text(_LOGS_CTE + """
+SELECT DISTINCT ON (m.metric) m.metric, m.value, l.cycle_day
+FROM logs l
+CROSS JOIN LATERAL (VALUES
+    ('nausea', l.nausea),
+    ('energy', l.energy),
+    ('stool_count', l.stool_count),
+    ('diarrhea', l.diarrhea)
+) AS m(metric, value)
+WHERE m.value IS NOT NULL
+ORDER BY m.metric, m.value DESC, l.date
+""")
+
+# 发热 / 便血事件，以及评分前 K 的日子（同分取较早的一天）
+_EVENTS_SQL = text(_LOGS_CTE + """
+SELECT *
+FROM (
+    SELECT logs.*, ROW_NUMBER() OVER (ORDER BY score DESC, date) AS worst_rank
+    FROM logs
+) ranked
+WHERE has_fever OR blood > 0 OR worst_rank <= :top_k
+ORDER BY date
+""")
+
+_PEAK_FIELDS = {
+    "nausea": ("max_nausea", "max_nausea_day"),
+    "energy": ("min_energy", "min_energy_day"),
+    "stool_count": ("max_stool", "max_stool_day"),
+    "diarrhea": ("max_diarrhea", "max_diarrhea_day"),
+}
+_AVERAGE_FIELDS = (
+    ("avg_energy_7d", "energy"),
+    ("avg_nausea_7d", "nausea"),
+    ("avg_stool_7d", "stool"),
+    ("avg_sleep_7d", "sleep"),
+)
+
+
+def compute_key_stats_sql(
+    db: Session, family_id: int, cycle_no: int, recent_days: int = 7, top_k: int = 3,
+) -> KeyStats:
+    """在 PostgreSQL 中聚合一个疗程的 KeyStats"""
+    params = {"family_id": family_id, "cycle_no": cycle_no}
+    stats = KeyStats()
+
+    avg = db.execute(_AVERAGES_SQL, {**params, "recent_days": recent_days}).mappings().one()
+    for field, prefix in _AVERAGE_FIELDS:
+        if avg[f"{prefix}_cnt"]:
+            setattr(stats, field, round(avg[f"{prefix}_sum"] / avg[f"{prefix}_cnt"], 1))
+
+    for row in db.execute(_PEAKS_SQL, params):
+        value_field, day_field = _PEAK_FIELDS[row.metric]
+        setattr(stats, value_field, row.value)
+        setattr(stats, day_field, row.cycle_day)
+
+    worst = []
+    for row in db.execute(_EVENTS_SQL, {**params, "top_k": top_k}):
+        if row.has_fever:
+            stats.fever_events.append({"date": str(row.date), "day": row.cycle_day, "temp": row.temp_c})
+        if row.blood > 0:
+            stats.blood_events.append({"date": str(row.date), "day": row.cycle_day, "count": row.blood})
+        if row.worst_rank <= top_k:
+            worst.append(row)
+
+    stats.worst_days = [
+        {
+            "day": row.cycle_day,
+            "date": str(row.date),
+            "reasons": day_reasons(row.energy, row.nausea, row.fever, row.temp_c, row.stool_count),
+        }
+        for row in sorted(worst, key=lambda r: r.worst_rank)
+    ]
+    return stats
@@ -0,0 +1,149 @@
+"""
+连续记录天数（streak）：每个家庭一行 family_streaks，读取 O(1)
+- 只统计填写过症状的日子（DailyLog.symptoms_recorded）；点排便按钮建立的当日记录不计入
+- 写入新日期时增量更新：接上最后一天则 +1，中断则从 1 重新开始
+- 补录更早的日期只影响它左右相邻的两段记录：只读取补录日期前后 longest 天内的记录日期，
+  合并后的这一段可能刷新最长天数，接上当前这一段时更新当前天数（每段不超过 longest 天，窗口足够）
+- 重建用一次窗口查询（gaps-and-islands）：date - ROW_NUMBER() 相同的日期属于同一段连续记录
+
+全量重建（部署新表后执行一次）:
+  python streaks.py
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import Integer, cast, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import DailyLog, FamilyStreak
+
+
+def _island_key(db: Session):
+    """同一段连续日期内取值相同的分组键：日期序号 - 行号"""
+    rn = func.row_number().over(partition_by=DailyLog.family_id, order_by=DailyLog.date)
+    if db.get_bind().dialect.name == "postgresql":
+        return DailyLog.date - cast(rn, Integer)
+    return func.julianday(DailyLog.date) - rn
+
+
+def rebuild_streaks(db: Session, family_id: Optional[int] = None) -> int:
+    """从 daily_logs 重建 family_streaks（不传 family_id 时重建全部），返回处理的家庭数"""
+    days = db.query(
+        DailyLog.family_id.label("family_id"),
+        DailyLog.date.label("date"),
+        _island_key(db).label("island"),
+    ).filter(DailyLog.symptoms_recorded)
+    if family_id is not None:
+        days = days.filter(DailyLog.family_id == family_id)
+    days = days.subquery()
+
+    islands = (
+        db.query(
+            days.c.family_id,
+            func.max(days.c.date).label("last_date"),
+            func.count().label("length"),
+        )
+        .group_by(days.c.family_id, days.c.island)
+        .order_by(days.c.family_id, func.max(days.c.date))
+    )
+
+    result = {}
+    for row in islands:
+        # 按结束日期升序，每个家庭最后一段即当前连续记录
+        _, _, longest = result.get(row.family_id, (None, 0, 0))
+        result[row.family_id] = (row.last_date, row.length, max(longest, row.length))
+
+    if family_id is not None and family_id not in result:
+        result[family_id] = (None, 0, 0)
+
+    for fid, (last_date, current, longest) in result.items():
+        streak = db.get(FamilyStreak, fid) or FamilyStreak(family_id=fid)
+        streak.last_date = last_date
+        streak.current_streak = current
+        streak.longest_streak = longest
+        db.add(streak)
+    db.flush()
+    return len(result)
+
+
+def _lock_streak(db: Session, family_id: int):
+    """取得并锁定该家庭的 family_streaks 行；不存在时同一条语句插入空行（并发首次写入不会冲突）"""
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    now = datetime.utcnow()
+    stmt = insert(FamilyStreak).values(
+        family_id=family_id, current_streak=0, longest_streak=0, last_date=None, updated_at=now,
+    )
+    return db.execute(
+        stmt.on_conflict_do_update(index_elements=[FamilyStreak.family_id], set_={"updated_at": now})
+        .returning(FamilyStreak.current_streak, FamilyStreak.longest_streak, FamilyStreak.last_date)
+    ).one()
+
+
+def _backfill(db: Session, family_id: int, log_date: date, current: int, longest: int, last_date: date):
+    """补录 log_date（早于 last_date）后的 (当前天数, 最长天数)：只看前后 longest 天内的记录日期"""
+    recorded = {
+        row.date for row in db.query(DailyLog.date).filter(
+            DailyLog.family_id == family_id,
+            DailyLog.symptoms_recorded,
+            DailyLog.date.between(log_date - timedelta(days=longest + 1), log_date + timedelta(days=longest + 1)),
+        )
+    }
+    start = end = log_date
+    while start - timedelta(days=1) in recorded:
+        start -= timedelta(days=1)
+    while end + timedelta(days=1) in recorded:
+        end += timedelta(days=1)
+    length = (end - start).days + 1
+    if end == last_date:  # 接上了当前这一段
+        current = length
+    return current, max(longest, length)
+
+
+def record_log_date(db: Session, family_id: int, log_date: date) -> None:
+    """家庭在 log_date 有了记录后增量更新（与写入同一事务，调用前已写入当天记录）；同一天重复调用无副作用"""
+    current, longest, last_date = _lock_streak(db, family_id)
+    if last_date is None:
+        # 首次记录（或 family_streaks 上线前的历史数据）：重建该家庭
+        db.flush()
+        rebuild_streaks(db, family_id)
+        return
+
+    if log_date == last_date:
+        return
+    if log_date < last_date:
+        db.flush()
+        current, longest = _backfill(db, family_id, log_date, current, longest, last_date)
+    else:
+        current = current + 1 if log_date == last_date + timedelta(days=1) else 1
+        last_date = log_date
+        longest = max(longest, current)
+    db.execute(
+        update(FamilyStreak)
+        .where(FamilyStreak.family_id == family_id)
+        .values(current_streak=current, longest_streak=longest, last_date=last_date)
+    )
+
+
+def get_streak(db: Session, family_id: int, today: date) -> Tuple[int, int]:
+    """(当前连续天数, 最长连续天数)；最后一天早于昨天视为已中断"""
+    streak = db.get(FamilyStreak, family_id)
+    if streak is None or streak.last_date is None:
+        return 0, 0
+    current = streak.current_streak if streak.last_date >= today - timedelta(days=1) else 0
+    return current, streak.longest_streak
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+    from migrations import check_schema
+
+    check_schema(engine)
+    session = SessionLocal()
+    try:
+        n = rebuild_streaks(session)
+        session.commit()
+        print(f"✅ 已重建 {n} 个家庭的连续记录")
+    finally:
+        session.close()
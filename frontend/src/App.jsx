@@ -2,10 +2,10 @@
  * CareLine App - 化疗周期副作用管理系统
  * 完整前端应用：登录 → 入驻 → 主界面
  */
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { AreaChart, Area, XAxis, YAxis, Tooltip, ResponsiveContainer, CartesianGrid } from 'recharts';
 import api from './utils/api';
-import { toDateStr } from './hooks/useCareline';
+import { hasSymptoms, toDateStr, useLiveUpdates } from './hooks/useCareline';
 
 // ═══════════════════════════════════════════════════════════════════════
 //  CONSTANTS
@@ -567,7 +567,8 @@ function RecordPage({ isPatient, cycle, goBack }) {
       .then(log => {
         console.log("[代填] 查询结果:", JSON.stringify(log));
         setDebugInfo(prev => ({ ...prev, todayLog: log, todayLogRaw: JSON.stringify(log) }));
-        setExistingLog(log);
+        // 只有排便计数（点排便按钮建立）的记录不算已记录，仍预填排便次数
+        setExistingLog(hasSymptoms(log) ? log : null);
         // Pre-fill form with existing data
         if (log) {
           console.log("[代填] 找到已有记录，预填数据");
@@ -1200,6 +1201,9 @@ function CalendarPage() {
 // ═══════════════════════════════════════════════════════════════════════
 //  CAREGIVER: TREND PAGE (real API integration + recharts)
 // ═══════════════════════════════════════════════════════════════════════
+// Only the columns the charts plot
+const CHART_FIELDS = ["cycle_day", "nausea", "energy", "stool_count", "diarrhea"];
+
 function TrendPage({ cycle }) {
   const [metric, setMetric] = useState("nausea");
   const [logs, setLogs] = useState([]);
@@ -1210,13 +1214,13 @@ function TrendPage({ cycle }) {
   useEffect(() => {
     if (!cycle) return;
     setLoading(true);
-    api.getCycleLogs(cycle.cycle_no)
+    api.getCycleLogs(cycle.cycle_no, CHART_FIELDS)
       .then(setLogs)
       .catch(() => {})
       .finally(() => setLoading(false));
     // Also try to load previous cycle
     if (cycle.cycle_no > 1) {
-      api.getCycleLogs(cycle.cycle_no - 1).then(setPrevLogs).catch(() => {});
+      api.getCycleLogs(cycle.cycle_no - 1, CHART_FIELDS).then(setPrevLogs).catch(() => {});
     }
   }, [cycle?.cycle_no]);
 
@@ -1386,35 +1390,48 @@ export default function App() {
   const isPatient = family?.my_role === "patient";
   const accent = isPatient ? "#E8825A" : "#5B7FE8";
 
-  // Bootstrap: check auth → family → cycle
+  // Bootstrap: check auth, then family + cycle + messages in one /home request
+  // 版本戳未变化的区块不重新 set，避免整页重渲染
+  const homeVersions = useRef({});
   const bootstrap = useCallback(async () => {
     if (!api.token) { setAppState("login"); return; }
+    const homeReq = api.getHome().catch(() => null);
     try {
-      const me = await api.getMe();
-      setUser(me);
-      try {
-        const fam = await api.getMyFamily();
-        setFamily(fam);
-        try {
-          const cy = await api.getCurrentCycle();
-          setCycle(cy);
-          // Load messages
-          try { const msgs = await api.getActiveMessages(); setMessages(msgs); } catch {}
-          setAppState("main");
-        } catch {
-          setAppState("onboarding");
-        }
-      } catch {
-        setAppState("onboarding");
-      }
+      setUser(await api.getMe());
     } catch {
       api.clearToken();
+      homeVersions.current = {};
       setAppState("login");
+      return;
+    }
+    const home = await homeReq;
+    if (!home || !home.cycle) {
+      // 还没有家庭（/home 返回 4xx）或没有进行中的疗程
+      if (home) setFamily(home.family);
+      homeVersions.current = {};
+      setAppState("onboarding");
+      return;
     }
+    const versions = home.versions || {};
+    const last = homeVersions.current;
+    if (versions.family !== last.family) setFamily(home.family);
+    if (versions.cycle !== last.cycle) setCycle(home.cycle);
+    if (versions.messages !== last.messages) setMessages(home.messages);
+    homeVersions.current = versions;
+    setAppState("main");
   }, []);
 
   useEffect(() => { bootstrap(); }, [bootstrap]);
 
+  // 家人写入后实时刷新，无需手动重新打开
+  useLiveUpdates(appState === "main", (type) => {
+    if (type === "message") {
+      api.getActiveMessages().then(setMessages).catch(() => {});
+    } else {
+      triggerRefresh();
+    }
+  });
+
   if (appState === "loading") {
     return (
       <div style={{
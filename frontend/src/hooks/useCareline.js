@@ -2,7 +2,7 @@
  * CareLine React Hooks
  * 数据获取和状态管理
  */
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import api from '../utils/api';
 
 /**
@@ -132,6 +132,16 @@ export function useCalendar(year, month) {
   );
 }
 
+/**
+ * Calendar range hook (year-view heatmap, up to one year)
+ */
+export function useCalendarRange(from, to) {
+  return useAsync(
+    () => api.getCalendarRange(from, to),
+    [from, to]
+  );
+}
+
 /**
  * Active messages hook
  */
@@ -139,6 +149,19 @@ export function useMessages() {
   return useAsync(() => api.getActiveMessages());
 }
 
+/**
+ * Live family updates: calls onEvent(type, data) for change / message / reset pushes
+ */
+export function useLiveUpdates(enabled, onEvent) {
+  const handler = useRef(onEvent);
+  handler.current = onEvent;
+
+  useEffect(() => {
+    if (!enabled || !api.token) return undefined;
+    return api.subscribeLive((type, data) => handler.current(type, data));
+  }, [enabled]);
+}
+
 /**
  * Date formatting helper
  */
@@ -148,6 +171,15 @@ export function formatDate(d) {
   return `${date.getMonth() + 1}月${date.getDate()}日`;
 }
 
+// 与后端 DailyLog.symptoms_recorded 一致：点排便按钮会建立只有排便计数的当日记录，不算「已记录」
+const SYMPTOM_VALUES = ['energy', 'nausea', 'appetite', 'sleep_quality', 'temp_c', 'diarrhea', 'note'];
+const SYMPTOM_FLAGS = ['fever', 'numbness', 'mouth_sore', 'is_tough_day'];
+
+export function hasSymptoms(log) {
+  if (!log) return false;
+  return SYMPTOM_VALUES.some(k => log[k] != null) || SYMPTOM_FLAGS.some(k => !!log[k]);
+}
+
 export function toDateStr(d) {
   if (!d) d = new Date();
   const date = typeof d === 'string' ? new Date(d) : d;
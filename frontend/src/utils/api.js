@@ -3,7 +3,10 @@
  * 封装所有后端 API 调用
  */
 
+import { columnarRows } from './columnar';
+
 const API_BASE = import.meta.env.VITE_API_BASE || '/api';
+const LIVE_RETRY_MS = 5000;   // /live 断线后换新票据重连的间隔
 
 class ApiClient {
   constructor() {
@@ -63,6 +66,23 @@ class ApiClient {
     return this.request(path, { method: 'DELETE' });
   }
 
+  /**
+   * 幂等写：整个重试过程使用同一个 Idempotency-Key，
+   * 网络错误时自动重发，服务端只执行一次
+   */
+  async idempotent(method, path, data, retries = 2) {
+    const headers = { 'Idempotency-Key': crypto.randomUUID() };
+    for (let attempt = 0; ; attempt++) {
+      try {
+        return await this.request(path, { method, body: JSON.stringify(data), headers });
+      } catch (err) {
+        // fetch 的网络错误为 TypeError；HTTP 错误不重试
+        if (!(err instanceof TypeError) || attempt >= retries) throw err;
+        await new Promise((r) => setTimeout(r, 500 * 2 ** attempt));
+      }
+    }
+  }
+
   // ─── Auth ────────────────────────────────────────────────────────
   async register(phone, password, nickname) {
     const data = await this.post('/auth/register', { phone, password, nickname });
@@ -87,21 +107,30 @@ class ApiClient {
   }
 
   // ─── Family ──────────────────────────────────────────────────────
-  createFamily(name, role) {
-    return this.post('/family/create', { name, role });
+  async createFamily(name, role) {
+    const data = await this.post('/family/create', { name, role });
+    if (data.access_token) this.setToken(data.access_token);
+    return data;
   }
 
-  joinFamily(inviteCode, role) {
-    return this.post('/family/join', { invite_code: inviteCode, role });
+  async joinFamily(inviteCode, role) {
+    const data = await this.post('/family/join', { invite_code: inviteCode, role });
+    if (data.access_token) this.setToken(data.access_token);
+    return data;
   }
 
   getMyFamily() {
     return this.get('/family/me');
   }
 
+  // ─── Home ────────────────────────────────────────────────────────
+  getHome() {
+    return this.get('/home');
+  }
+
   // ─── Cycle ───────────────────────────────────────────────────────
   createCycle(cycleNo, startDate, lengthDays, regimen) {
-    return this.post('/cycle', {
+    return this.idempotent('POST', '/cycle', {
       cycle_no: cycleNo,
       start_date: startDate,
       length_days: lengthDays,
@@ -119,15 +148,16 @@ class ApiClient {
 
   // ─── DailyLog ────────────────────────────────────────────────────
   upsertDailyLog(dateStr, data) {
-    return this.put(`/daily/${dateStr}`, data);
+    return this.idempotent('PUT', `/daily/${dateStr}`, data);
   }
 
   getDailyRange(from, to) {
     return this.get(`/daily/range?from=${from}&to=${to}`);
   }
 
-  getCycleLogs(cycleNo) {
-    return this.get(`/daily/cycle/${cycleNo}`);
+  async getCycleLogs(cycleNo, fields) {
+    const only = fields ? `&fields=${fields.join(',')}` : '';
+    return columnarRows(await this.get(`/daily/cycle/${cycleNo}?format=columnar${only}`));
   }
 
   getToday() {
@@ -136,15 +166,15 @@ class ApiClient {
 
   // ─── Stool ───────────────────────────────────────────────────────
   createStoolEvent(data) {
-    return this.post('/stool', data);
+    return this.idempotent('POST', '/stool', data);
   }
 
   getTodayStool() {
     return this.get('/stool/today');
   }
 
-  getStoolRange(from, to) {
-    return this.get(`/stool/range?from=${from}&to=${to}`);
+  getStoolRange(from, to, { includeEvents = true } = {}) {
+    return this.get(`/stool/range?from=${from}&to=${to}&include_events=${includeEvents}`);
   }
 
   deleteStoolEvent(eventId) {
@@ -152,10 +182,11 @@ class ApiClient {
   }
 
   // ─── Summary ─────────────────────────────────────────────────────
-  getSummary(cycleNo, days = 14, mode = 'caregiver') {
-    const params = new URLSearchParams({ days, mode });
+  async getSummary(cycleNo, days = 14, mode = 'caregiver') {
+    const params = new URLSearchParams({ days, mode, format: 'columnar' });
     if (cycleNo) params.set('cycle_no', cycleNo);
-    return this.get(`/summary?${params}`);
+    const res = await this.get(`/summary?${params}`);
+    return { ...res, trends: columnarRows(res.trends) };
   }
 
   getCalendar(year, month) {
@@ -165,9 +196,56 @@ class ApiClient {
     return this.get(`/summary/calendar?${params}`);
   }
 
+  getCalendarRange(from, to) {
+    return this.get(`/summary/calendar/range?from=${from}&to=${to}`);
+  }
+
+  // ─── Sync ────────────────────────────────────────────────────────
+  getChanges(since = 0) {
+    return this.get(`/sync/changes?since=${since}`);
+  }
+
+  /**
+   * 订阅家庭实时事件（SSE）：change / message / reset
+   * EventSource 无法设置请求头，而 URL 会进入访问日志：每次连接先换一次性票据，不把 token 放进 URL。
+   * 票据用过即失效，浏览器自带的重连会被拒绝，所以断线后由这里换新票据重连
+   */
+  subscribeLive(onEvent) {
+    let source = null;
+    let timer = null;
+    let closed = false;
+
+    const connect = async () => {
+      try {
+        const { ticket } = await this.post('/live/ticket');
+        if (closed) return;
+        source = new EventSource(`${API_BASE}/live?ticket=${encodeURIComponent(ticket)}`);
+        for (const type of ['change', 'message', 'reset']) {
+          source.addEventListener(type, (e) => onEvent(type, JSON.parse(e.data)));
+        }
+        source.onerror = () => {
+          source.close();
+          retry();
+        };
+      } catch {
+        retry();
+      }
+    };
+    const retry = () => {
+      if (!closed) timer = setTimeout(connect, LIVE_RETRY_MS);
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      source?.close();
+    };
+  }
+
   // ─── Message ─────────────────────────────────────────────────────
   sendMessage(content) {
-    return this.post('/message', { content });
+    return this.idempotent('POST', '/message', { content });
   }
 
   getActiveMessages() {
@@ -0,0 +1,36 @@
+/**
+ * 列式数据（format=columnar）解码
+ * 编码规则见后端 schemas.ColumnarTable：普通数组 / 稀疏 {i, v} / 日期 {base, d}；布尔值为 0 / 1
+ */
+
+function addDays(base, days) {
+  const [y, m, d] = base.split('-').map(Number);
+  return new Date(Date.UTC(y, m - 1, d + days)).toISOString().slice(0, 10);
+}
+
+function decodeColumn(col, n) {
+  if (Array.isArray(col)) return col;
+  if (col.base !== undefined) {
+    return col.d.map((x) => (x == null ? null : addDays(col.base, x)));
+  }
+  const dense = new Array(n).fill(null);
+  col.i.forEach((idx, k) => { dense[idx] = col.v[k]; });
+  return dense;
+}
+
+/** 列式 → { 字段: 数组 }（图表直接使用） */
+export function columnarColumns(table) {
+  return Object.fromEntries(
+    Object.entries(table.columns).map(([key, col]) => [key, decodeColumn(col, table.n)])
+  );
+}
+
+/** 列式 → 对象数组；已是数组时原样返回 */
+export function columnarRows(table) {
+  if (!table || Array.isArray(table)) return table || [];
+  const cols = columnarColumns(table);
+  const keys = Object.keys(cols);
+  return Array.from({ length: table.n }, (_, i) =>
+    Object.fromEntries(keys.map((key) => [key, cols[key][i]]))
+  );
+}
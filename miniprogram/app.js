@@ -1,4 +1,6 @@
 // app.js
+var api = require('./utils/api.js');
+
 App({
   globalData: {
     token: '',
@@ -20,6 +22,32 @@ App({
       this.globalData.familyId = familyId;
       this.globalData.nickname = nickname || '';
     }
+
+    // 旧版本保存的本地副本（/sync/changes 全量快照）已不再使用
+    wx.removeStorageSync('careline_replica');
+
+    // 网络恢复时上传离线队列
+    wx.onNetworkStatusChange(function (res) {
+      if (res.isConnected) api.flushQueue().catch(function () {});
+    });
+  },
+
+  onShow: function () {
+    if (!this.checkLogin()) return;
+    // 上传离线队列；页面数据由各页面在 onShow（脏标记）时刷新
+    api.flushQueue().catch(function () {});
+    api.subscribeLive(this._onLiveEvent);
+  },
+
+  onHide: function () {
+    api.unsubscribeLive();
+  },
+
+  // 家人写入后通知当前页面（页面实现 onLiveEvent 时即时刷新，否则靠脏标记在 onShow 时刷新）
+  _onLiveEvent: function (type, data) {
+    var pages = getCurrentPages();
+    var page = pages[pages.length - 1];
+    if (page && typeof page.onLiveEvent === 'function') page.onLiveEvent(type, data);
   },
 
   checkLogin: function () {
@@ -31,6 +59,7 @@ App({
     this.globalData.role = '';
     this.globalData.familyId = 0;
     this.globalData.nickname = '';
+    api.unsubscribeLive();
     wx.clearStorageSync();
     wx.reLaunch({ url: '/pages/login/login' });
   }
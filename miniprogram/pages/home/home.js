@@ -49,6 +49,12 @@ Page({
     this._loadData();
   },
 
+  // 家人有新记录或留言：首页即时刷新
+  onLiveEvent: function () {
+    wx.removeStorageSync('careline_dirty');
+    this._loadData();
+  },
+
   // ─── 动态问候语 ───
   _getGreeting: function (cycleDay, lengthDays) {
     var hour = new Date().getHours();
@@ -102,12 +108,18 @@ Page({
     var that = this;
     that.setData({ loading: true });
 
-    Promise.all([
-      api.getCurrentCycle().catch(function () { return null; }),
-      api.getToday().catch(function () { return null; })
-    ]).then(function (results) {
-      var cycle = results[0];
-      var todayLog = results[1];
+    api.getHome().then(function (home) {
+      // 版本戳未变化 → 跳过重新渲染
+      var versions = home.versions || {};
+      var last = that._versions || {};
+      if (that._loaded && versions.cycle === last.cycle && versions.today_log === last.today_log) {
+        that.setData({ greetingText: that._getGreeting(), loading: false });
+        return;
+      }
+      that._versions = versions;
+
+      var cycle = home.cycle;
+      var todayLog = home.today_log;
 
       var cycleNo = cycle ? cycle.cycle_no : 0;
       var cycleDay = cycle ? cycle.current_day : 0;
@@ -116,7 +128,7 @@ Page({
       var greetingText = that._getGreeting(cycleDay, lengthDays);
       var cycleDayLabel = that._getCycleDayLabel(cycleDay, lengthDays);
 
-      var hasRecorded = !!todayLog;
+      var hasRecorded = util.hasSymptoms(todayLog);
       var statusEmoji = '📝';
       var statusText = '花1分钟记录一下今天的状态吧';
       var encourageText = '';
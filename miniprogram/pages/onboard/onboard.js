@@ -53,6 +53,11 @@ Page({
 
   _saveAndGo: function (familyData) {
     var app = getApp();
+    // 加入/创建家庭后服务端会重新签发带家庭信息的 token
+    if (familyData.access_token) {
+      wx.setStorageSync('careline_token', familyData.access_token);
+      app.globalData.token = familyData.access_token;
+    }
     wx.setStorageSync('careline_role', familyData.my_role);
     wx.setStorageSync('careline_family_id', familyData.id);
     wx.setStorageSync('careline_nickname', this.data.nickname);
@@ -90,7 +90,8 @@ Page({
       var stoolSummary = results[1];
       var actualStoolCount = (stoolSummary && stoolSummary.count != null) ? stoolSummary.count : 0;
 
-      if (log) {
+      // 只有排便计数（点排便按钮建立）的记录不算已记录，走「未记录」分支并带上排便次数
+      if (util.hasSymptoms(log)) {
         that.setData({ existingLog: log });
         that._prefill(log, actualStoolCount);
         if (!that.data.isPatient) {
@@ -86,7 +86,8 @@ Page({
     if (no === that.data.cycleNo) return;
     that.setData({ compareNo: no });
     wx.showLoading({ title: '加载中...' });
-    api.getCycleLogs(no).then(function (logs) {
+    var fields = ['cycle_day'].concat(that.data.metrics.map(function (m) { return m.key; }));
+    api.getCycleLogs(no, fields).then(function (logs) {
       that.setData({ compareData: logs || [] });
       that._drawChart();
     }).catch(function () {
@@ -222,8 +223,8 @@ Page({
         calendarDays.push({
           empty: false, day: d,
           isToday: d === todayDate && month === todayMonth,
-          emoji: logDay ? util.getStatusEmoji(logDay.energy, logDay.nausea) : '',
-          hasLog: !!logDay,
+          emoji: logDay && logDay.recorded ? logDay.emoji : '',
+          hasLog: !!(logDay && logDay.recorded),
           cycleDay: logDay ? logDay.cycle_day : null
         });
       }
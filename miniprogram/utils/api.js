@@ -10,16 +10,24 @@ var API_BASE = 'https://tbowo.top/careline/api';
 // 测试环境（开发调试时切换到这行）
 // var API_BASE = 'https://tbowo.top/careline-test/api';
 
+var util = require('./util.js');
+
 function getToken() {
   return wx.getStorageSync('careline_token') || '';
 }
 
+// ETag 缓存：path -> { etag, data }（仅对传入 options.etag 的 GET 请求生效）
+var etagCache = {};
+
 function request(path, options) {
   options = options || {};
   return new Promise(function (resolve, reject) {
     var token = getToken();
     var header = { 'Content-Type': 'application/json' };
     if (token) header['Authorization'] = 'Bearer ' + token;
+    if (options.idempotencyKey) header['Idempotency-Key'] = options.idempotencyKey;
+    var cached = options.etag ? etagCache[path] : null;
+    if (cached) header['If-None-Match'] = cached.etag;
 
     wx.request({
       url: API_BASE + path,
@@ -33,20 +41,242 @@ function request(path, options) {
           reject(new Error('登录已过期'));
           return;
         }
+        if (res.statusCode === 304 && cached) {
+          resolve(cached.data);
+          return;
+        }
         if (res.statusCode >= 400) {
           var detail = (res.data && res.data.detail) || ('请求失败 (' + res.statusCode + ')');
-          reject(new Error(detail));
+          var error = new Error(typeof detail === 'string' ? detail : ('请求失败 (' + res.statusCode + ')'));
+          error.statusCode = res.statusCode;
+          reject(error);
           return;
         }
+        var etag = res.header && (res.header.ETag || res.header.Etag || res.header.etag);
+        if (options.etag && etag) etagCache[path] = { etag: etag, data: res.data };
         resolve(res.data);
       },
       fail: function (err) {
-        reject(new Error(err.errMsg || '网络请求失败'));
+        var error = new Error(err.errMsg || '网络请求失败');
+        error.offline = true;
+        reject(error);
+      }
+    });
+  });
+}
+
+// ─── 离线队列：断网时暂存写操作，恢复后经 /sync/batch 一次上传 ───
+var QUEUE_KEY = 'careline_sync_queue';
+var FAILED_KEY = 'careline_sync_failed';   // 被服务端拒绝或反复失败的操作，不再重传
+var RETRY_KEY = 'careline_sync_retry';     // { failures, retryAt }：整批请求失败后的退避状态
+var SYNC_BATCH_MAX = 500;
+var SYNC_MAX_ATTEMPTS = 5;                 // 单条暂时性失败 / 整批连续失败的上限
+var SYNC_BACKOFF_MS = 5000;                // 整批失败后 5s、10s、20s… 再试，最长 10 分钟
+var SYNC_BACKOFF_MAX_MS = 600000;
+var flushing = null;
+
+function loadQueue() {
+  return wx.getStorageSync(QUEUE_KEY) || [];
+}
+
+function loadRetry() {
+  return wx.getStorageSync(RETRY_KEY) || { failures: 0, retryAt: 0 };
+}
+
+// 移出队列，连同原因保存到失败列表
+function dropOps(ops, error) {
+  if (!ops.length) return;
+  var failed = wx.getStorageSync(FAILED_KEY) || [];
+  ops.forEach(function (op) { failed.push({ op: op, error: error || op.error || '' }); });
+  wx.setStorageSync(FAILED_KEY, failed);
+  var dropped = {};
+  ops.forEach(function (op) { dropped[op.client_id] = true; });
+  wx.setStorageSync(QUEUE_KEY, loadQueue().filter(function (op) { return !dropped[op.client_id]; }));
+}
+
+function newKey() {
+  return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 10);
+}
+
+function enqueue(op) {
+  var queue = loadQueue();
+  op.client_id = op.client_id || newKey();
+  queue.push(op);
+  wx.setStorageSync(QUEUE_KEY, queue);
+  return { queued: true, client_id: op.client_id };
+}
+
+// 写请求：网络失败时入队并视为成功（返回 { queued: true }）
+// 队列非空时新写入也排在队尾，保证服务端按点击顺序应用
+// 直接请求的 Idempotency-Key 与入队后的 client_id 相同：请求其实已到达服务端时，补传不会重复写入
+function writeOrQueue(path, options, op) {
+  op.client_id = newKey();
+  options.idempotencyKey = op.client_id;
+  if (loadQueue().length) {
+    var queued = enqueue(op);
+    return flushQueue().then(function () { return queued; }, function () { return queued; });
+  }
+  return request(path, options).catch(function (err) {
+    if (!err.offline) throw err;
+    return enqueue(op);
+  });
+}
+
+// 队列中还有本批没有带上的操作（本批里暂时失败的留到下次 flush）
+function hasUnsent(ops) {
+  var sent = {};
+  ops.forEach(function (op) { sent[op.client_id] = true; });
+  return loadQueue().some(function (op) { return !sent[op.client_id]; });
+}
+
+// 上传一批：返回 null（无需上传）或 { res, more }；more 表示还有未上传的操作，可立即继续
+function flushOnce() {
+  var retry = loadRetry();
+  if (Date.now() < retry.retryAt || !getToken()) return Promise.resolve(null);
+  var single = retry.failures >= SYNC_MAX_ATTEMPTS;
+  var ops = loadQueue().slice(0, single ? 1 : SYNC_BATCH_MAX);
+  if (!ops.length) {
+    wx.removeStorageSync(RETRY_KEY);
+    return Promise.resolve(null);
+  }
+
+  return request('/sync/batch', { method: 'POST', data: { ops: ops } }).then(function (res) {
+    // 逐条模式下保持逐条，直到找出并移走出错的那条（或队列清空）
+    if (single) wx.setStorageSync(RETRY_KEY, { failures: SYNC_MAX_ATTEMPTS, retryAt: 0 });
+    else wx.removeStorageSync(RETRY_KEY);
+    var done = {};
+    var attempts = {};
+    var rejected = [];
+    (res.results || []).forEach(function (r) {
+      var op = ops[r.index];
+      if (!op) return;
+      if (r.ok) {
+        done[op.client_id] = true;
+      } else if (r.retry && (op.attempts || 0) + 1 < SYNC_MAX_ATTEMPTS) {
+        attempts[op.client_id] = (op.attempts || 0) + 1;
+      } else {
+        rejected.push(Object.assign({}, op, { error: r.error }));
       }
     });
+    wx.setStorageSync(QUEUE_KEY, loadQueue().filter(function (op) {
+      if (attempts[op.client_id]) op.attempts = attempts[op.client_id];
+      return !done[op.client_id];
+    }));
+    dropOps(rejected);
+    if (res.applied) wx.setStorageSync('careline_dirty', '1');
+    return { res: res, more: hasUnsent(ops) };
+  }, function (err) {
+    if (err.offline || !err.statusCode) throw err;
+    if (single && (err.statusCode < 500 || retry.failures + 1 >= SYNC_MAX_ATTEMPTS * 2)) {
+      // 单独上传仍被拒绝或反复失败：移到失败列表，其余操作恢复整批上传
+      dropOps(ops, err.message);
+      wx.removeStorageSync(RETRY_KEY);
+      return { res: null, more: hasUnsent(ops) };
+    }
+    if (err.statusCode < 500) {
+      // 整批被拒绝（多半是其中某条不合法）：立即改为逐条上传
+      wx.setStorageSync(RETRY_KEY, { failures: SYNC_MAX_ATTEMPTS, retryAt: 0 });
+      return { res: null, more: true };
+    }
+    // 服务端出错：指数退避后再试
+    var delay = Math.min(SYNC_BACKOFF_MS * Math.pow(2, retry.failures), SYNC_BACKOFF_MAX_MS);
+    wx.setStorageSync(RETRY_KEY, { failures: retry.failures + 1, retryAt: Date.now() + delay });
+    throw err;
   });
 }
 
+// 上传离线队列；服务端逐条返回结果：
+// - 成功的移出队列；被拒绝的（校验失败等）移到失败列表
+// - 暂时性失败（retry）留在队列下次再传，同一条失败 SYNC_MAX_ATTEMPTS 次后移到失败列表
+// - 整批请求失败（非断网）：4xx 改为逐条上传找出不合法的那条，5xx 按指数退避重试；
+//   连续失败达到上限后同样逐条上传，单条仍失败的移到失败列表，不再挡住后面的操作
+function flushQueue() {
+  if (flushing) return flushing;
+  var last = null;
+  function next() {
+    return flushOnce().then(function (step) {
+      if (!step) return last;
+      last = step.res || last;
+      return step.more ? next() : last;
+    });
+  }
+  flushing = next().finally(function () {
+    flushing = null;
+  });
+  return flushing;
+}
+
+// ─── 实时推送：/live（SSE，经分块传输的 wx.request 接收） ───
+var LIVE_RETRY_MS = 5000;
+var liveTask = null;
+var liveTimer = null;
+
+function decodeChunk(data) {
+  var bytes = new Uint8Array(data);
+  var text = '';
+  for (var i = 0; i < bytes.length; i++) text += String.fromCharCode(bytes[i]);
+  try {
+    return decodeURIComponent(escape(text));
+  } catch (e) {
+    return text;
+  }
+}
+
+function parseFrame(frame) {
+  var type = '';
+  var data = '';
+  frame.split('\n').forEach(function (line) {
+    if (line.indexOf('event: ') === 0) type = line.slice(7);
+    else if (line.indexOf('data: ') === 0) data += line.slice(6);
+  });
+  if (!type || !data) return null;
+  try {
+    return { type: type, data: JSON.parse(data) };
+  } catch (e) {
+    return null;
+  }
+}
+
+// 订阅本家庭的实时事件：打上脏标记后回调当前页面，连接断开后自动重连
+function subscribeLive(onEvent) {
+  unsubscribeLive();
+  if (!getToken()) return;
+
+  var buffer = '';
+  var task = wx.request({
+    url: API_BASE + '/live',
+    header: { 'Authorization': 'Bearer ' + getToken() },
+    enableChunked: true,
+    responseType: 'arraybuffer',
+    timeout: 600000,
+    complete: function () {
+      if (liveTask !== task) return;
+      liveTask = null;
+      liveTimer = setTimeout(function () { subscribeLive(onEvent); }, LIVE_RETRY_MS);
+    }
+  });
+  task.onChunkReceived(function (res) {
+    buffer += decodeChunk(res.data);
+    var frames = buffer.split('\n\n');
+    buffer = frames.pop();
+    frames.forEach(function (frame) {
+      var evt = parseFrame(frame);
+      if (!evt || evt.type === 'hello') return;
+      wx.setStorageSync('careline_dirty', '1');
+      onEvent(evt.type, evt.data);
+    });
+  });
+  liveTask = task;
+}
+
+function unsubscribeLive() {
+  clearTimeout(liveTimer);
+  liveTimer = null;
+  var task = liveTask;
+  liveTask = null;
+  if (task) task.abort();
+}
+
 module.exports = {
   loginByPhone: function (phone, password) {
     return request('/auth/login', { method: 'POST', data: { phone: phone, password: password } });
@@ -59,30 +289,59 @@ module.exports = {
   },
   getMyFamily: function () { return request('/family/me'); },
 
+  // ─── 首页（一次返回疗程/今日记录/排便/留言/家庭） ───
+  getHome: function () { return request('/home'); },
+
   // ─── 疗程 ───
   getCurrentCycle: function () { return request('/cycle/current'); },
-  createCycle: function (data) { return request('/cycle', { method: 'POST', data: data }); },
+  createCycle: function (data) { return request('/cycle', { method: 'POST', data: data, idempotencyKey: newKey() }); },
   listCycles: function () { return request('/cycle/list'); },
 
   // ─── 每日记录 ───
   getToday: function () { return request('/daily/today'); },
-  upsertDailyLog: function (dateStr, data) { return request('/daily/' + dateStr, { method: 'PUT', data: data }); },
-  getCycleLogs: function (cycleNo) { return request('/daily/cycle/' + cycleNo); },
+  upsertDailyLog: function (dateStr, data) {
+    return writeOrQueue('/daily/' + dateStr, { method: 'PUT', data: data },
+      { op: 'daily.upsert', date: dateStr, daily: data });
+  },
+  // fields：只取图表需要的字段（可选）
+  getCycleLogs: function (cycleNo, fields) {
+    var only = fields ? '&fields=' + fields.join(',') : '';
+    return request('/daily/cycle/' + cycleNo + '?format=columnar' + only).then(util.columnarRows);
+  },
 
   // ─── 排便 ───
-  recordStool: function (data) { return request('/stool', { method: 'POST', data: data }); },
+  recordStool: function (data) {
+    // 入队时定下日期与时间，离线补传后仍记在点击的那一刻
+    var stool = Object.assign({ date: util.toDateStr(), time: util.toTimeStr() }, data);
+    return writeOrQueue('/stool', { method: 'POST', data: stool }, { op: 'stool.create', stool: stool });
+  },
   getTodayStool: function () { return request('/stool/today'); },
 
   // ─── 摘要 ───
   getSummary: function (mode, cycleNo, days) {
-    var url = '/summary?mode=' + mode;
+    var url = '/summary?mode=' + mode + '&format=columnar';
     if (cycleNo) url += '&cycle_no=' + cycleNo;
     if (days) url += '&days=' + days;
-    return request(url);
+    return request(url, { etag: true }).then(function (res) {
+      // 返回新对象：ETag 缓存里保留原始的列式数据
+      return Object.assign({}, res, { trends: util.columnarRows(res.trends) });
+    });
   },
   getCalendar: function () { return request('/summary/calendar'); },
+  getCalendarRange: function (from, to) { return request('/summary/calendar/range?from=' + from + '&to=' + to); },
 
   // ─── 留言 ───
-  sendMessage: function (content) { return request('/message', { method: 'POST', data: { content: content } }); },
-  getActiveMessages: function () { return request('/message/active'); }
+  sendMessage: function (content) {
+    return request('/message', { method: 'POST', data: { content: content }, idempotencyKey: newKey() });
+  },
+  getActiveMessages: function () { return request('/message/active'); },
+
+  // ─── 离线同步 ───
+  flushQueue: flushQueue,
+  pendingCount: function () { return loadQueue().length; },
+  failedOps: function () { return wx.getStorageSync(FAILED_KEY) || []; },
+
+  // ─── 实时推送 ───
+  subscribeLive: subscribeLive,
+  unsubscribeLive: unsubscribeLive
 };
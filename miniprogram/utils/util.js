@@ -12,6 +12,53 @@ function toDateStr(d) {
   return y + '-' + m + '-' + day;
 }
 
+function toTimeStr(d) {
+  var date = d || new Date();
+  var china = new Date(date.getTime() + (8 * 60 + date.getTimezoneOffset()) * 60000);
+  return String(china.getHours()).padStart(2, '0') + ':' + String(china.getMinutes()).padStart(2, '0');
+}
+
+// ─── 列式数据（format=columnar）解码，编码规则见后端 schemas.ColumnarTable ───
+function addDays(base, days) {
+  var p = base.split('-');
+  var d = new Date(Date.UTC(Number(p[0]), Number(p[1]) - 1, Number(p[2]) + days));
+  return d.getUTCFullYear() + '-' + String(d.getUTCMonth() + 1).padStart(2, '0') + '-' +
+    String(d.getUTCDate()).padStart(2, '0');
+}
+
+function decodeColumn(col, n) {
+  if (Array.isArray(col)) return col;
+  if (col.base !== undefined) {
+    return col.d.map(function (x) { return x == null ? null : addDays(col.base, x); });
+  }
+  var dense = new Array(n).fill(null);
+  col.i.forEach(function (idx, k) { dense[idx] = col.v[k]; });
+  return dense;
+}
+
+// 列式 → { 字段: 数组 }（图表直接使用）
+function columnarColumns(table) {
+  var out = {};
+  Object.keys(table.columns).forEach(function (key) {
+    out[key] = decodeColumn(table.columns[key], table.n);
+  });
+  return out;
+}
+
+// 列式 → 对象数组；已是数组时原样返回（布尔字段为 0 / 1）
+function columnarRows(table) {
+  if (!table || Array.isArray(table)) return table || [];
+  var cols = columnarColumns(table);
+  var keys = Object.keys(cols);
+  var rows = [];
+  for (var i = 0; i < table.n; i++) {
+    var row = {};
+    keys.forEach(function (key) { row[key] = cols[key][i]; });
+    rows.push(row);
+  }
+  return rows;
+}
+
 function getRole() {
   return wx.getStorageSync('careline_role') || '';
 }
@@ -45,11 +92,25 @@ function getStatusEmoji(energy, nausea) {
   return '💪';
 }
 
+// 与后端 DailyLog.symptoms_recorded 一致：点排便按钮会建立只有排便计数的当日记录，不算「已记录」
+var SYMPTOM_VALUES = ['energy', 'nausea', 'appetite', 'sleep_quality', 'temp_c', 'diarrhea', 'note'];
+var SYMPTOM_FLAGS = ['fever', 'numbness', 'mouth_sore', 'is_tough_day'];
+
+function hasSymptoms(log) {
+  if (!log) return false;
+  return SYMPTOM_VALUES.some(function (k) { return log[k] != null; }) ||
+    SYMPTOM_FLAGS.some(function (k) { return !!log[k]; });
+}
+
 module.exports = {
   toDateStr: toDateStr,
+  toTimeStr: toTimeStr,
+  columnarColumns: columnarColumns,
+  columnarRows: columnarRows,
   getRole: getRole,
   isPatient: isPatient,
   getStatusEmoji: getStatusEmoji,
+  hasSymptoms: hasSymptoms,
   ENERGY_LABELS_PATIENT: ENERGY_LABELS_PATIENT,
   ENERGY_LABELS_CAREGIVER: ENERGY_LABELS_CAREGIVER,
   NAUSEA_LABELS_PATIENT: NAUSEA_LABELS_PATIENT,